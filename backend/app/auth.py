@@ -3,22 +3,21 @@ import uuid
 from typing import Optional
 
 from fastapi import Depends, Request
-from passlib.context import CryptContext
 import logging
 from . import models
+from .services.passwords import password_hasher
 from .users import current_active_user
 
 logging.basicConfig(level=logging.INFO)
 
-# Password hashing setup
-pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
-
-
+# Password hashing: the same tuned Argon2 (and legacy bcrypt) parameters as UserManager.
+# These block; in request handlers await password_hasher.hash / verify_and_update instead.
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.password_helper.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    verified, _ = password_hasher.password_helper.verify_and_update(plain_password, hashed_password)
+    return verified
 
 # # Create two separate dependencies
 # async def get_fastapi_user_or_none(request: Request) -> Optional[models.User]:
@@ -1,10 +1,8 @@
 # backend/app/database.py
 import logging
 import os
-import struct
 import urllib.parse  # Added for Azure SQL connection string
 
-from azure.identity import DefaultAzureCredential
 # Connection string for Azure SQL - get this from environment variables
 from dotenv import load_dotenv
 # from sqlalchemy.dialects.mssql import SQL_COPT_SS_ACCESS_TOKEN
@@ -12,8 +10,11 @@ from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager
 from fastapi_users.db import SQLAlchemyUserDatabase
-from . import models
+from . import migrations, models
+from .services.sql_pool import PoolMetrics
+from .services.sql_token import AccessTokenProvider
 
 logging.basicConfig(level=logging.INFO)
 logging.info("Loading environment variables")
@@ -38,24 +39,71 @@ if not AZURE_SQL_CONNECTION_STRING:
 # database_name = 'sqldb-fg-database-s4ujd'
 
 # connection_string = 'Driver={};Server=tcp:{}.database.windows.net,1433;Database={};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30'.format(driver_name, server_name, database_name)
-# URL-encode the ODBC connection string
-params = urllib.parse.quote_plus(AZURE_SQL_CONNECTION_STRING)
-engine_url = f"mssql+aioodbc:///?odbc_connect={params}"
-
-# Create async engine
-engine = create_async_engine(
-    engine_url,
-    pool_pre_ping=True,
-    pool_recycle=3000,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    # Connection args for Azure SQL timeouts
-    connect_args={
-        "timeout": 60,     # Connection establishment timeout
-        "login_timeout": 60,  # Login timeout
-    }
-)
+# Optional read replica for read-only endpoints: an explicit connection string, or the primary's
+# with ApplicationIntent=ReadOnly (Azure SQL read scale-out). Without either, reads use the primary.
+AZURE_SQL_READ_CONNECTION_STRING = os.getenv("AZURE_SQL_READ_CONNECTION_STRING")
+if not AZURE_SQL_READ_CONNECTION_STRING and os.getenv("AZURE_SQL_READ_REPLICA", "false").lower() == "true":
+    AZURE_SQL_READ_CONNECTION_STRING = f"{AZURE_SQL_CONNECTION_STRING.rstrip(';')};ApplicationIntent=ReadOnly"
+
+
+# Connection pool, per worker process (each engine, primary and replica, gets its own pool).
+# Size these from /api/metrics and scripts/loadtest_pool.py rather than guessing.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3000"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() != "false"
+# Optional cap on connections per database across all workers (the Azure SQL tier's session
+# limit, less headroom for scripts); split evenly over WEB_CONCURRENCY workers.
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+def pool_limits(
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    max_connections: int = DB_MAX_CONNECTIONS,
+    workers: int = WEB_CONCURRENCY,
+) -> tuple[int, int]:
+    """pool_size and max_overflow for one worker, shrunk to fit max_connections when it's set."""
+    if max_connections <= 0:
+        return pool_size, max_overflow
+    per_worker = max(1, max_connections // max(1, workers))
+    pool_size = min(pool_size, per_worker)
+    return pool_size, max(0, min(max_overflow, per_worker - pool_size))
+
+
+def create_engine_for(connection_string: str, pool_metrics: PoolMetrics):
+    # URL-encode the ODBC connection string
+    params = urllib.parse.quote_plus(connection_string)
+    engine_url = f"mssql+aioodbc:///?odbc_connect={params}"
+    pool_size, max_overflow = pool_limits()
+
+    # Create async engine
+    async_engine = create_async_engine(
+        engine_url,
+        poolclass=pool_metrics.pool_class(),
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        # Connection args for Azure SQL timeouts
+        connect_args={
+            "timeout": 60,     # Connection establishment timeout
+            "login_timeout": 60,  # Login timeout
+        }
+    )
+    pool_metrics.attach(async_engine)
+    return async_engine
+
+
+# Primary: all writes, and reads that must see them
+pool_metrics = PoolMetrics("primary")
+engine = create_engine_for(AZURE_SQL_CONNECTION_STRING, pool_metrics)
+read_pool_metrics = PoolMetrics("read_replica") if AZURE_SQL_READ_CONNECTION_STRING else None
+read_engine = create_engine_for(AZURE_SQL_READ_CONNECTION_STRING, read_pool_metrics) if read_pool_metrics else engine
+HAS_READ_REPLICA = read_engine is not engine
 
 AsyncSessionLocal = sessionmaker(
     bind=engine, 
@@ -63,22 +111,38 @@ AsyncSessionLocal = sessionmaker(
     autoflush=False, 
     autocommit=False
 )
+ReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    autocommit=False
+) if HAS_READ_REPLICA else AsyncSessionLocal
+
+# Where read-only sessions went; "primary" counts reads kept off the replica after a write
+read_routing = {"replica": 0, "primary": 0}
 
-credential = DefaultAzureCredential()
 TOKEN_URL = "https://database.windows.net/.default"
 
-@event.listens_for(engine.sync_engine, "do_connect")
+
+def create_credential():
+    # Imported here: azure.identity is slow to import and only needed once the first token is fetched
+    from azure.identity import DefaultAzureCredential
+
+    return DefaultAzureCredential()
+
+# Cached and refreshed in the background (started in the app lifespan), see services/sql_token.py
+token_provider = AccessTokenProvider(create_credential, TOKEN_URL)
+
 def provide_token(dialect, conn_rec, cargs, cparams):
     # remove the "Trusted_Connection" parameter that SQLAlchemy adds
     if cargs and len(cargs) > 0:
         cargs[0] = cargs[0].replace(";Trusted_Connection=Yes", "")
 
-    # create token credential
-    raw_token = credential.get_token(TOKEN_URL).token.encode("utf-16-le")
-    token_struct = struct.pack(f"<I{len(raw_token)}s", len(raw_token), raw_token)
-    SQL_COPT_SS_ACCESS_TOKEN = 1256
-    # apply it to keyword arguments
-    cparams["attrs_before"] = {SQL_COPT_SS_ACCESS_TOKEN: token_struct}
+    # apply the cached, pre-packed access token to keyword arguments
+    cparams["attrs_before"] = token_provider.attrs_before()
+
+for _engine in {engine, read_engine}:
+    event.listen(_engine.sync_engine, "do_connect", provide_token)
 
 async def get_user_db():
     async with AsyncSessionLocal() as session:
@@ -92,9 +156,20 @@ async def get_db():
         finally:
             await db.close()
 
-async def instantiate_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(models.Base.metadata.create_all)
+@asynccontextmanager
+async def read_session(primary: bool = False):
+    """
+    A session for read-only work. `primary` keeps it off the replica, for reads that must see a
+    write the replica may not have replayed yet (see services/read_fence.py).
+    """
+    use_replica = HAS_READ_REPLICA and not primary
+    read_routing["replica" if use_replica else "primary"] += 1
+    async with (ReadSessionLocal if use_replica else AsyncSessionLocal)() as db:
+        yield db
+
+async def instantiate_db() -> dict:
+    """Run pending schema migrations; on an up-to-date database this is one version query."""
+    return await migrations.migrate(engine)
 
 async def cleanup_db():
     """
@@ -102,7 +177,9 @@ async def cleanup_db():
     """
     logging.info("Shutting down database connections...")
     
-    # Dispose of the engine - this closes all connections in the pool
+    # Dispose of the engines - this closes all connections in the pools
     await engine.dispose()
+    if HAS_READ_REPLICA:
+        await read_engine.dispose()
     
     logging.info("Database connections closed successfully")
\ No newline at end of file
@@ -1,28 +1,95 @@
 # backend/app/main.py
+import time
+
+# Before the app's own imports, so the startup profile includes them
+IMPORT_STARTED = time.perf_counter()
+
+import logging
 import os
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
-from . import auth, database, models
+from . import auth, database, metrics, models
+from .services.completion import create_provider
+from .services.conversations import ConversationStore
+from .services.passwords import PasswordHasherBusy, password_hasher
+from .services.read_fence import read_fence
+from .services.user_cache import user_cache
+from .services.ratelimit import ChatLimiter
+from .services.response_cache import ChatResponseCache
+from .services.retrieval import RetrieverCache
+from .services.storage import AsyncAzureBlobStorageService
 from .routes import auth as auth_routes
 from .routes import books as books_routes
 from .routes import chat as chat_routes
 from .routes import checkout as checkout_routes
+from .routes import metrics as metrics_routes
 from .routes import webhook as webhook_routes
 
+metrics.startup.record("imports", IMPORT_STARTED)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Initialize database (create tables)
-    await database.instantiate_db()
+    startup = metrics.startup
+    # AAD token for Azure SQL, fetched off the event loop before the first connection
+    with startup.step("sql_token"):
+        await database.token_provider.start()
+    metrics.register_collector("sql_token", database.token_provider.stats)
+    metrics.register_collector("sql_pool", database.pool_metrics.stats)
+    if database.read_pool_metrics is not None:
+        metrics.register_collector("sql_pool_read_replica", database.read_pool_metrics.stats)
+    # Pending schema migrations; one version query when there are none
+    with startup.step("schema"):
+        await database.instantiate_db()
+    # One async storage service per process: shares the Redis pool and blob HTTP session
+    with startup.step("storage"):
+        app.state.storage = AsyncAzureBlobStorageService()
+    metrics.register_collector("sas_url_cache", app.state.storage.sas_cache.stats)
+    # None of these connect anywhere until first used
+    with startup.step("services"):
+        app.state.retrievers = RetrieverCache()
+        app.state.chat_cache = ChatResponseCache(app.state.storage.redis)
+        app.state.chat_limiter = ChatLimiter(app.state.storage.redis)
+        app.state.conversations = ConversationStore(app.state.storage.redis)
+        # Azure OpenAI, or the local stand-in with CHAT_PROVIDER=fake
+        app.state.completion_provider = create_provider()
+        user_cache.attach_redis(app.state.storage.redis)
+        read_fence.attach_redis(app.state.storage.redis)
+    metrics.register_collector("retrieval_cache", app.state.retrievers.stats)
+    metrics.register_collector("chat_response_cache", app.state.chat_cache.stats)
+    metrics.register_collector("chat_limiter", app.state.chat_limiter.stats)
+    metrics.register_collector("conversations", app.state.conversations.stats)
+    metrics.register_collector("completion_provider", app.state.completion_provider.stats)
+    metrics.register_collector("password_hasher", password_hasher.stats)
+    metrics.register_collector("user_cache", user_cache.stats)
+    metrics.register_collector("read_fence", read_fence.stats)
+    metrics.register_collector("startup", startup.stats)
+    logging.info(f"main.py:lifespan: started in {startup.stats()['total_ms']}ms {startup.steps}")
     yield
+    await app.state.completion_provider.close()
+    await app.state.storage.close()
+    password_hasher.close()
     # Cleanup: properly dispose of all database connections
     await database.cleanup_db()
+    await database.token_provider.stop()
 
 app = FastAPI(title="eReader API", version="0.1.0", lifespan=lifespan)
 
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    # Login/register storms are shed here rather than stalling every other request
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-ins right now, please retry"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # CORS settings – allow the React frontend to call this API
 app.add_middleware(
     CORSMiddleware,
@@ -50,6 +117,7 @@ app.include_router(books_routes.router, prefix="/api")
 app.include_router(chat_routes.router, prefix="/api")
 app.include_router(checkout_routes.router, prefix="/api")
 app.include_router(webhook_routes.router, prefix="/api")
+app.include_router(metrics_routes.router, prefix="/api")
 # if os.getenv("DEV_MODE"):
 #     def override_get_current_user():
 #         """
@@ -0,0 +1,62 @@
+# backend/app/metrics.py
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# Process-local metrics: each subsystem registers a collector returning a JSON-serializable dict.
+# Values are per worker process; aggregate across workers on the scraping side.
+_collectors: dict[str, Callable[[], dict]] = {}
+
+
+def register_collector(name: str, collector: Callable[[], dict]):
+    _collectors[name] = collector
+
+
+def percentile(samples, q: float) -> float | None:
+    """Nearest-rank q-quantile (0 to 1) of a sample, or None when it's empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def percentile_ms(samples, q: float, digits: int = 2) -> float | None:
+    """percentile() of durations in seconds, as rounded milliseconds."""
+    value = percentile(samples, q)
+    return None if value is None else round(value * 1000, digits)
+
+
+def collect() -> dict:
+    snapshot = {}
+    for name, collector in _collectors.items():
+        try:
+            snapshot[name] = collector()
+        except Exception as e:
+            logging.error(f"metrics.py:collect: collector {name} failed: {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
+
+
+class StartupProfile:
+    """Milliseconds spent in each startup phase: importing the app, then each lifespan step."""
+
+    def __init__(self):
+        self.steps: dict[str, float] = {}
+
+    def record(self, name: str, started: float):
+        self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    def stats(self) -> dict:
+        return {"total_ms": round(sum(self.steps.values()), 1), "steps_ms": dict(self.steps)}
+
+
+startup = StartupProfile()
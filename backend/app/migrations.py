@@ -0,0 +1,91 @@
+# backend/app/migrations.py
+import logging
+import time
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from . import models
+
+# Bump when adding a migration below
+SCHEMA_VERSION = 2
+
+
+def _create_tables(sync_conn):
+    """1: every table that doesn't exist yet (checkfirst), including schema_version itself."""
+    models.Base.metadata.create_all(sync_conn)
+
+
+def _add_missing_columns_and_indexes(sync_conn):
+    """
+    2: columns and indexes added to books after the table was first deployed (cover_variants,
+    content_hash and its filtered unique index, keyset pagination and unique blob_name indexes).
+    create_all never alters an existing table. Added columns are all nullable.
+    """
+    inspector = inspect(sync_conn)
+    for table in (models.Book.__table__,):
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                logging.info(f"migrations.py: adding column {table.name}.{column.name} {column_type}")
+                sync_conn.execute(text(f"ALTER TABLE {table.name} ADD {column.name} {column_type} NULL"))
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                # Fails on duplicate blob_names left by old ingests; dedupe those rows first
+                logging.info(f"migrations.py: creating index {index.name}")
+                index.create(sync_conn)
+
+
+MIGRATIONS = {
+    1: _create_tables,
+    2: _add_missing_columns_and_indexes,
+}
+
+
+async def current_version(engine: AsyncEngine) -> int:
+    """One query; 0 when schema_version doesn't exist yet (a new database, or one from before versioning)."""
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(select(models.SchemaVersion.version))).scalar() or 0
+    except DBAPIError:
+        return 0
+
+
+async def current_version_in(conn) -> int:
+    """current_version() inside an open transaction, once the migration lock is held."""
+    has_table = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(models.SchemaVersion.__tablename__))
+    if not has_table:
+        return 0
+    return (await conn.execute(select(models.SchemaVersion.version))).scalar() or 0
+
+
+async def migrate(engine: AsyncEngine) -> dict:
+    """
+    Bring the schema up to SCHEMA_VERSION. When it's already there (every boot but the first after
+    a deploy that adds a migration) this is a single SELECT instead of create_all's per-table checks.
+    """
+    started = time.perf_counter()
+    version = await current_version(engine)
+    applied = []
+    if version < SCHEMA_VERSION:
+        async with engine.begin() as conn:
+            if conn.dialect.name == "mssql":
+                # Serialize workers booting together; the lock is released with the transaction
+                await conn.execute(text(
+                    "EXEC sp_getapplock @Resource = 'schema_migrations', @LockMode = 'Exclusive', "
+                    "@LockOwner = 'Transaction', @LockTimeout = 120000"
+                ))
+                version = await current_version_in(conn)
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                logging.info(f"migrations.py:migrate: applying migration {target}")
+                await conn.run_sync(MIGRATIONS[target])
+                applied.append(target)
+            if applied:
+                await conn.execute(models.SchemaVersion.__table__.delete())
+                await conn.execute(models.SchemaVersion.__table__.insert().values(version=SCHEMA_VERSION))
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logging.info(f"migrations.py:migrate: schema version {SCHEMA_VERSION}, applied {applied or 'none'} in {elapsed_ms}ms")
+    return {"schema_version": SCHEMA_VERSION, "applied": applied, "ms": elapsed_ms}
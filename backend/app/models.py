@@ -1,9 +1,10 @@
 # backend/app/models.py
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime, func
+from sqlalchemy import JSON, Column, ForeignKey, Index, Integer, String, Boolean, DateTime, UnicodeText, UniqueConstraint, func
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.dialects.mssql import UNIQUEIDENTIFIER
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTable
+from fastapi_users_db_sqlalchemy.generics import GUID
 import uuid
 from fastapi_users import schemas
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID
@@ -29,11 +30,62 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
     stripe_customer_id = Column(String(200), nullable=True)
     stripe_subscription_id = Column(String(200), nullable=True)
 
+class SchemaVersion(Base):
+    """Single row: the schema version the database was migrated to (see migrations.py)."""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    applied_at = Column(DateTime, nullable=False, server_default=func.now())
+
 class Book(Base):
     __tablename__ = "books"
     bookId = Column(UNIQUEIDENTIFIER, primary_key=True, default=uuid.uuid4, index=True)
     title = Column(String(200), nullable=False)
     author = Column(String(200), nullable=False)
-    blob_name = Column(String(200), nullable=False)
+    blob_name = Column(String(200), nullable=False, unique=True, index=True)
     cover_blob_name = Column(String(200), nullable=False)
-    content_type = Column(String(20), nullable=False)
\ No newline at end of file
+    # Downscaled covers, {"160": {"webp": blob_name, "jpeg": blob_name}, ...}; see services/covers.py
+    cover_variants = Column(JSON, nullable=True)
+    content_type = Column(String(20), nullable=False)
+    # SHA-256 of the EPUB bytes; NULL for books ingested before content addressing
+    content_hash = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        # Backs keyset pagination of the catalog (ORDER BY title, bookId)
+        Index("ix_books_title_bookId", "title", "bookId"),
+        # Filtered so legacy rows without a hash don't collide on NULL
+        Index(
+            "ux_books_content_hash", "content_hash", unique=True,
+            mssql_where=content_hash.isnot(None), sqlite_where=content_hash.isnot(None),
+        ),
+    )
+
+
+class Conversation(Base):
+    """A user's chat about one book (book_id NULL for general chat); see services/conversations.py."""
+    __tablename__ = "conversations"
+    id = Column(UNIQUEIDENTIFIER, primary_key=True, default=uuid.uuid4)
+    user_id = Column(GUID, ForeignKey("users.id"), nullable=False)
+    book_id = Column(UNIQUEIDENTIFIER, ForeignKey("books.bookId"), nullable=True)
+    # Rolling summary of every turn up to and including summarized_through
+    summary = Column(UnicodeText, nullable=True)
+    summarized_through = Column(Integer, nullable=False, default=0)
+    turn_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (UniqueConstraint("user_id", "book_id", name="uq_conversations_user_book"),)
+
+
+class ConversationTurn(Base):
+    """One message of a conversation. Append-only; ids order the turns."""
+    __tablename__ = "conversation_turns"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(UNIQUEIDENTIFIER, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    role = Column(String(10), nullable=False)
+    content = Column(UnicodeText, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Backs loading the tail of a conversation (WHERE conversation_id = ? AND id > ?)
+        Index("ix_conversation_turns_conversation_id_id", "conversation_id", "id"),
+    )
@@ -1,45 +1,347 @@
 # backend/app/routes/books.py
+import base64
+import email.utils
+import hashlib
+import json
 import logging
-from fastapi import APIRouter, Depends
+import os
+import time
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select
 
 from .. import auth, database, models, schemas
-from ..services.storage import AzureBlobStorageService
+from ..services.book_index import BOOK_CONTAINER, load_book_index, read_book_member
+from ..services.catalog import get_catalog_version
+from ..services.covers import COVER_CONTAINER
+from ..services.http_range import RangeNotSatisfiable, if_range_matches, parse_range_header
+from ..services.read_fence import read_fence
+from ..services.storage import AsyncAzureBlobStorageService, current_sas_window, get_storage
 from ..users import current_active_user
 logging.basicConfig(level=logging.INFO)
 router = APIRouter(prefix="/books", tags=["books"])
 
-blob_service = AzureBlobStorageService()
+# Keyset pagination over (title, bookId) keeps each page a bounded index seek
+BOOK_PAGE_SIZE = 50
+BOOK_PAGE_SIZE_MAX = 200
+BOOK_LIST_FIELDS = (
+    "bookId", "title", "author", "blob_name", "cover_blob_name", "content_type", "cover_blob_url", "cover_srcset",
+)
+# Fields computed from other columns rather than selected directly
+BOOK_DERIVED_FIELDS = {"cover_blob_url": "cover_blob_name", "cover_srcset": "cover_variants"}
+# Upper bound on how long a browser may reuse a catalog page without revalidating
+CATALOG_MAX_AGE_SECONDS = int(os.getenv("CATALOG_MAX_AGE_SECONDS", "60"))
 
-@router.get("/", response_model=schemas.BookList)
+
+def encode_book_cursor(title: str, book_id: uuid.UUID) -> str:
+    raw = json.dumps([title, str(book_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_book_cursor(cursor: str) -> tuple[str, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        title, book_id = json.loads(base64.urlsafe_b64decode(padded))
+        return title, uuid.UUID(book_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_book_fields(fields: str | None) -> list[str]:
+    if fields is None:
+        return list(BOOK_LIST_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(BOOK_LIST_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def catalog_etag(catalog_version: str, sas_window: int, limit: int, cursor: str | None, fields: list[str]) -> str:
+    """
+    Weak ETag for a catalog page, computed before the page is built so revalidations skip SQL. It
+    changes when Book rows change (catalog_version) or when cover SAS URLs roll over to a new
+    signing window. Weak because the body isn't byte-identical per ETag: around a window boundary
+    cached URLs from the previous window may still be served, equally valid until they expire.
+    """
+    key = json.dumps([catalog_version, sas_window, limit, cursor, fields])
+    return f'W/"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    opaque_tag = etag.removeprefix("W/")
+    return opaque_tag in [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+
+
+@router.get("/", response_model=schemas.BookList, response_model_exclude_unset=True)
 async def list_books(
-    db: AsyncSession = Depends(database.get_db),
+    request: Request,
+    response: Response,
+    limit: int = Query(BOOK_PAGE_SIZE, ge=1, le=BOOK_PAGE_SIZE_MAX),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    fields: str | None = Query(None, description=f"Comma-separated subset of: {', '.join(BOOK_LIST_FIELDS)}"),
     current_user: models.User = Depends(current_active_user),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
 ):
-    stmt = select(models.Book)
-    result = await db.execute(stmt)
-    db_books = result.scalars().all()
-    logging.info(f"books.py:list_books: db_books: {db_books}")
-    
-    for book in db_books:
-        book.cover_blob_url = blob_service.get_sas_url_cached(book.cover_blob_name, container_name="coverimages")
-    return schemas.BookList(book_list=db_books)
+    output_fields = parse_book_fields(fields)
+
+    # Answer revalidations from Redis alone, before touching SQL or signing anything
+    catalog_version = await get_catalog_version(storage.redis)
+    sas_window, sas_window_end = current_sas_window()
+    etag = catalog_etag(catalog_version, sas_window, limit, cursor, output_fields)
+    max_age = max(0, min(CATALOG_MAX_AGE_SECONDS, int(sas_window_end - time.time())))
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max_age}, must-revalidate",
+        "Vary": "Cookie",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    response.headers.update(cache_headers)
+
+    # bookId and title are always read because the cursor is built from them
+    columns = {"bookId", "title"} | {BOOK_DERIVED_FIELDS.get(field, field) for field in output_fields}
+
+    stmt = (
+        select(*[getattr(models.Book, column) for column in sorted(columns)])
+        .order_by(models.Book.title, models.Book.bookId)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        after_title, after_id = decode_book_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                models.Book.title > after_title,
+                and_(models.Book.title == after_title, models.Book.bookId > after_id),
+            )
+        )
+
+    # The catalog is read from the replica unless a Book write is still within the fence window
+    fenced = await read_fence.active("catalog")
+    async with database.read_session(primary=fenced) as db:
+        result = await db.execute(stmt)
+        rows = result.mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    logging.info(f"books.py:list_books: {len(rows)} books, has_more={has_more}")
+
+    # Every cover URL on the page, full size and thumbnails alike, is resolved in one batch
+    cover_blob_names = []
+    if "cover_blob_url" in output_fields:
+        cover_blob_names += [row["cover_blob_name"] for row in rows]
+    if "cover_srcset" in output_fields:
+        for row in rows:
+            for formats in (row["cover_variants"] or {}).values():
+                cover_blob_names += formats.values()
+    cover_urls = {}
+    if cover_blob_names:
+        cover_urls = await storage.get_sas_urls_cached(cover_blob_names, container_name=COVER_CONTAINER)
+
+    book_list = []
+    for row in rows:
+        values = {field: row[field] for field in output_fields if field not in BOOK_DERIVED_FIELDS}
+        if "cover_blob_url" in output_fields:
+            values["cover_blob_url"] = cover_urls.get(row["cover_blob_name"])
+        if "cover_srcset" in output_fields:
+            srcset = {}
+            for width, formats in (row["cover_variants"] or {}).items():
+                for format_name, blob_name in formats.items():
+                    srcset.setdefault(format_name, {})[width] = cover_urls[blob_name]
+            values["cover_srcset"] = srcset or None
+        values["bookId"] = row["bookId"]
+        book_list.append(schemas.BookInfo(**values))
+
+    next_cursor = encode_book_cursor(rows[-1]["title"], rows[-1]["bookId"]) if has_more else None
+    return schemas.BookList(book_list=book_list, next_cursor=next_cursor)
 
 
 @router.get("/get_full_blob_url/{blob_name}", response_model=str)
-async def get_blob_sas(blob_name: str, current_user: models.User = Depends(current_active_user)): 
+async def get_blob_sas(
+    blob_name: str,
+    current_user: models.User = Depends(current_active_user),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
+):
     logging.info(f"blob_name: {blob_name}")
-    sasUrl = blob_service.get_sas_url_cached(blob_name, container_name="defaultlibrary")
-    logging.info(f"books.py:get_blob_sas: sasUrl: {sasUrl}")
+    sasUrl = await storage.get_sas_url_cached(blob_name, container_name="defaultlibrary")
     return sasUrl
 
 
-@router.get("/{book_id}/file")
+# Chapter and resource bytes only change if the book blob is replaced
+BOOK_CONTENT_HEADERS = {
+    "Cache-Control": "private, max-age=86400",
+    # Book XHTML is third-party content; never let it run script on our origin if opened directly
+    "Content-Security-Policy": "sandbox",
+}
+
+
+async def get_book_or_404(db: AsyncSession, book_id: uuid.UUID) -> models.Book:
+    book = await db.get(models.Book, book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return book
+
+
+@router.get("/{book_id}/file", response_model=schemas.BookSpine)
 async def get_book_file(
-    book_id: int,
+    book_id: uuid.UUID,
     db: AsyncSession = Depends(database.get_db),
     current_user: models.User = Depends(current_active_user),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
 ):
-    
-    return None
+    """
+    Reading order of the book. Fetch each entry from /books/{book_id}/chapters/{index}
+    instead of downloading the whole EPUB.
+    """
+    book = await get_book_or_404(db, book_id)
+    index = await load_book_index(storage, book.blob_name)
+    chapters = [
+        schemas.ChapterInfo(
+            index=position,
+            href=entry["href"],
+            media_type=index["items"][entry["href"]]["media_type"],
+            size=index["items"][entry["href"]]["size"],
+            linear=entry["linear"],
+        )
+        for position, entry in enumerate(index["spine"])
+    ]
+    return schemas.BookSpine(bookId=book.bookId, title=book.title, chapters=chapters)
+
+
+@router.get("/{book_id}/manifest", response_model=schemas.BookManifest)
+async def get_book_manifest(
+    book_id: uuid.UUID,
+    response: Response,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(current_active_user),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
+):
+    """
+    Everything precomputed at ingest: spine with zip offsets and per-chapter text length and
+    word count, the TOC tree and book totals. Enough to lay out a reader, progress bar or
+    chat context without opening the EPUB.
+    """
+    book = await get_book_or_404(db, book_id)
+    index = await load_book_index(storage, book.blob_name)
+    chapters = []
+    for position, entry in enumerate(index["spine"]):
+        item = index["items"][entry["href"]]
+        chapters.append(
+            schemas.ManifestChapter(
+                index=position,
+                href=entry["href"],
+                media_type=item["media_type"],
+                size=item["size"],
+                linear=entry["linear"],
+                offset=item["offset"],
+                compressed_size=item["compressed_size"],
+                text_length=entry["text_length"],
+                word_count=entry["word_count"],
+            )
+        )
+    response.headers["Cache-Control"] = BOOK_CONTENT_HEADERS["Cache-Control"]
+    return schemas.BookManifest(
+        bookId=book.bookId,
+        title=book.title,
+        author=book.author,
+        size=index["size"],
+        text_length=index["text_length"],
+        word_count=index["word_count"],
+        chapters=chapters,
+        toc=index["toc"],
+    )
+
+
+@router.get("/{book_id}/chapters/{chapter_index}")
+async def get_book_chapter(
+    book_id: uuid.UUID,
+    chapter_index: int,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(current_active_user),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
+):
+    book = await get_book_or_404(db, book_id)
+    index = await load_book_index(storage, book.blob_name)
+    if not 0 <= chapter_index < len(index["spine"]):
+        raise HTTPException(status_code=404, detail="Chapter not found")
+
+    entry = index["items"][index["spine"][chapter_index]["href"]]
+    content = await read_book_member(storage, book.blob_name, entry)
+    return Response(content=content, media_type=entry["media_type"], headers=BOOK_CONTENT_HEADERS)
+
+
+@router.get("/{book_id}/resources/{href:path}")
+async def get_book_resource(
+    book_id: uuid.UUID,
+    href: str,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(current_active_user),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
+):
+    """
+    Any manifest item (chapters, images, stylesheets, fonts), container.xml or the OPF, by its
+    path inside the EPUB: the reader opens /books/{book_id}/resources/ as an unpacked EPUB.
+    Chapters reference resources relative to their own href.
+    """
+    book = await get_book_or_404(db, book_id)
+    index = await load_book_index(storage, book.blob_name)
+    entry = index["items"].get(href)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+
+    content = await read_book_member(storage, book.blob_name, entry)
+    return Response(content=content, media_type=entry["media_type"], headers=BOOK_CONTENT_HEADERS)
+
+
+@router.get("/{book_id}/content")
+async def get_book_content(
+    book_id: uuid.UUID,
+    request: Request,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(current_active_user),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
+):
+    """
+    Stream the EPUB through the backend, honoring Range/If-Range. Bytes are relayed chunk by
+    chunk from blob storage, so memory per request is bounded by BLOB_STREAM_CHUNK_SIZE.
+    """
+    book = await get_book_or_404(db, book_id)
+    properties = await storage.get_blob_properties(book.blob_name, container_name=BOOK_CONTAINER)
+    size = properties.size
+    etag = properties.etag
+    last_modified = email.utils.format_datetime(properties.last_modified, usegmt=True)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": "private, max-age=86400",
+    }
+
+    byte_range = None
+    if if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        try:
+            byte_range = parse_range_header(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        status_code, offset, length = 200, None, None
+        headers["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        status_code, offset, length = 206, start, end - start + 1
+        headers["Content-Length"] = str(length)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    return StreamingResponse(
+        storage.stream_blob(book.blob_name, container_name=BOOK_CONTAINER, offset=offset, length=length, etag=etag),
+        status_code=status_code,
+        media_type=book.content_type,
+        headers=headers,
+    )
@@ -1,33 +1,80 @@
 # app/main.py (FastAPI backend) - Defines the /chat endpoint that streams responses token-by-token.
-import asyncio
-import os
+import logging
+import uuid
 
-from fastapi import APIRouter, Depends, FastAPI
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, FastAPI, Request, Response
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from openai import AsyncAzureOpenAI
 from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User
-from .. import auth
+from .. import auth, database, models, schemas
+from ..services.completion import CompletionProvider, FakeProvider, get_completion_provider
+from ..services.conversations import ConversationHistory, ConversationStore, get_conversations
+from ..services.ratelimit import ChatLimiter, RateLimited, estimate_tokens, get_chat_limiter
+from ..services.response_cache import (
+    ChatResponseCache,
+    cache_key_for_response_id,
+    get_chat_cache,
+    response_cache_key,
+    response_id,
+)
+from ..services.retrieval import RetrieverCache, get_retrievers
+from ..services.storage import AsyncAzureBlobStorageService, get_storage
+from ..services.streaming import last_event_id, stream_response, wants_sse
 from ..users import current_active_user
+from .books import get_book_or_404
 app = FastAPI()
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-# Initialize Azure OpenAI client
-endpoint = os.getenv("ENDPOINT_URL")
-deployment = os.getenv("DEPLOYMENT_NAME")
-subscription_key = os.getenv("AZURE_OPENAI_API_KEY")
+SYSTEM_PROMPT = "You are an AI assistant that answers questions about a book."
+CHAT_MAX_TOKENS = 800
 
-client = AsyncAzureOpenAI(
-    azure_endpoint=endpoint,
-    api_key=subscription_key,
-    api_version="2025-01-01-preview",
-)
+# /mock_chat always streams from the local stand-in, whatever CHAT_PROVIDER says
+mock_provider = FakeProvider()
 
 # Define the request body model
 class ChatRequest(BaseModel):
     message: str
+    # The book being read; its most relevant passages are added to the prompt
+    book_id: uuid.UUID | None = None
+    # Spine index of the reader's position: passages past it are never retrieved
+    chapter: int | None = None
+
+
+async def build_messages(
+    request: ChatRequest,
+    db: AsyncSession,
+    storage: AsyncAzureBlobStorageService,
+    retrievers: RetrieverCache,
+    history: ConversationHistory | None = None,
+) -> list[dict]:
+    """
+    System prompt plus, for book chats, the top-k retrieved passages, then the conversation's
+    summary and recent turns. The prompt stays bounded by RETRIEVAL_TOP_K chunks and the history
+    window however long the book or the conversation is.
+    """
+    system_text = SYSTEM_PROMPT
+    if request.book_id is not None:
+        book = await get_book_or_404(db, request.book_id)
+        retriever = await retrievers.get(storage, book.blob_name)
+        passages = retriever.search(request.message, max_chapter=request.chapter)
+        logging.info(f"chat.py:build_messages: {len(passages)} passages from {book.blob_name}")
+        system_text = f"{SYSTEM_PROMPT} The book is \"{book.title}\" by {book.author}."
+        if passages:
+            excerpts = "\n\n".join(f"[Chapter {passage['chapter']}] {passage['text']}" for passage in passages)
+            system_text += (
+                " Answer using the excerpts below where they are relevant, and say so when they"
+                f" do not contain the answer.\n\nExcerpts:\n{excerpts}"
+            )
+
+    return [
+        {"role": "system", "content": [{"type": "text", "text": system_text}]},
+        *(history.messages() if history is not None else []),
+        {"role": "user", "content": [{"type": "text", "text": request.message}]},
+    ]
 
 def verify_subscription(user: User = Depends(current_active_user)):
     if not user.is_subscribed:
@@ -37,103 +84,156 @@ def verify_subscription(user: User = Depends(current_active_user)):
 # Implement a real chat endpoint with azure openai
 @router.post("/chat")
 async def chat_endpoint(
-    request: ChatRequest, user: User = Depends(verify_subscription)
+    request: ChatRequest,
+    http_request: Request,
+    user: User = Depends(verify_subscription),
+    db: AsyncSession = Depends(database.get_db),
+    storage: AsyncAzureBlobStorageService = Depends(get_storage),
+    retrievers: RetrieverCache = Depends(get_retrievers),
+    provider: CompletionProvider = Depends(get_completion_provider),
+    chat_cache: ChatResponseCache = Depends(get_chat_cache),
+    limiter: ChatLimiter = Depends(get_chat_limiter),
+    conversations: ConversationStore = Depends(get_conversations),
 ):
     """
-    Accepts a user message and streams back a response from Azure OpenAI token by token.
+    Accepts a user message and streams back a response from the completion provider (Azure
+    OpenAI, or the local stand-in with CHAT_PROVIDER=fake) token by token.
     Requires a valid authenticated user (via Depends on current_active_user).
+    With a book_id, the most relevant passages of that book are retrieved into the prompt.
+    The conversation with this book continues server-side: its summary and recent turns are
+    sent along, and the exchange is recorded once the answer completes (once per response, so a
+    client that disconnected and resumed still records it, and a repeated resume doesn't).
+    Repeated questions with the same context are replayed from the response cache.
+    An SSE client reconnecting with Last-Event-ID resumes the response it was reading, by the
+    response id in the event ids, as long as that response is still cached or in flight (409
+    otherwise, and always with the response cache disabled).
+    Answers 429 with Retry-After when the user or the deployment is over its limits.
     """
-    user_message = request.message
+    resume_id, _ = last_event_id(http_request) if wants_sse(http_request) else (None, 0)
+    history = await conversations.load(db, user.id, request.book_id)
+    if resume_id is not None:
+        # Not rebuilt from the request: recording the exchange changed the history, and with it the key
+        cache_key = cache_key_for_response_id(resume_id)
+        if cache_key is None or not await chat_cache.available(cache_key):
+            raise HTTPException(status_code=409, detail="Response is no longer available, ask again")
+        messages, upstream = None, False
+    else:
+        # Prepare the chat prompt
+        messages = await build_messages(request, db, storage, retrievers, history)
+        cache_key = response_cache_key(provider.model, request.book_id, request.message, messages[:-1])
+        upstream = not await chat_cache.available(cache_key)
 
-    # Prepare the chat prompt
-    messages = [
-        {
-            "role": "system",
-            "content": [
-                {
-                    "type": "text",
-                    "text": "You are an AI assistant that answers questions about a book."
-                }
-            ]
-        },
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": user_message
-                }
-            ]
-        }
-    ]
+    # Charge the prompt plus the most the completion can cost; cache replays only take a stream slot
+    try:
+        admission = await limiter.admit(
+            user.id,
+            provider.model,
+            estimate_tokens(messages) + CHAT_MAX_TOKENS if messages is not None else 0,
+            upstream=upstream,
+        )
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": e.retry_after_header})
+
+    def upstream_response():
+        if messages is None:
+            # The resumed response expired between the availability check and now
+            raise LookupError("Response is no longer available, ask again")
+        # Iterated by the response cache's flight task, which owns the upstream slot from here on.
+        # Admitted as a replay but the entry expired meanwhile: the slot and tokens are taken now.
+        return admission.upstream(provider.stream(messages, max_tokens=CHAT_MAX_TOKENS))
 
     async def generate_response():
+        answer = []
         try:
-            # Generate the streaming completion
-            completion = await client.chat.completions.create(
-                model=deployment,
-                messages=messages,
-                max_tokens=800,
-                temperature=0.7,
-                top_p=0.95,
-                frequency_penalty=0,
-                presence_penalty=0,
-                stop=None,
-                stream=True  # Enable streaming
-            )
-
-            # Stream the response token by token
-            async for chunk in completion:
-                if chunk.choices and len(chunk.choices) > 0:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        yield content
-                    
+            async for content in chat_cache.stream(cache_key, upstream_response):
+                answer.append(content)
+                yield content
         except Exception as e:
-            # Handle errors gracefully
-            print(f"Chat endpoint error: {str(e)}")  # Log to console for debugging
+            logging.exception(f"chat.py:chat_endpoint: chat stream failed: {e}")
             yield f"Error: {str(e)}"
+            return
+        finally:
+            await admission.release()
 
-    # Return a StreamingResponse that streams the content from OpenAI
-    return StreamingResponse(
-        generate_response(), 
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # Disable nginx buffering
-        }
+        # Only complete answers join the conversation; a disconnect or error leaves it unchanged
+        # until a resume completes the answer. The client already has the whole answer, so a
+        # failure here is logged, not streamed.
+        if not await conversations.claim_exchange(user.id, response_id(cache_key)):
+            # Recorded by the request that produced it, or by an earlier resume
+            return
+        try:
+            async with database.AsyncSessionLocal() as history_db:
+                await conversations.append(
+                    history_db, user.id, request.book_id, history, request.message, "".join(answer)
+                )
+        except Exception:
+            logging.exception("chat.py:chat_endpoint: could not record the exchange")
+
+    # Return a StreamingResponse that streams the content from OpenAI, coalesced into fewer chunks.
+    # SSE event ids carry the response id, so a client resuming with Last-Event-ID gets the rest
+    # of this cached (or in-flight) response.
+    return stream_response(
+        http_request,
+        generate_response(),
+        # Also releases the admission if the client disconnects before the body starts
+        background=BackgroundTask(admission.release),
+        response_id=response_id(cache_key),
+    )
+
+@router.get("/conversation", response_model=schemas.ConversationInfo)
+async def get_conversation(
+    book_id: uuid.UUID | None = None,
+    limit: int = 50,
+    user: User = Depends(current_active_user),
+    db: AsyncSession = Depends(database.get_db),
+    conversations: ConversationStore = Depends(get_conversations),
+):
+    """The user's conversation about a book (or the general one): summary plus the latest turns."""
+    conversation = await conversations.get_conversation(db, user.id, book_id)
+    if conversation is None:
+        return schemas.ConversationInfo(book_id=book_id)
+    result = await db.execute(
+        select(models.ConversationTurn.role, models.ConversationTurn.content, models.ConversationTurn.created_at)
+        .where(models.ConversationTurn.conversation_id == conversation.id)
+        .order_by(models.ConversationTurn.id.desc())
+        .limit(max(1, min(limit, 200)))
+    )
+    turns = [schemas.ConversationTurnInfo.model_validate(row, from_attributes=True) for row in result]
+    return schemas.ConversationInfo(
+        book_id=book_id, summary=conversation.summary, turn_count=conversation.turn_count, turns=turns[::-1]
     )
 
+@router.delete("/conversation", status_code=204)
+async def delete_conversation(
+    book_id: uuid.UUID | None = None,
+    user: User = Depends(current_active_user),
+    db: AsyncSession = Depends(database.get_db),
+    conversations: ConversationStore = Depends(get_conversations),
+):
+    """Forget the conversation, so the next question starts fresh."""
+    await conversations.clear(db, user.id, book_id)
+    return Response(status_code=204)
+
 @router.post("/mock_chat")
 async def mock_chat_endpoint(
-    request: ChatRequest, current_user=Depends(current_active_user)
+    request: ChatRequest, http_request: Request, current_user=Depends(current_active_user)
 ):
     """
-    Accepts a user message and streams back a response token by token.
+    Accepts a user message and streams back a simulated response token by token.
     Requires a valid authenticated user (via Depends on get_current_user).
     """
-    user_message = request.message  # The message sent by the user
+    messages = [
+        {"role": "system", "content": [{"type": "text", "text": SYSTEM_PROMPT}]},
+        {"role": "user", "content": [{"type": "text", "text": request.message}]},
+    ]
 
-    # Simulate a streaming text generator (e.g., could call an AI model here)
+    # Simulated model: time to first token, jittered token rate and error rate come from FAKE_CHAT_*
     async def generate_response():
-        # In a real scenario, connect to an AI service or generate response incrementally.
-        # Here we'll simulate with a dummy response split into tokens.
-        response_text = (
-            f"AI response to '{user_message}'. This is a mock streaming reply."
-        )
-        for token in response_text.split():
-            # Yield each token followed by a space
-            yield token + " "
-            await asyncio.sleep(0.1)  # simulate delay for streaming effect
+        try:
+            async for content in mock_provider.stream(messages, max_tokens=CHAT_MAX_TOKENS):
+                yield content
+        except Exception as e:
+            yield f"Error: {str(e)}"
 
     # Return a StreamingResponse that streams the content generated by the async generator
-    return StreamingResponse(
-        generate_response(), 
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # Disable nginx buffering
-        }
-    )
+    return stream_response(http_request, generate_response())
@@ -2,7 +2,7 @@ import os
 import stripe
 
 from fastapi import APIRouter, Depends, HTTPException
-from ..users import current_active_user
+from ..users import current_active_user, user_changed
 from ..models import User  # Your ORM user model
 from sqlalchemy.ext.asyncio import AsyncSession
 from .. import database, models
@@ -18,10 +18,12 @@ async def create_checkout_session(
     if not current_user.stripe_customer_id:
         # Create or retrieve a Stripe Customer
         customer = stripe.Customer.create(email=current_user.email)
-        current_user = await db.merge(current_user)
+        # current_user may come from the user cache: change the row itself, then drop the cached copy and fence replica reads
+        current_user = await db.get(User, current_user.id)
         current_user.stripe_customer_id = customer.id
         await db.commit()
         await db.refresh(current_user)
+        await user_changed(current_user.id)
 
     try:
         session = stripe.checkout.Session.create(
@@ -0,0 +1,19 @@
+# backend/app/routes/metrics.py
+import os
+
+from fastapi import APIRouter, Depends
+
+from .. import metrics, models
+from ..users import fastapi_users
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+current_superuser = fastapi_users.current_user(active=True, superuser=True)
+
+
+@router.get("/")
+async def get_metrics(current_user: models.User = Depends(current_superuser)):
+    """
+    Per-process counters and gauges (caches, pools, limiters). Superusers only.
+    """
+    return {"pid": os.getpid(), **metrics.collect()}
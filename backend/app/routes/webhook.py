@@ -2,6 +2,7 @@ from fastapi import Request, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db  # your DB session dependency
 from app.models import User
+from app.users import user_changed
 import stripe
 import os
 from fastapi import APIRouter
@@ -38,6 +39,7 @@ async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
             user.stripe_customer_id = customer_id
             user.stripe_subscription_id = subscription_id
             await db.commit()
+            await user_changed(user.id)
     
     elif event['type'] == 'invoice.payment_failed':
         # Subscription payment failed – mark user as not subscribed (or grace period handling)
@@ -48,6 +50,7 @@ async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
         if user:
             user.is_subscribed = False
             await db.commit()
+            await user_changed(user.id)
     
     elif event['type'] == 'customer.subscription.deleted':
         # Subscription canceled – mark user as unsubscribed
@@ -58,6 +61,7 @@ async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
         if user:
             user.is_subscribed = False
             await db.commit()
+            await user_changed(user.id)
     # ... (handle other event types like invoice.paid if needed)
 
     return {"status": "success"}  # Respond 200 OK
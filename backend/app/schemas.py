@@ -1,5 +1,6 @@
 # backend/app/schemas.py
 from pydantic import BaseModel, ConfigDict, EmailStr
+from datetime import datetime
 from uuid import UUID
 from fastapi_users import schemas
 
@@ -21,16 +22,67 @@ class BlobObj(BaseModel):
 class BlobList(BaseModel):
     blob_list: list[BlobObj]
 
+# Everything but bookId is optional so /books/?fields= can return a projection
 class BookInfo(BaseModel):
     bookId: UUID
-    title: str
-    author: str
-    blob_name: str
-    cover_blob_name: str
-    content_type: str
+    title: str | None = None
+    author: str | None = None
+    blob_name: str | None = None
+    cover_blob_name: str | None = None
+    content_type: str | None = None
     cover_blob_url: str | None = None
+    # {"webp": {"160": url, "320": url, ...}, "jpeg": {...}}: enough to build <picture> srcsets
+    cover_srcset: dict[str, dict[str, str]] | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
 class BookList(BaseModel):
-    book_list: list[BookInfo]
\ No newline at end of file
+    book_list: list[BookInfo]
+    next_cursor: str | None = None
+
+class ChapterInfo(BaseModel):
+    index: int
+    href: str
+    media_type: str
+    size: int
+    linear: bool = True
+
+class BookSpine(BaseModel):
+    bookId: UUID
+    title: str
+    chapters: list[ChapterInfo]
+
+class ManifestChapter(ChapterInfo):
+    # Where the chapter's compressed bytes sit inside the EPUB zip
+    offset: int
+    compressed_size: int
+    text_length: int
+    word_count: int
+
+class TocEntry(BaseModel):
+    label: str
+    href: str
+    fragment: str | None = None
+    spine_index: int | None = None
+    children: list["TocEntry"] = []
+
+class BookManifest(BaseModel):
+    bookId: UUID
+    title: str
+    author: str
+    size: int
+    text_length: int
+    word_count: int
+    chapters: list[ManifestChapter]
+    toc: list[TocEntry]
+
+class ConversationTurnInfo(BaseModel):
+    role: str
+    content: str
+    created_at: datetime
+
+class ConversationInfo(BaseModel):
+    book_id: UUID | None = None
+    summary: str | None = None
+    turn_count: int = 0
+    turns: list[ConversationTurnInfo] = []
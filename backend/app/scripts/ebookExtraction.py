@@ -1,16 +1,18 @@
+import asyncio
 import io
 import logging
 import os
 import sys
-import tempfile
+import posixpath
+import zipfile
 from pathlib import Path
+from azure.core.exceptions import ResourceExistsError
 from azure.storage.blob import (
     BlobSasPermissions, 
     BlobServiceClient,
     generate_blob_sas
 )
-from dotenv import load_dotenv
-from ebooklib import epub
+from dotenv import find_dotenv, load_dotenv
 import uuid
 
 logging.basicConfig(level=logging.INFO)
@@ -26,14 +28,17 @@ project_root_for_imports = os.path.dirname(app_dir)
 # .../backend
 sys.path.insert(0, project_root_for_imports)  # Prepend to ensure it's prioritized
 
+# Before the app imports, which read their configuration at import time
+load_dotenv(find_dotenv(".env.dev"))
+
 from app import database, models
+from app.services import storage
+from app.services.catalog import bump_catalog_version
+from app.services.content_address import content_blob_name, content_hash
+from app.services.covers import COVER_CONTAINER
+from app.services.epub import find_cover_href, package_metadata, read_package
 from app.services.storage import AzureBlobStorageService
 
-#Instantiate the database
-database.instantiate_db()
-
-load_dotenv(".env.dev")
-
 logging.info(f"AZURE_STORAGE_CONNECTION_STRING: {os.getenv('AZURE_STORAGE_CONNECTION_STRING')}")
 
 blob_svc = BlobServiceClient.from_connection_string(
@@ -41,15 +46,15 @@ blob_svc = BlobServiceClient.from_connection_string(
 )
 
 
-def write_to_sql(
+async def write_to_sql(
     book_id: int,
     title: str,
     author: str,
     blob_name: str,
     cover_blob_name: str,
     content_type: str,
+    content_hash: str,
 ):
-    sessionLocal = next(database.get_db())
     book = models.Book(
         bookId=book_id,
         title=title,
@@ -57,65 +62,76 @@ def write_to_sql(
         blob_name=blob_name,
         cover_blob_name=cover_blob_name,
         content_type=content_type,
+        content_hash=content_hash,
     )
-    sessionLocal.add(book)
-    sessionLocal.commit()
-    sessionLocal.close()
+    async with database.AsyncSessionLocal() as db:
+        db.add(book)
+        await db.commit()
+    bump_catalog_version(storage.sync_redis())
     logging.info(
         f"Wrote to db: {book_id}, {title}, {author}, {blob_name}, {cover_blob_name}, {content_type}"
     )
     return book
 
 
-def upload_cover_image(cover_blob_name: str, data: bytes):
+def upload_cover_image(blob_service: AzureBlobStorageService, cover_blob_name: str, data: bytes):
     try:
-        blob_service = AzureBlobStorageService(container_name="coverimages")
-        blob_service.upload_blob(cover_blob_name, data)
+        blob_service.upload_blob(cover_blob_name, data, container_name=COVER_CONTAINER)
+    except ResourceExistsError:
+        # Covers are content-addressed, so the existing blob is this exact image
+        logging.info(f"Cover {cover_blob_name} already uploaded")
     except Exception as e:
         logging.error(f"Error uploading cover image: {e}")
 
 
-def extract_metadata(blob_name: str):
+async def extract_metadata(blob_service: AzureBlobStorageService, blob_name: str):
     try:
-        blob_service = AzureBlobStorageService()
         blob_data_bytes = blob_service.download_blob(blob_name)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".epub") as temp_file:
-            temp_file.write(blob_data_bytes)
-            book = epub.read_epub(temp_file.name)
+        # Read the OPF straight from the zip: only the package document and the cover get decompressed
+        zf = zipfile.ZipFile(io.BytesIO(blob_data_bytes))
+        package = read_package(zf)
         
-        cover_blob_name = f"{book.get_metadata('DC', 'title')[0][0]}.png"
+        # The book blob keeps the name it was uploaded under; its hash still dedupes it in the db
+        # (unique index on content_hash), and covers are named by their own bytes
+        cover_blob_name = "FAILURE_DURING_UPLOAD"
         metadata = {
             "book_id": uuid.uuid4(),
-            "title": book.get_metadata("DC", "title")[0][0],
-            "author": book.get_metadata("DC", "creator")[0][0],
+            **package_metadata(package),
             "blob_name": blob_name,
             "cover_blob_name": cover_blob_name,
             "content_type": "application/epub+zip",
+            "content_hash": content_hash(blob_data_bytes),
         }
         
-        for i, item in enumerate(book.get_items()):
-            if item.get_type() == 10 and i == 0:
-                if item.get_content().startswith(b"\x89PNG"):
-                    upload_cover_image(
-                        cover_blob_name, item.get_content()
-                    )
-                else:
-                    logging.warning(f"Item {i} is not an image")
+        cover_href = find_cover_href(zf, package)
+        if cover_href is not None:
+            cover = zf.read(cover_href)
+            metadata["cover_blob_name"] = content_blob_name(content_hash(cover), posixpath.splitext(cover_href)[1].lower())
+            upload_cover_image(
+                blob_service, metadata["cover_blob_name"], cover
+            )
+        else:
+            logging.warning(f"No cover declared in {blob_name}")
         logging.info(f"Writing to sql for {blob_name}: {metadata}")
-        book = write_to_sql(**metadata)
+        book = await write_to_sql(**metadata)
 
     except Exception as e:
         logging.error(f"Error extracting metadata: {e}")
 
 
-def get_ebooks():
+async def get_ebooks():
+    #Instantiate the database
+    await database.instantiate_db()
     blob_service = AzureBlobStorageService()
-    for blob in blob_service.list_blobs():
-        logging.info(f"****blob.name: {blob}")
-        extract_metadata(blob)
+    try:
+        for blob in blob_service.list_blobs():
+            logging.info(f"****blob.name: {blob}")
+            await extract_metadata(blob_service, blob)
+    finally:
+        await database.cleanup_db()
 
 
 if __name__ == "__main__":
-    get_ebooks()
+    asyncio.run(get_ebooks())
 
 # Get ebooks from Azure Blob Storage
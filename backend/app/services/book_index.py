@@ -0,0 +1,66 @@
+# backend/app/services/book_index.py
+import asyncio
+import json
+import logging
+import os
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from .epub import BOOK_INDEX_VERSION, build_index, decode_member
+from .storage import AsyncAzureBlobStorageService
+
+BOOK_CONTAINER = "defaultlibrary"
+# Sidecar blobs holding the pre-extracted per-book index, named "<book blob>.index.json"
+BOOK_INDEX_CONTAINER = os.getenv("AZURE_STORAGE_INDEX_CONTAINER", "bookindex")
+BOOK_INDEX_CACHE_SECONDS = int(os.getenv("BOOK_INDEX_CACHE_SECONDS", "86400"))
+
+
+def book_index_blob_name(blob_name: str) -> str:
+    return f"{blob_name}.index.json"
+
+
+async def load_book_index(storage: AsyncAzureBlobStorageService, blob_name: str) -> dict:
+    """
+    Return the index for a book: Redis first, then the sidecar blob written at ingest.
+    Books ingested before indexing existed are downloaded once, indexed and the sidecar backfilled.
+    """
+    cache_key = f"book_index:{blob_name}"
+    cached = await storage.redis.get(cache_key)
+    if cached:
+        index = json.loads(cached)
+        if index.get("version") == BOOK_INDEX_VERSION:
+            return index
+
+    index = None
+    try:
+        raw = await storage.download_blob(book_index_blob_name(blob_name), container_name=BOOK_INDEX_CONTAINER)
+        index = json.loads(raw)
+    except ResourceNotFoundError:
+        pass
+
+    if index is None or index.get("version") != BOOK_INDEX_VERSION:
+        logging.info(f"book_index.py:load_book_index: building index for {blob_name}")
+        data = await storage.download_blob(blob_name, container_name=BOOK_CONTAINER)
+        index = await asyncio.to_thread(build_index, data)
+        await storage.upload_blob(
+            book_index_blob_name(blob_name),
+            json.dumps(index).encode(),
+            container_name=BOOK_INDEX_CONTAINER,
+            overwrite=True,
+        )
+
+    await storage.redis.set(cache_key, json.dumps(index), ex=BOOK_INDEX_CACHE_SECONDS)
+    return index
+
+
+async def read_book_member(storage: AsyncAzureBlobStorageService, blob_name: str, entry: dict) -> bytes:
+    """Fetch one zip member (chapter, image, stylesheet) with a single ranged blob read."""
+    if entry["compressed_size"] == 0:
+        return b""
+    raw = await storage.download_blob(
+        blob_name,
+        container_name=BOOK_CONTAINER,
+        offset=entry["offset"],
+        length=entry["compressed_size"],
+    )
+    return decode_member(raw, entry)
@@ -0,0 +1,28 @@
+# backend/app/services/catalog.py
+import time
+
+import redis
+import redis.asyncio as aioredis
+
+from .read_fence import READ_YOUR_WRITES_SECONDS, fence_key
+
+# Bumped by every writer of Book rows (the ingestion scripts); read by list_books to build ETags.
+CATALOG_VERSION_KEY = "catalog_version"
+
+
+async def get_catalog_version(redis_client: aioredis.Redis) -> str:
+    version = await redis_client.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed with a timestamp rather than 0 so a flushed Redis never reissues an old version
+        await redis_client.set(CATALOG_VERSION_KEY, time.time_ns(), nx=True)
+        version = await redis_client.get(CATALOG_VERSION_KEY)
+    return version.decode()
+
+
+def bump_catalog_version(redis_client: redis.Redis) -> int:
+    """Call after inserting, updating or deleting Book rows (also fences catalog reads off the replica)."""
+    pipe = redis_client.pipeline()
+    pipe.set(CATALOG_VERSION_KEY, time.time_ns(), nx=True)
+    pipe.incr(CATALOG_VERSION_KEY)
+    pipe.set(fence_key("catalog"), 1, ex=READ_YOUR_WRITES_SECONDS)
+    return pipe.execute()[1]
@@ -0,0 +1,183 @@
+# backend/app/services/completion.py
+import asyncio
+import hashlib
+import logging
+import os
+import random
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+from fastapi import Request
+
+# "azure" for Azure OpenAI, "fake" for the local stand-in used in development and load tests
+CHAT_PROVIDER = os.getenv("CHAT_PROVIDER", "azure")
+
+FAKE_CHAT_TTFT_MS = float(os.getenv("FAKE_CHAT_TTFT_MS", "400"))
+FAKE_CHAT_TOKENS_PER_SECOND = float(os.getenv("FAKE_CHAT_TOKENS_PER_SECOND", "60"))
+FAKE_CHAT_TOKENS = int(os.getenv("FAKE_CHAT_TOKENS", "150"))
+# Each delay is scaled by a random factor in [1 - jitter, 1 + jitter]
+FAKE_CHAT_JITTER = float(os.getenv("FAKE_CHAT_JITTER", "0.3"))
+FAKE_CHAT_ERROR_RATE = float(os.getenv("FAKE_CHAT_ERROR_RATE", "0"))
+
+_FAKE_WORDS = (
+    "the whale ship captain sea voyage chapter reader story harbor storm crew deck"
+    " sail letter night island journey memory character answer passage light"
+).split()
+
+
+class CompletionProvider(ABC):
+    """Streams a chat completion as text deltas. `model` names the deployment for caching and quotas."""
+
+    name = "base"
+    model: str | None = None
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.deltas = 0
+
+    @abstractmethod
+    def _stream(self, messages: list[dict], max_tokens: int) -> AsyncIterator[str]:
+        """The provider's deltas; implement as an async generator (`async def` with `yield`)."""
+
+    async def stream(self, messages: list[dict], max_tokens: int) -> AsyncIterator[str]:
+        self.requests += 1
+        try:
+            async for delta in self._stream(messages, max_tokens):
+                self.deltas += 1
+                yield delta
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.name,
+            "model": self.model,
+            "requests": self.requests,
+            "errors": self.errors,
+            "deltas": self.deltas,
+        }
+
+
+class AzureOpenAIProvider(CompletionProvider):
+    """Azure OpenAI chat completions. The client is created on first use, not at import."""
+
+    name = "azure"
+
+    def __init__(self):
+        super().__init__()
+        self.endpoint = os.getenv("ENDPOINT_URL")
+        self.model = os.getenv("DEPLOYMENT_NAME")
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncAzureOpenAI
+
+            self._client = AsyncAzureOpenAI(
+                azure_endpoint=self.endpoint,
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                api_version="2025-01-01-preview",
+            )
+        return self._client
+
+    async def _stream(self, messages: list[dict], max_tokens: int) -> AsyncIterator[str]:
+        # Generate the streaming completion
+        completion = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.7,
+            top_p=0.95,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=None,
+            stream=True  # Enable streaming
+        )
+
+        # Stream the response token by token
+        async for chunk in completion:
+            if chunk.choices and len(chunk.choices) > 0:
+                if chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+
+
+class FakeProviderError(Exception):
+    pass
+
+
+class FakeProvider(CompletionProvider):
+    """
+    Local stand-in that behaves like a streaming model: a time to first token, then tokens at a
+    steady rate, both jittered, and an optional error rate (half before the first token, half
+    mid-stream). The text is derived from the prompt, so the same question gets the same answer.
+    """
+
+    name = "fake"
+    model = "fake"
+
+    def __init__(
+        self,
+        ttft_ms: float = FAKE_CHAT_TTFT_MS,
+        tokens_per_second: float = FAKE_CHAT_TOKENS_PER_SECOND,
+        tokens: int = FAKE_CHAT_TOKENS,
+        jitter: float = FAKE_CHAT_JITTER,
+        error_rate: float = FAKE_CHAT_ERROR_RATE,
+    ):
+        super().__init__()
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def _jittered(self, seconds: float) -> float:
+        return max(0.0, seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _stream(self, messages: list[dict], max_tokens: int) -> AsyncIterator[str]:
+        prompt = repr(messages[-1]["content"]) if messages else ""
+        words = random.Random(hashlib.sha256(prompt.encode()).digest())
+        count = min(self.tokens, max_tokens)
+        fail_at = None
+        if random.random() < self.error_rate:
+            fail_at = random.choice([0, random.randrange(count) if count else 0])
+
+        await asyncio.sleep(self._jittered(self.ttft_ms / 1000))
+        for i in range(count):
+            if i == fail_at:
+                raise FakeProviderError("Simulated upstream error")
+            if i:
+                await asyncio.sleep(self._jittered(1 / self.tokens_per_second))
+            yield ("" if i == 0 else " ") + words.choice(_FAKE_WORDS)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "ttft_ms": self.ttft_ms,
+            "tokens_per_second": self.tokens_per_second,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+        }
+
+
+def create_provider(name: str = CHAT_PROVIDER) -> CompletionProvider:
+    if name == "fake":
+        logging.info("completion.py:create_provider: using the fake completion provider")
+        return FakeProvider()
+    if name == "azure":
+        return AzureOpenAIProvider()
+    raise ValueError(f"Unknown CHAT_PROVIDER: {name}")
+
+
+def get_completion_provider(request: Request) -> CompletionProvider:
+    """FastAPI dependency: the process-wide completion provider created in the app lifespan."""
+    return request.app.state.completion_provider
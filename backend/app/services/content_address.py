@@ -0,0 +1,26 @@
+# backend/app/services/content_address.py
+import hashlib
+
+# 128 bits of SHA-256 is plenty to keep blob names unique and keeps them short
+BLOB_NAME_HASH_LENGTH = 32
+HASH_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_and_hash(path: str) -> tuple[bytes, str]:
+    """Read a file and hash it in one pass. Meant for asyncio.to_thread: hashlib releases the GIL."""
+    digest = hashlib.sha256()
+    chunks = []
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_READ_CHUNK_SIZE):
+            digest.update(chunk)
+            chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+def content_blob_name(digest: str, extension: str) -> str:
+    """Blob name derived from content: identical bytes always map to the same blob."""
+    return f"{digest[:BLOB_NAME_HASH_LENGTH]}{extension}"
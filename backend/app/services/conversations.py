@@ -0,0 +1,268 @@
+# backend/app/services/conversations.py
+import json
+import logging
+import os
+import re
+import uuid
+
+from fastapi import Request
+from redis.exceptions import RedisError
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .ratelimit import estimate_tokens
+
+# Most recent messages (user and assistant each count) sent upstream verbatim...
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+# ...as long as they fit this many tokens; older turns are folded into the summary
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1500"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+CHAT_HISTORY_TTL_SECONDS = int(os.getenv("CHAT_HISTORY_TTL_SECONDS", "604800"))
+
+SUMMARY_EXCERPT_CHARS = 200
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _first_sentence(text: str) -> str:
+    text = _WHITESPACE.sub(" ", text).strip()
+    text = _SENTENCE_END.split(text, 1)[0]
+    if len(text) > SUMMARY_EXCERPT_CHARS:
+        text = text[:SUMMARY_EXCERPT_CHARS].rsplit(" ", 1)[0] + "..."
+    return text
+
+
+def fold_summary(summary: str, evicted: list[dict], max_tokens: int = CHAT_SUMMARY_TOKENS) -> str:
+    """
+    Extend the rolling summary with turns leaving the window. Extractive (the first sentence of
+    each turn), so it costs no extra completion; capped at max_tokens, dropping the oldest lines.
+    """
+    lines = summary.splitlines() if summary else []
+    for turn in evicted:
+        speaker = "User asked" if turn["role"] == "user" else "Assistant answered"
+        lines.append(f"{speaker}: {_first_sentence(turn['content'])}")
+    max_chars = max_tokens * 4
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def split_window(turns: list[dict]) -> tuple[list[dict], list[dict]]:
+    """(evicted, window): the window is the last CHAT_HISTORY_TURNS turns within CHAT_HISTORY_TOKENS."""
+    window = turns[-CHAT_HISTORY_TURNS:] if CHAT_HISTORY_TURNS > 0 else []
+    while window and estimate_tokens(window) > CHAT_HISTORY_TOKENS:
+        window = window[1:]
+    return turns[: len(turns) - len(window)], window
+
+
+class ConversationHistory:
+    """What the next completion needs from a conversation: the rolling summary and the recent turns."""
+
+    def __init__(self, conversation_id: str | None = None, summary: str = "", turns: list[dict] | None = None):
+        self.conversation_id = conversation_id
+        self.summary = summary
+        # {"id": turn id, "role": "user" | "assistant", "content": text}, oldest first
+        self.turns = turns or []
+
+    def messages(self) -> list[dict]:
+        messages = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": [{"type": "text", "text": f"Summary of the earlier conversation:\n{self.summary}"}],
+            })
+        for turn in self.turns:
+            messages.append({"role": turn["role"], "content": [{"type": "text", "text": turn["content"]}]})
+        return messages
+
+
+class ConversationStore:
+    """
+    Server-side chat history per (user, book). Every turn is appended to SQL; Redis holds the
+    summary and the bounded window of recent turns, so loading history is one pipelined round trip
+    however long the conversation gets. A Redis miss (expiry, eviction, outage) rebuilds the window
+    from the SQL tail: the conversation row plus the turns after its summary.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: int = CHAT_HISTORY_TTL_SECONDS):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.redis_hits = 0
+        self.sql_loads = 0
+        self.appends = 0
+        self.turns_summarized = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def _key(user_id, book_id) -> str:
+        return f"chat_history:{user_id}:{book_id or 'general'}"
+
+    async def load(self, db: AsyncSession, user_id, book_id: uuid.UUID | None) -> ConversationHistory:
+        key = self._key(user_id, book_id)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(f"{key}:meta")
+                pipe.lrange(f"{key}:turns", 0, -1)
+                meta, turns = await pipe.execute()
+        except RedisError as e:
+            self.redis_errors += 1
+            logging.warning(f"conversations.py:load: Redis unavailable, loading from SQL: {e}")
+            meta, turns = None, None
+
+        if meta:
+            self.redis_hits += 1
+            return ConversationHistory(
+                meta[b"conversation_id"].decode() or None,
+                meta[b"summary"].decode(),
+                [json.loads(turn) for turn in turns],
+            )
+
+        self.sql_loads += 1
+        history = await self._load_from_sql(db, user_id, book_id)
+        # Cached even when empty, so users without a conversation don't query SQL every time
+        await self._cache(key, history)
+        return history
+
+    async def _load_from_sql(self, db: AsyncSession, user_id, book_id: uuid.UUID | None) -> ConversationHistory:
+        conversation = await self.get_conversation(db, user_id, book_id)
+        if conversation is None:
+            return ConversationHistory()
+        # Everything after the summary; append() keeps this to at most CHAT_HISTORY_TURNS rows
+        result = await db.execute(
+            select(models.ConversationTurn.id, models.ConversationTurn.role, models.ConversationTurn.content)
+            .where(
+                models.ConversationTurn.conversation_id == conversation.id,
+                models.ConversationTurn.id > conversation.summarized_through,
+            )
+            .order_by(models.ConversationTurn.id)
+        )
+        turns = [{"id": row.id, "role": row.role, "content": row.content} for row in result]
+        return ConversationHistory(str(conversation.id), conversation.summary or "", turns)
+
+    async def get_conversation(self, db: AsyncSession, user_id, book_id: uuid.UUID | None):
+        book_filter = (
+            models.Conversation.book_id.is_(None) if book_id is None else models.Conversation.book_id == book_id
+        )
+        result = await db.execute(
+            select(models.Conversation).where(models.Conversation.user_id == user_id, book_filter)
+        )
+        return result.scalar_one_or_none()
+
+    async def _cache(self, key: str, history: ConversationHistory):
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(f"{key}:turns")
+                if history.turns:
+                    pipe.rpush(f"{key}:turns", *[json.dumps(turn) for turn in history.turns])
+                    pipe.expire(f"{key}:turns", self.ttl_seconds)
+                pipe.hset(f"{key}:meta", mapping={
+                    "conversation_id": history.conversation_id or "",
+                    "summary": history.summary,
+                })
+                pipe.expire(f"{key}:meta", self.ttl_seconds)
+                await pipe.execute()
+        except RedisError as e:
+            self.redis_errors += 1
+            logging.warning(f"conversations.py:_cache: {e}")
+
+    async def _create_conversation(self, db: AsyncSession, user_id, book_id: uuid.UUID | None) -> str:
+        conversation_id = uuid.uuid4()
+        db.add(models.Conversation(
+            id=conversation_id, user_id=user_id, book_id=book_id, summarized_through=0, turn_count=0
+        ))
+        try:
+            await db.commit()
+            return str(conversation_id)
+        except IntegrityError:
+            # Another request created it first
+            await db.rollback()
+            return str((await self.get_conversation(db, user_id, book_id)).id)
+
+    async def append(
+        self, db: AsyncSession, user_id, book_id: uuid.UUID | None, history: ConversationHistory,
+        question: str, answer: str,
+    ) -> ConversationHistory:
+        """
+        Record one exchange: two appended turn rows and one conversation update in a single commit,
+        then the new summary and window written to Redis. Turns pushed out of the window are folded
+        into the summary here, so the next load never has to.
+        """
+        conversation_id = history.conversation_id or await self._create_conversation(db, user_id, book_id)
+        new_turns = [
+            models.ConversationTurn(conversation_id=uuid.UUID(conversation_id), role="user", content=question),
+            models.ConversationTurn(conversation_id=uuid.UUID(conversation_id), role="assistant", content=answer),
+        ]
+        db.add_all(new_turns)
+        await db.flush()
+
+        turns = history.turns + [{"id": turn.id, "role": turn.role, "content": turn.content} for turn in new_turns]
+        evicted, window = split_window(turns)
+        summary = history.summary
+        values = {"turn_count": models.Conversation.turn_count + len(new_turns), "updated_at": func.now()}
+        if evicted:
+            summary = fold_summary(summary, evicted)
+            values.update(summary=summary, summarized_through=evicted[-1]["id"])
+            self.turns_summarized += len(evicted)
+        await db.execute(
+            update(models.Conversation).where(models.Conversation.id == uuid.UUID(conversation_id)).values(**values)
+        )
+        await db.commit()
+        self.appends += 1
+
+        # Concurrent chats in one conversation may each write their own window; SQL keeps every turn
+        updated = ConversationHistory(conversation_id, summary, window)
+        await self._cache(self._key(user_id, book_id), updated)
+        return updated
+
+    async def claim_exchange(self, user_id, response_id: str) -> bool:
+        """
+        True the first time an exchange is about to be recorded for this response, False after.
+        The request that asked and any resume of its response all complete the same answer; only
+        one of them appends it. Without Redis every caller records (a resume may duplicate it).
+        """
+        try:
+            return bool(await self.redis.set(
+                f"chat_exchange:{user_id}:{response_id}", 1, nx=True, ex=self.ttl_seconds
+            ))
+        except RedisError as e:
+            self.redis_errors += 1
+            logging.warning(f"conversations.py:claim_exchange: {e}")
+            return True
+
+    async def clear(self, db: AsyncSession, user_id, book_id: uuid.UUID | None) -> bool:
+        """Delete a conversation and its turns. Returns False if there was none."""
+        conversation = await self.get_conversation(db, user_id, book_id)
+        if conversation is not None:
+            await db.execute(
+                delete(models.ConversationTurn).where(models.ConversationTurn.conversation_id == conversation.id)
+            )
+            await db.delete(conversation)
+            await db.commit()
+        key = self._key(user_id, book_id)
+        try:
+            await self.redis.delete(f"{key}:meta", f"{key}:turns")
+        except RedisError as e:
+            self.redis_errors += 1
+            logging.warning(f"conversations.py:clear: {e}")
+        return conversation is not None
+
+    def stats(self) -> dict:
+        loads = self.redis_hits + self.sql_loads
+        return {
+            "redis_hits": self.redis_hits,
+            "sql_loads": self.sql_loads,
+            "hit_rate": self.redis_hits / loads if loads else 0.0,
+            "appends": self.appends,
+            "turns_summarized": self.turns_summarized,
+            "redis_errors": self.redis_errors,
+            "history_turns": CHAT_HISTORY_TURNS,
+            "history_tokens": CHAT_HISTORY_TOKENS,
+        }
+
+
+def get_conversations(request: Request) -> ConversationStore:
+    """FastAPI dependency: the process-wide conversation store created in the app lifespan."""
+    return request.app.state.conversations
@@ -0,0 +1,55 @@
+# backend/app/services/covers.py
+import io
+
+from PIL import Image
+
+from .content_address import content_blob_name, content_hash
+
+COVER_CONTAINER = "coverimages"
+# Grid tiles render at ~160 CSS px, so these cover 1x, 2x and 4x displays
+COVER_WIDTHS = (160, 320, 640)
+# name -> (Pillow format, blob extension, encoder options)
+COVER_FORMATS = {
+    "webp": ("WEBP", ".webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", ".jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        # JPEG has no alpha channel; flatten onto white like the page behind the cover
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def render_cover_variants(img: Image.Image) -> tuple[dict[str, dict[str, str]], dict[str, bytes]]:
+    """
+    Downscale a cover to every COVER_WIDTHS size (never upscaling past the source, except that
+    the smallest size always exists) and encode each in every COVER_FORMATS format.
+    Returns the variant map stored on Book.cover_variants, {"160": {"webp": blob_name, ...}, ...},
+    and the encoded bytes keyed by their content-addressed blob name.
+    """
+    # For JPEG sources this lets libjpeg decode at a reduced scale, which is most of the cost.
+    # Only the width matters: the scale keeps the aspect ratio, so ask for a 1px height.
+    img.draft("RGB", (max(COVER_WIDTHS), 1))
+    img = _to_rgb(img)
+
+    widths = [width for width in COVER_WIDTHS if width <= img.width] or [COVER_WIDTHS[0]]
+    variants, blobs = {}, {}
+    # Largest first, so each step resamples the previous variant instead of the full-size source
+    for width in sorted(widths, reverse=True):
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.Resampling.LANCZOS)
+        variants[str(width)] = {}
+        for name, (pil_format, extension, options) in COVER_FORMATS.items():
+            buf = io.BytesIO()
+            img.save(buf, format=pil_format, **options)
+            data = buf.getvalue()
+            blob_name = content_blob_name(content_hash(data), extension)
+            variants[str(width)][name] = blob_name
+            blobs[blob_name] = data
+
+    return dict(sorted(variants.items(), key=lambda item: int(item[0]))), blobs
@@ -0,0 +1,352 @@
+# backend/app/services/epub.py
+import io
+import posixpath
+import re
+import struct
+import zipfile
+import zlib
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+# Bump when the index layout changes so stale sidecars get rebuilt
+BOOK_INDEX_VERSION = 4
+
+_WORD = re.compile(r"\w+")
+_WHITESPACE = re.compile(r"\s+")
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+
+
+class EpubFormatError(ValueError):
+    pass
+
+
+def _resolve_href(base_dir: str, href: str) -> str:
+    href = unquote(href.split("#", 1)[0])
+    return posixpath.normpath(posixpath.join(base_dir, href)) if base_dir else posixpath.normpath(href)
+
+
+def read_package(zf: zipfile.ZipFile) -> dict:
+    """
+    Parse META-INF/container.xml and the OPF package document.
+    Returns the OPF path, its manifest ({id: {href, media_type, properties}}) with hrefs resolved
+    to zip member names, the spine, and the raw OPF root for callers that need more.
+    """
+    try:
+        container = ElementTree.fromstring(zf.read("META-INF/container.xml"))
+    except KeyError:
+        raise EpubFormatError("Missing META-INF/container.xml")
+    rootfile = container.find(".//{*}rootfile")
+    if rootfile is None or not rootfile.get("full-path"):
+        raise EpubFormatError("container.xml has no rootfile")
+
+    opf_path = rootfile.get("full-path")
+    opf_dir = posixpath.dirname(opf_path)
+    try:
+        opf = ElementTree.fromstring(zf.read(opf_path))
+    except KeyError:
+        raise EpubFormatError(f"Missing package document {opf_path}")
+
+    manifest = {}
+    for item in opf.iterfind("{*}manifest/{*}item"):
+        if not item.get("id") or not item.get("href"):
+            continue
+        manifest[item.get("id")] = {
+            "href": _resolve_href(opf_dir, item.get("href")),
+            "media_type": item.get("media-type", "application/octet-stream"),
+            "properties": (item.get("properties") or "").split(),
+        }
+
+    spine = []
+    for itemref in opf.iterfind("{*}spine/{*}itemref"):
+        item = manifest.get(itemref.get("idref"))
+        if item is None:
+            continue
+        spine.append({"href": item["href"], "linear": itemref.get("linear", "yes") != "no"})
+
+    return {"opf_path": opf_path, "opf_dir": opf_dir, "opf": opf, "manifest": manifest, "spine": spine}
+
+
+def package_metadata(package: dict) -> dict:
+    """Title and first creator from the OPF <metadata> block."""
+    metadata = package["opf"].find("{*}metadata")
+    title = metadata.findtext("{*}title") if metadata is not None else None
+    creator = metadata.findtext("{*}creator") if metadata is not None else None
+    if not title or not title.strip():
+        raise EpubFormatError("Package has no dc:title")
+    return {"title": title.strip(), "author": (creator or "").strip() or "Unknown"}
+
+
+def _is_image(item: dict) -> bool:
+    return item["media_type"].startswith("image/")
+
+
+def _first_image_in_document(zf: zipfile.ZipFile, href: str) -> str | None:
+    # Cover pages wrap the image in <img src> or, commonly, SVG <image xlink:href>
+    try:
+        document = ElementTree.fromstring(zf.read(href))
+    except (KeyError, ElementTree.ParseError):
+        return None
+    for element in document.iter():
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "img":
+            src = element.get("src")
+        elif tag == "image":
+            src = element.get("{http://www.w3.org/1999/xlink}href") or element.get("href")
+        else:
+            continue
+        if src:
+            return _resolve_href(posixpath.dirname(href), src)
+    return None
+
+
+def find_cover_href(zf: zipfile.ZipFile, package: dict) -> str | None:
+    """
+    Locate the cover image the way reading systems do, in order of reliability:
+    EPUB 3 `properties="cover-image"`, EPUB 2 `<meta name="cover">`, the guide's cover
+    reference (following a cover page to its first image), then an image item named "cover".
+    Returns the zip member name, or None.
+    """
+    manifest = package["manifest"]
+    for item in manifest.values():
+        if "cover-image" in item["properties"] and _is_image(item):
+            return item["href"]
+
+    for meta in package["opf"].iterfind("{*}metadata/{*}meta"):
+        if meta.get("name") != "cover" or not meta.get("content"):
+            continue
+        content = meta.get("content")
+        item = manifest.get(content)
+        # Some producers put the href rather than the id in content
+        if item is None:
+            href = _resolve_href(package["opf_dir"], content)
+            item = next((candidate for candidate in manifest.values() if candidate["href"] == href), None)
+        if item is not None and _is_image(item):
+            return item["href"]
+
+    for reference in package["opf"].iterfind("{*}guide/{*}reference"):
+        if (reference.get("type") or "").lower() != "cover" or not reference.get("href"):
+            continue
+        href = _resolve_href(package["opf_dir"], reference.get("href"))
+        item = next((candidate for candidate in manifest.values() if candidate["href"] == href), None)
+        if item is not None and _is_image(item):
+            return href
+        image_href = _first_image_in_document(zf, href)
+        if image_href is not None:
+            return image_href
+
+    for item_id, item in manifest.items():
+        if _is_image(item) and ("cover" in item_id.lower() or "cover" in posixpath.basename(item["href"]).lower()):
+            return item["href"]
+    return None
+
+
+def read_cover(zf: zipfile.ZipFile, package: dict) -> bytes | None:
+    """Bytes of the cover image only; no other member is decompressed."""
+    href = find_cover_href(zf, package)
+    if href is None:
+        return None
+    try:
+        return zf.read(href)
+    except KeyError:
+        return None
+
+
+class _TextExtractor(HTMLParser):
+    # HTMLParser rather than ElementTree: chapters routinely use HTML entities XML rejects
+    _SKIPPED = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIPPED:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def document_text(content: bytes) -> str:
+    """Visible text of an (X)HTML document with whitespace collapsed."""
+    parser = _TextExtractor()
+    parser.feed(content.decode("utf-8", errors="replace"))
+    parser.close()
+    return _WHITESPACE.sub(" ", " ".join(parser.parts)).strip()
+
+
+def _toc_entry(label: str, href: str, base_dir: str, spine_positions: dict[str, int], children: list) -> dict:
+    fragment = href.split("#", 1)[1] if "#" in href else None
+    member = _resolve_href(base_dir, href)
+    return {
+        "label": _WHITESPACE.sub(" ", label).strip(),
+        "href": member,
+        "fragment": fragment,
+        "spine_index": spine_positions.get(member),
+        "children": children,
+    }
+
+
+def _nav_toc(zf: zipfile.ZipFile, nav_href: str, spine_positions: dict[str, int]) -> list[dict] | None:
+    # EPUB 3 navigation document: <nav epub:type="toc"><ol><li><a href>label</a><ol>...</ol></li></ol>
+    try:
+        document = ElementTree.fromstring(zf.read(nav_href))
+    except (KeyError, ElementTree.ParseError):
+        return None
+    base_dir = posixpath.dirname(nav_href)
+    # iterfind, not iter: only the path API understands the {*} namespace wildcard
+    for nav in document.iterfind(".//{*}nav"):
+        if "toc" in (nav.get("{http://www.idpf.org/2007/ops}type") or "").split():
+            break
+    else:
+        return None
+
+    def walk(ol) -> list[dict]:
+        entries = []
+        for li in ol.iterfind("{*}li"):
+            anchor = li.find("{*}a")
+            if anchor is None:
+                anchor = li.find("{*}span")
+            label = "".join(anchor.itertext()) if anchor is not None else ""
+            href = anchor.get("href") if anchor is not None else None
+            sublist = li.find("{*}ol")
+            children = walk(sublist) if sublist is not None else []
+            if href:
+                entries.append(_toc_entry(label, href, base_dir, spine_positions, children))
+            else:
+                # Unlinked headings just group their children
+                entries.extend(children)
+        return entries
+
+    ol = nav.find("{*}ol")
+    return walk(ol) if ol is not None else []
+
+
+def _ncx_toc(zf: zipfile.ZipFile, ncx_href: str, spine_positions: dict[str, int]) -> list[dict] | None:
+    # EPUB 2 NCX: <navMap><navPoint><navLabel><text/></navLabel><content src/><navPoint>...</navMap>
+    try:
+        document = ElementTree.fromstring(zf.read(ncx_href))
+    except (KeyError, ElementTree.ParseError):
+        return None
+    base_dir = posixpath.dirname(ncx_href)
+
+    def walk(parent) -> list[dict]:
+        entries = []
+        for point in parent.iterfind("{*}navPoint"):
+            content = point.find("{*}content")
+            label = point.findtext("{*}navLabel/{*}text") or ""
+            children = walk(point)
+            if content is not None and content.get("src"):
+                entries.append(_toc_entry(label, content.get("src"), base_dir, spine_positions, children))
+            else:
+                entries.extend(children)
+        return entries
+
+    nav_map = document.find("{*}navMap")
+    return walk(nav_map) if nav_map is not None else []
+
+
+def read_toc(zf: zipfile.ZipFile, package: dict) -> list[dict]:
+    """
+    Table of contents as a tree of {label, href, fragment, spine_index, children}, from the
+    EPUB 3 nav document when present, else the EPUB 2 NCX. Empty when the book has neither.
+    """
+    spine_positions = {}
+    for position, entry in enumerate(package["spine"]):
+        spine_positions.setdefault(entry["href"], position)
+    manifest = package["manifest"]
+
+    nav = next((item for item in manifest.values() if "nav" in item["properties"]), None)
+    if nav is not None:
+        toc = _nav_toc(zf, nav["href"], spine_positions)
+        if toc:
+            return toc
+
+    spine = package["opf"].find("{*}spine")
+    ncx = manifest.get(spine.get("toc")) if spine is not None else None
+    if ncx is None:
+        ncx = next((item for item in manifest.values() if item["media_type"] == "application/x-dtbncx+xml"), None)
+    if ncx is not None:
+        return _ncx_toc(zf, ncx["href"], spine_positions) or []
+    return []
+
+
+def _member_entry(data: bytes, info: zipfile.ZipInfo) -> dict:
+    # The local header's extra field can differ from the central directory's, so read it directly
+    header = _LOCAL_HEADER.unpack_from(data, info.header_offset)
+    if header[0] != b"PK\x03\x04":
+        raise EpubFormatError(f"Bad local header for {info.filename}")
+    name_length, extra_length = header[9], header[10]
+    return {
+        "offset": info.header_offset + _LOCAL_HEADER.size + name_length + extra_length,
+        "compressed_size": info.compress_size,
+        "size": info.file_size,
+        "compression": info.compress_type,
+        "crc": info.CRC,
+    }
+
+
+def build_index(data: bytes) -> dict:
+    """
+    Build the per-book index from the raw EPUB bytes: spine order with plain-text length and word
+    count per chapter, the TOC tree, and for every manifest item where its compressed bytes live
+    inside the zip so a single ranged blob read can serve it (plus container.xml and the OPF).
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        package = read_package(zf)
+        members = {info.filename: info for info in zf.infolist()}
+        # container.xml and the OPF too, so /resources/ can serve the book as an unpacked directory
+        items = {}
+        for href, media_type in (
+            ("META-INF/container.xml", "application/xml"),
+            (package["opf_path"], "application/oebps-package+xml"),
+        ):
+            items[href] = {"media_type": media_type, **_member_entry(data, members[href])}
+        for item in package["manifest"].values():
+            info = members.get(item["href"])
+            if info is None:
+                continue
+            items[item["href"]] = {"media_type": item["media_type"], **_member_entry(data, info)}
+
+        spine = []
+        text_stats = {}
+        for entry in package["spine"]:
+            if entry["href"] not in items:
+                continue
+            if entry["href"] not in text_stats:
+                text = document_text(zf.read(entry["href"]))
+                text_stats[entry["href"]] = {"text_length": len(text), "word_count": len(_WORD.findall(text))}
+            spine.append({**entry, **text_stats[entry["href"]]})
+        toc = read_toc(zf, package)
+
+    return {
+        "version": BOOK_INDEX_VERSION,
+        "size": len(data),
+        "opf_path": package["opf_path"],
+        "spine": spine,
+        "toc": toc,
+        "text_length": sum(stats["text_length"] for stats in text_stats.values()),
+        "word_count": sum(stats["word_count"] for stats in text_stats.values()),
+        "items": items,
+    }
+
+
+def decode_member(raw: bytes, entry: dict) -> bytes:
+    """Inflate the compressed bytes of one zip member, as located by build_index."""
+    if entry["compression"] == zipfile.ZIP_STORED:
+        content = raw
+    elif entry["compression"] == zipfile.ZIP_DEFLATED:
+        content = zlib.decompress(raw, -zlib.MAX_WBITS)
+    else:
+        raise EpubFormatError(f"Unsupported zip compression method {entry['compression']}")
+    if zlib.crc32(content) != entry["crc"]:
+        raise EpubFormatError("CRC mismatch")
+    return content
@@ -0,0 +1,55 @@
+# backend/app/services/http_range.py
+
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, size: int):
+        super().__init__(f"Range not satisfiable for {size} bytes")
+        self.size = size
+
+
+def parse_range_header(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single `bytes=` Range header into an inclusive (start, end) pair.
+    Returns None when the whole representation should be sent: no header, a syntax we ignore
+    (other units, multiple ranges), which RFC 9110 allows servers to answer with a 200.
+    Raises RangeNotSatisfiable when the range lies entirely beyond the end of the resource.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    if size == 0:
+        raise RangeNotSatisfiable(size)
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            suffix_length = int(last)
+            if suffix_length <= 0:
+                raise RangeNotSatisfiable(size)
+            return max(0, size - suffix_length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable(size)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def if_range_matches(if_range: str | None, etag: str | None, last_modified: str | None) -> bool:
+    """True when the Range header should be honored: no If-Range, or it names the current version."""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        # Strong comparison only, as required for If-Range
+        return etag is not None and if_range == etag
+    return last_modified is not None and if_range == last_modified
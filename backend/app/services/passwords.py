@@ -0,0 +1,133 @@
+# backend/app/services/passwords.py
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+from ..metrics import percentile_ms
+
+# Changing these rehashes each user's password on their next login (pwdlib flags the old hash)
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST_KIB = int(os.getenv("ARGON2_MEMORY_COST_KIB", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+# Concurrent hashes; each Argon2 hash holds ARGON2_MEMORY_COST_KIB of memory while it runs
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Requests allowed to wait for a worker; beyond this, logins are refused with 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", "10"))
+
+LATENCY_SAMPLES = 1000
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing queue is full, or a request waited too long for a worker."""
+
+    retry_after = 2
+
+
+class PasswordHasher:
+    """
+    Argon2 (bcrypt still verified for older hashes) off the event loop. Hashes run on a small
+    thread pool: argon2-cffi and bcrypt release the GIL while hashing, so threads give real
+    parallelism without pickling passwords to another process. At most `workers` hashes run at
+    once and at most `max_queue` requests wait, so a login storm queues instead of stalling
+    chat streams and the rest of the API, and sheds load once the queue is full.
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+        queue_timeout: float = PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.password_helper = PasswordHelper(PasswordHash((
+            Argon2Hasher(
+                time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST_KIB, parallelism=ARGON2_PARALLELISM
+            ),
+            BcryptHasher(),
+        )))
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.running = 0
+        self.completed = {"hash": 0, "verify": 0}
+        self.rejected = 0
+        self._wait_times = deque(maxlen=LATENCY_SAMPLES)
+        self._hash_times = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, kind: str, fn, *args):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.rejected += 1
+            logging.warning(f"passwords.py:_run: no hashing worker within {self.queue_timeout}s")
+            raise PasswordHasherBusy()
+        finally:
+            self.waiting -= 1
+
+        started = time.perf_counter()
+        self._wait_times.append(started - queued)
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.running -= 1
+            self._slots.release()
+            self._hash_times.append(time.perf_counter() - started)
+            self.completed[kind] += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.password_helper.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self._run("verify", self.password_helper.verify_and_update, plain_password, hashed_password)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "completed": dict(self.completed),
+            "rejected": self.rejected,
+            "queue_wait_p50_ms": percentile_ms(self._wait_times, 0.5),
+            "queue_wait_p99_ms": percentile_ms(self._wait_times, 0.99),
+            "hash_p50_ms": percentile_ms(self._hash_times, 0.5),
+            "hash_p99_ms": percentile_ms(self._hash_times, 0.99),
+            "argon2": {
+                "time_cost": ARGON2_TIME_COST,
+                "memory_cost_kib": ARGON2_MEMORY_COST_KIB,
+                "parallelism": ARGON2_PARALLELISM,
+            },
+        }
+
+
+# Process-wide: UserManager is built per request, the pool and its bounds are not
+password_hasher = PasswordHasher()
@@ -0,0 +1,299 @@
+# backend/app/services/ratelimit.py
+import asyncio
+import logging
+import math
+import os
+import uuid
+from typing import AsyncIterator
+
+from fastapi import Request
+from redis.exceptions import RedisError
+
+CHAT_USER_TOKENS_PER_MINUTE = int(os.getenv("CHAT_USER_TOKENS_PER_MINUTE", "20000"))
+CHAT_USER_BURST_TOKENS = int(os.getenv("CHAT_USER_BURST_TOKENS", str(CHAT_USER_TOKENS_PER_MINUTE)))
+# Should match the deployment's TPM quota in Azure OpenAI
+CHAT_DEPLOYMENT_TOKENS_PER_MINUTE = int(os.getenv("CHAT_DEPLOYMENT_TOKENS_PER_MINUTE", "80000"))
+CHAT_MAX_STREAMS_PER_USER = int(os.getenv("CHAT_MAX_STREAMS_PER_USER", "2"))
+# Per process; upstream streams beyond this are refused rather than queued
+CHAT_MAX_UPSTREAM_STREAMS = int(os.getenv("CHAT_MAX_UPSTREAM_STREAMS", "64"))
+# A crashed worker's stream leases expire after this long
+CHAT_STREAM_LEASE_SECONDS = int(os.getenv("CHAT_STREAM_LEASE_SECONDS", "300"))
+
+# Token buckets for every key, all-or-nothing: refill each from the elapsed time, and only if every
+# bucket can pay its cost deduct them all. Time comes from the Redis server so workers agree.
+# KEYS: bucket keys. ARGV: capacity, refill per second, cost (repeated per key).
+# Returns {1, 0, 0} when charged, else {0, retry_after_ms, index of the bucket that is shortest}.
+TOKEN_BUCKET_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local buckets = {}
+local retry_ms = 0
+local limiting = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local cost = math.min(tonumber(ARGV[i * 3]), capacity)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+    if tokens < cost then
+        local wait_ms = math.ceil((cost - tokens) * 1000 / rate)
+        if wait_ms > retry_ms then
+            retry_ms = wait_ms
+            limiting = i
+        end
+    end
+    buckets[i] = {tokens - cost, math.ceil(capacity * 1000 / rate)}
+end
+if retry_ms > 0 then
+    return {0, retry_ms, limiting}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', buckets[i][1], 'ts', now)
+    redis.call('PEXPIRE', key, buckets[i][2])
+end
+return {1, 0, 0}
+"""
+
+# Concurrent stream leases per user as a sorted set scored by lease expiry.
+# KEYS[1]: lease set. ARGV: limit, lease ms, lease id. Returns 1 when acquired, else 0.
+STREAM_LEASE_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+class RateLimited(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Rough prompt size (~4 characters per token plus per-message overhead); no tokenizer needed."""
+    total = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content)
+        total += 4 + len(content) // 4
+    return total
+
+
+class UpstreamSlot:
+    """One of the process's CHAT_MAX_UPSTREAM_STREAMS slots. release() is idempotent."""
+
+    def __init__(self, limiter: "ChatLimiter"):
+        self.limiter = limiter
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.limiter.upstream_streams.release()
+        self.limiter.upstream_open -= 1
+
+
+async def _holding(slot: UpstreamSlot, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    try:
+        async for delta in deltas:
+            yield delta
+    finally:
+        slot.release()
+
+
+async def _admitted_late(admission: "ChatAdmission", deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    admission.limiter.late_upstream += 1
+    slot = await admission.limiter.acquire_upstream(admission.user_id, admission.deployment, admission.cost)
+    async for delta in _holding(slot, deltas):
+        yield delta
+
+
+class ChatAdmission:
+    """
+    What one chat request holds while it streams. release() is idempotent. The upstream slot,
+    if any, moves to the upstream stream once upstream() is called, and is freed when that stream
+    ends rather than when this client's response does (the response cache keeps an upstream call
+    running for other waiters after the client that started it disconnects).
+    """
+
+    def __init__(
+        self,
+        limiter: "ChatLimiter",
+        user_id: str,
+        lease_id: str | None,
+        upstream_slot: UpstreamSlot | None,
+        deployment: str | None = None,
+        cost: int = 0,
+    ):
+        self.limiter = limiter
+        self.user_id = user_id
+        self.lease_id = lease_id
+        self.upstream_slot = upstream_slot
+        self.deployment = deployment
+        self.cost = cost
+        # False when admitted as a cache replay (upstream=False)
+        self.upstream_admitted = upstream_slot is not None
+        self._released = False
+
+    def upstream(self, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Wrap the provider stream so it holds this request's upstream slot until it finishes.
+        A request admitted as a cache replay whose entry expired before it was read still needs an
+        upstream call: the wrapped stream takes a slot and charges the tokens before the provider
+        is called, and raises RateLimited instead when over the limits.
+        """
+        if not self.upstream_admitted:
+            self.upstream_admitted = True
+            return _admitted_late(self, deltas)
+        slot, self.upstream_slot = self.upstream_slot, None
+        if slot is None:
+            return deltas
+        return _holding(slot, deltas)
+
+    async def release(self):
+        if self._released:
+            return
+        self._released = True
+        # Still here when the request never started an upstream call (served by the cache after all)
+        if self.upstream_slot is not None:
+            self.upstream_slot.release()
+            self.upstream_slot = None
+        if self.lease_id is not None:
+            await self.limiter.release_stream(self.user_id, self.lease_id)
+
+
+class ChatLimiter:
+    """
+    Admission control for /api/chat, shared by all workers through Redis:
+    concurrent streams per user, token buckets per user and per deployment charged with the
+    estimated prompt plus max_tokens, and an in-process cap on open upstream streams.
+    Redis outages fail open: the chat stays available, unthrottled.
+    """
+
+    def __init__(self, redis_client, max_upstream_streams: int = CHAT_MAX_UPSTREAM_STREAMS):
+        self.redis = redis_client
+        self._token_bucket = redis_client.register_script(TOKEN_BUCKET_LUA)
+        self._stream_lease = redis_client.register_script(STREAM_LEASE_LUA)
+        self.max_upstream_streams = max_upstream_streams
+        self.upstream_streams = asyncio.Semaphore(max_upstream_streams)
+        self.upstream_open = 0
+        self.admitted = 0
+        # Admitted as cache replays, then called upstream because the entry expired in between
+        self.late_upstream = 0
+        self.limited = {"user_streams": 0, "user_tokens": 0, "deployment_tokens": 0, "upstream_streams": 0}
+        self.redis_errors = 0
+
+    async def acquire_stream(self, user_id: str) -> str | None:
+        lease_id = uuid.uuid4().hex
+        try:
+            acquired = await self._stream_lease(
+                keys=[f"ratelimit:streams:{user_id}"],
+                args=[CHAT_MAX_STREAMS_PER_USER, CHAT_STREAM_LEASE_SECONDS * 1000, lease_id],
+            )
+        except RedisError as e:
+            self.redis_errors += 1
+            logging.warning(f"ratelimit.py:acquire_stream: Redis unavailable, not limiting: {e}")
+            return None
+        if not acquired:
+            self.limited["user_streams"] += 1
+            raise RateLimited("Too many concurrent chats", retry_after=1)
+        return lease_id
+
+    async def release_stream(self, user_id: str, lease_id: str):
+        try:
+            await self.redis.zrem(f"ratelimit:streams:{user_id}", lease_id)
+        except RedisError as e:
+            # The lease expires on its own
+            self.redis_errors += 1
+            logging.warning(f"ratelimit.py:release_stream: {e}")
+
+    async def charge_tokens(self, user_id: str, deployment: str | None, cost: int):
+        buckets = [
+            (f"ratelimit:tokens:user:{user_id}", CHAT_USER_BURST_TOKENS, CHAT_USER_TOKENS_PER_MINUTE / 60),
+            (f"ratelimit:tokens:deployment:{deployment}", CHAT_DEPLOYMENT_TOKENS_PER_MINUTE, CHAT_DEPLOYMENT_TOKENS_PER_MINUTE / 60),
+        ]
+        args = []
+        for _, capacity, rate in buckets:
+            args += [capacity, rate, cost]
+        try:
+            allowed, retry_ms, limiting = await self._token_bucket(keys=[key for key, _, _ in buckets], args=args)
+        except RedisError as e:
+            self.redis_errors += 1
+            logging.warning(f"ratelimit.py:charge_tokens: Redis unavailable, not limiting: {e}")
+            return
+        if not allowed:
+            if limiting == 1:
+                self.limited["user_tokens"] += 1
+                raise RateLimited("Chat token rate limit exceeded", retry_after=int(retry_ms) / 1000)
+            self.limited["deployment_tokens"] += 1
+            raise RateLimited("Chat service is busy", retry_after=int(retry_ms) / 1000)
+
+    async def acquire_upstream(self, user_id: str, deployment: str | None, cost: int) -> UpstreamSlot:
+        """Take an upstream slot and charge `cost` to the token buckets, or raise RateLimited holding neither."""
+        # The local check first, so a refusal here doesn't spend the user's tokens
+        if self.upstream_streams.locked():
+            self.limited["upstream_streams"] += 1
+            raise RateLimited("Chat service is busy", retry_after=1)
+        await self.upstream_streams.acquire()
+        self.upstream_open += 1
+        slot = UpstreamSlot(self)
+        try:
+            await self.charge_tokens(user_id, deployment, cost)
+        except RateLimited:
+            slot.release()
+            raise
+        return slot
+
+    async def admit(self, user_id, deployment: str | None, cost: int, upstream: bool) -> ChatAdmission:
+        """
+        Admit one chat request or raise RateLimited. Requests answered from the response cache
+        (upstream=False) only take a stream lease; the token buckets and upstream slots model
+        the Azure OpenAI quota and process capacity, which a replay doesn't use. If the cached
+        entry expires before the replay reads it, ChatAdmission.upstream() admits the upstream
+        call then.
+        """
+        user_id = str(user_id)
+        lease_id = await self.acquire_stream(user_id)
+        admission = ChatAdmission(self, user_id, lease_id, upstream_slot=None, deployment=deployment, cost=cost)
+        try:
+            if upstream:
+                admission.upstream_slot = await self.acquire_upstream(user_id, deployment, cost)
+                admission.upstream_admitted = True
+        except RateLimited:
+            await admission.release()
+            raise
+        self.admitted += 1
+        return admission
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "late_upstream": self.late_upstream,
+            "limited": dict(self.limited),
+            "redis_errors": self.redis_errors,
+            "upstream_streams_open": self.upstream_open,
+            "max_upstream_streams": self.max_upstream_streams,
+            "max_streams_per_user": CHAT_MAX_STREAMS_PER_USER,
+            "user_tokens_per_minute": CHAT_USER_TOKENS_PER_MINUTE,
+            "deployment_tokens_per_minute": CHAT_DEPLOYMENT_TOKENS_PER_MINUTE,
+        }
+
+
+def get_chat_limiter(request: Request) -> ChatLimiter:
+    """FastAPI dependency: the process-wide chat limiter created in the app lifespan."""
+    return request.app.state.chat_limiter
@@ -0,0 +1,84 @@
+# backend/app/services/read_fence.py
+import logging
+import os
+import time
+
+from redis.exceptions import RedisError
+
+from .. import database
+
+# How far the read replica may trail the primary; reads of a scope written more recently go to the primary
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "15"))
+
+
+def fence_key(scope: str) -> str:
+    """Shared with writers outside the app (the ingestion scripts set it through bump_catalog_version)."""
+    return f"db_fence:{scope}"
+
+
+class ReadFence:
+    """
+    Read-your-writes for the read replica. Writers mark() a scope ("catalog", "user:<id>") after
+    committing; for READ_YOUR_WRITES_SECONDS afterwards active() is true and readers of that scope
+    use the primary instead of a replica that may not have replayed the write yet. Marks live in
+    Redis so every worker sees them, plus in this process so its own writes are fenced even
+    without Redis. Without a read replica there is nothing to fence and active() is always false.
+    """
+
+    def __init__(self, redis_client=None, seconds: int = READ_YOUR_WRITES_SECONDS):
+        self.redis = redis_client
+        self.seconds = seconds
+        self._local: dict[str, float] = {}
+        self.marks = 0
+        self.fenced_reads = 0
+        self.redis_errors = 0
+
+    def attach_redis(self, redis_client):
+        self.redis = redis_client
+
+    async def mark(self, scope: str):
+        if not database.HAS_READ_REPLICA:
+            return
+        self.marks += 1
+        now = time.monotonic()
+        self._local[scope] = now + self.seconds
+        # Drop expired marks so the dict only holds the last few seconds of writes
+        for expired in [s for s, until in self._local.items() if until <= now]:
+            del self._local[expired]
+        if self.redis is not None:
+            try:
+                await self.redis.set(fence_key(scope), 1, ex=self.seconds)
+            except RedisError as e:
+                # Other workers may read this scope from the replica until it catches up
+                self.redis_errors += 1
+                logging.warning(f"read_fence.py:mark: {e}")
+
+    async def active(self, scope: str) -> bool:
+        if not database.HAS_READ_REPLICA:
+            return False
+        fenced = self._local.get(scope, 0) > time.monotonic()
+        if not fenced and self.redis is not None:
+            try:
+                fenced = bool(await self.redis.exists(fence_key(scope)))
+            except RedisError as e:
+                # Can't tell whether there was a recent write: read from the primary to be safe
+                self.redis_errors += 1
+                logging.warning(f"read_fence.py:active: Redis unavailable, using the primary: {e}")
+                fenced = True
+        if fenced:
+            self.fenced_reads += 1
+        return fenced
+
+    def stats(self) -> dict:
+        return {
+            "read_replica": database.HAS_READ_REPLICA,
+            "seconds": self.seconds,
+            "marks": self.marks,
+            "fenced_reads": self.fenced_reads,
+            "redis_errors": self.redis_errors,
+            "routing": dict(database.read_routing),
+        }
+
+
+# Process-wide like the user cache; main.py attaches the shared Redis client at startup
+read_fence = ReadFence()
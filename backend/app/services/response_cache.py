@@ -0,0 +1,185 @@
+# backend/app/services/response_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import AsyncIterator, Callable
+
+from fastapi import Request
+from redis.exceptions import RedisError
+
+CHAT_CACHE_TTL_SECONDS = int(os.getenv("CHAT_CACHE_TTL_SECONDS", "86400"))
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() != "false"
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!]+$")
+_RESPONSE_ID = re.compile(r"[0-9a-f]{64}")
+RESPONSE_KEY_PREFIX = "chat_response:"
+
+
+def normalize_prompt(text: str) -> str:
+    """Case, spacing and trailing punctuation don't change the question."""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", text).strip().lower())
+
+
+def response_cache_key(deployment: str | None, book_id, prompt: str, context: list[dict]) -> str:
+    """
+    Cache key for one completion. `context` is every message sent besides the user's question
+    (system prompt with the retrieved passages, prior turns), hashed so a different retrieval
+    result or history never replays another answer.
+    """
+    context_hash = hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()
+    key = json.dumps([deployment, str(book_id) if book_id else None, normalize_prompt(prompt), context_hash])
+    return f"{RESPONSE_KEY_PREFIX}{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def response_id(cache_key: str) -> str:
+    """The id a client resumes a response by: the hash part of its cache key."""
+    return cache_key.removeprefix(RESPONSE_KEY_PREFIX)
+
+
+def cache_key_for_response_id(response_id: str) -> str | None:
+    if not _RESPONSE_ID.fullmatch(response_id):
+        return None
+    return f"{RESPONSE_KEY_PREFIX}{response_id}"
+
+
+class _Flight:
+    """One upstream completion in progress, fanned out to every request waiting on the same key."""
+
+    def __init__(self):
+        self.deltas: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        self.changed = asyncio.Condition()
+        self.task: asyncio.Task | None = None
+
+    async def run(self, producer: AsyncIterator[str]):
+        try:
+            async for delta in producer:
+                async with self.changed:
+                    self.deltas.append(delta)
+                    self.changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self.changed:
+                self.done = True
+                self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        # Late joiners first get everything produced so far, then follow along
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.deltas) > position or self.done)
+                new_deltas = self.deltas[position:]
+                position += len(new_deltas)
+                done = self.done
+            for delta in new_deltas:
+                yield delta
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class ChatResponseCache:
+    """
+    Redis-backed cache of streamed chat completions, stored as the list of deltas so a hit replays
+    with the same chunking. Identical requests in flight in this process share one upstream call.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: int = CHAT_CACHE_TTL_SECONDS, enabled: bool = CHAT_CACHE_ENABLED):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._inflight: dict[str, _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stores = 0
+        self.upstream_errors = 0
+
+    async def _cached(self, key: str) -> list[str] | None:
+        try:
+            cached = await self.redis.get(key)
+        except RedisError as e:
+            logging.warning(f"response_cache.py:_cached: Redis unavailable, treating as a miss: {e}")
+            return None
+        return json.loads(cached) if cached else None
+
+    async def available(self, key: str) -> bool:
+        """Whether `key` would be served without a new upstream call (cached or already in flight)."""
+        if not self.enabled:
+            return False
+        if key in self._inflight:
+            return True
+        try:
+            return bool(await self.redis.exists(key))
+        except RedisError:
+            return False
+
+    async def _fill(self, key: str, flight: _Flight, producer: AsyncIterator[str]):
+        try:
+            await flight.run(producer)
+            if flight.error is not None:
+                self.upstream_errors += 1
+            elif flight.deltas:
+                try:
+                    await self.redis.set(key, json.dumps(flight.deltas), ex=self.ttl_seconds)
+                    self.stores += 1
+                except RedisError as e:
+                    logging.warning(f"response_cache.py:_fill: could not store response: {e}")
+        finally:
+            # Only after the SET, so a request arriving in between finds either the flight or the entry
+            self._inflight.pop(key, None)
+
+    async def stream(self, key: str, producer_factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield the response for `key`: replayed from Redis, joined to an in-flight call, or produced fresh."""
+        if not self.enabled:
+            async for delta in producer_factory():
+                yield delta
+            return
+
+        cached = await self._cached(key)
+        if cached is not None:
+            self.hits += 1
+            for delta in cached:
+                yield delta
+            return
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            flight = _Flight()
+            self._inflight[key] = flight
+            # Its own task, so the upstream call outlives a leader that disconnects while followers wait
+            flight.task = asyncio.create_task(self._fill(key, flight, producer_factory()))
+
+        async for delta in flight.subscribe():
+            yield delta
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stores": self.stores,
+            "upstream_errors": self.upstream_errors,
+            # Requests served without their own upstream call
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+def get_chat_cache(request: Request) -> ChatResponseCache:
+    """FastAPI dependency: the process-wide chat response cache created in the app lifespan."""
+    return request.app.state.chat_cache
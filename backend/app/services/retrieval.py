@@ -0,0 +1,202 @@
+# backend/app/services/retrieval.py
+import asyncio
+import io
+import json
+import logging
+import math
+import os
+import re
+import zipfile
+from collections import Counter, OrderedDict
+
+from azure.core.exceptions import ResourceNotFoundError
+from fastapi import Request
+
+from .book_index import BOOK_CONTAINER, BOOK_INDEX_CONTAINER
+from .epub import document_text, read_package
+from .storage import AsyncAzureBlobStorageService
+
+# Bump when the sidecar layout or tokenization changes so stale sidecars get rebuilt
+RETRIEVAL_INDEX_VERSION = 1
+CHUNK_WORDS = int(os.getenv("RETRIEVAL_CHUNK_WORDS", "180"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP_WORDS", "30"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_CACHE_BOOKS = int(os.getenv("RETRIEVAL_CACHE_BOOKS", "64"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her his i if in into is it its me my no not "
+    "of on or our she so that the their them then there they this to was we were what when which who "
+    "will with you your".split()
+)
+
+
+def retrieval_blob_name(blob_name: str) -> str:
+    return f"{blob_name}.retrieval.json"
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def chunk_text(text: str, chunk_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS) -> list[str]:
+    """Split into overlapping word windows so an answer straddling a boundary is still retrievable."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap_words)
+    return [" ".join(words[start:start + chunk_words]) for start in range(0, max(1, len(words) - overlap_words), step)]
+
+
+def build_retrieval_index(data: bytes) -> dict:
+    """
+    Chunk every spine document of an EPUB and build a BM25 inverted index over the chunks.
+    The result is plain JSON: chunks [[spine_index, text]], postings {term: [[chunk_id, tf], ...]}
+    and chunk lengths in tokens.
+    """
+    chunks = []
+    postings: dict[str, list[list[int]]] = {}
+    lengths = []
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        package = read_package(zf)
+        seen = set()
+        for spine_index, entry in enumerate(package["spine"]):
+            if entry["href"] in seen:
+                continue
+            seen.add(entry["href"])
+            try:
+                text = document_text(zf.read(entry["href"]))
+            except KeyError:
+                continue
+            for chunk in chunk_text(text):
+                chunk_id = len(chunks)
+                chunks.append([spine_index, chunk])
+                terms = Counter(tokenize(chunk))
+                lengths.append(sum(terms.values()))
+                for term, tf in terms.items():
+                    postings.setdefault(term, []).append([chunk_id, tf])
+
+    return {"version": RETRIEVAL_INDEX_VERSION, "chunks": chunks, "lengths": lengths, "postings": postings}
+
+
+class BookRetriever:
+    """BM25 search over one book's chunks."""
+
+    def __init__(self, index: dict):
+        self.chunks = index["chunks"]
+        self.lengths = index["lengths"]
+        self.postings = index["postings"]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K, max_chapter: int | None = None) -> list[dict]:
+        """
+        Top-k passages for the query as {chapter, text, score}, in reading order.
+        With max_chapter, only chapters up to the reader's position are searched (no spoilers).
+        """
+        total = len(self.chunks)
+        if not total:
+            return []
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (total - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for chunk_id, tf in term_postings:
+                if max_chapter is not None and self.chunks[chunk_id][0] > max_chapter:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / self.average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [
+            {"chapter": self.chunks[chunk_id][0], "text": self.chunks[chunk_id][1], "score": scores[chunk_id]}
+            for chunk_id in sorted(best)
+        ]
+
+
+class RetrieverCache:
+    """In-process LRU of loaded BookRetrievers, so hot books skip the sidecar download and JSON parse."""
+
+    def __init__(self, maxsize: int = RETRIEVAL_CACHE_BOOKS):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, BookRetriever] = OrderedDict()
+        self._loading: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, storage: AsyncAzureBlobStorageService, blob_name: str) -> BookRetriever:
+        retriever = self._entries.get(blob_name)
+        if retriever is not None:
+            self._entries.move_to_end(blob_name)
+            self.hits += 1
+            return retriever
+
+        # Concurrent questions about a cold book share one load
+        pending = self._loading.get(blob_name)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[blob_name] = future
+        try:
+            retriever = BookRetriever(await load_retrieval_index(storage, blob_name))
+            future.set_result(retriever)
+        except Exception as e:
+            future.set_exception(e)
+            # Followers see the exception; make sure it is not also reported as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self._loading[blob_name]
+
+        self._entries[blob_name] = retriever
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return retriever
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+async def load_retrieval_index(storage: AsyncAzureBlobStorageService, blob_name: str) -> dict:
+    """
+    The sidecar written at ingest; books ingested before retrieval existed are downloaded once,
+    indexed and the sidecar backfilled.
+    """
+    try:
+        raw = await storage.download_blob(retrieval_blob_name(blob_name), container_name=BOOK_INDEX_CONTAINER)
+        index = await asyncio.to_thread(json.loads, raw)
+        if index.get("version") == RETRIEVAL_INDEX_VERSION:
+            return index
+    except ResourceNotFoundError:
+        pass
+
+    logging.info(f"retrieval.py:load_retrieval_index: building retrieval index for {blob_name}")
+    data = await storage.download_blob(blob_name, container_name=BOOK_CONTAINER)
+    index = await asyncio.to_thread(build_retrieval_index, data)
+    await storage.upload_blob(
+        retrieval_blob_name(blob_name),
+        json.dumps(index).encode(),
+        container_name=BOOK_INDEX_CONTAINER,
+        overwrite=True,
+    )
+    return index
+
+
+def get_retrievers(request: Request) -> RetrieverCache:
+    """FastAPI dependency: the process-wide retriever LRU created in the app lifespan."""
+    return request.app.state.retrievers
@@ -0,0 +1,85 @@
+# backend/app/services/sas_cache.py
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+
+def sas_expiry(url: str) -> float | None:
+    """Return the signed expiry (`se` query parameter) of a SAS URL as a Unix timestamp."""
+    values = parse_qs(urlsplit(url).query).get("se")
+    if not values:
+        return None
+    try:
+        return datetime.fromisoformat(values[0].replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class SasUrlCache:
+    """
+    In-process LRU of SAS URLs keyed by (container, blob_name), sitting in front of Redis.
+    Each entry remembers the URL's real expiry and is never served once less than
+    `safety_margin_seconds` of validity remain.
+    """
+
+    def __init__(self, maxsize: int = 10000, safety_margin_seconds: int = 300):
+        self.maxsize = maxsize
+        self.safety_margin_seconds = safety_margin_seconds
+        self._entries: OrderedDict[tuple[str | None, str], tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def is_fresh(self, expires_at: float | None, now: float | None = None) -> bool:
+        if expires_at is None:
+            return False
+        now = time.time() if now is None else now
+        return expires_at - now >= self.safety_margin_seconds
+
+    def get(self, container_name: str | None, blob_name: str) -> str | None:
+        key = (container_name, blob_name)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        url, expires_at = entry
+        if not self.is_fresh(expires_at):
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return url
+
+    def put(self, container_name: str | None, blob_name: str, url: str, expires_at: float | None = None):
+        expires_at = sas_expiry(url) if expires_at is None else expires_at
+        if not self.is_fresh(expires_at):
+            return
+
+        key = (container_name, blob_name)
+        self._entries[key] = (url, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "safety_margin_seconds": self.safety_margin_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,147 @@
+# backend/app/services/sql_pool.py
+import bisect
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from ..metrics import percentile, percentile_ms
+
+# Upper bounds (ms) of the checkout latency histogram; the last bucket is everything slower
+CHECKOUT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+LATENCY_SAMPLES = 1000
+
+
+class PoolMetrics:
+    """
+    Connection-pool instrumentation for one engine. Checkout latency is everything a session
+    waits for in pool.connect(): queueing for a free connection once pool_size + max_overflow are
+    in use, opening a new one (including the token hook), and the pre-ping. It is recorded as a
+    histogram plus recent percentiles; pre-pings, connection lifetimes and invalidations come
+    from pool and engine events. Gauges are read from the pool when stats() is called.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.checkout_buckets = [0] * (len(CHECKOUT_BUCKETS_MS) + 1)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.max_checkout_ms = 0.0
+        self._checkout_times = deque(maxlen=LATENCY_SAMPLES)
+        self.pre_pings = 0
+        self.pre_ping_failures = 0
+        self._ping_times = deque(maxlen=LATENCY_SAMPLES)
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.max_in_use = 0
+        self.max_overflow_in_use = 0
+        self._lifetimes = deque(maxlen=LATENCY_SAMPLES)
+
+    def pool_class(self):
+        """The engine's poolclass: AsyncAdaptedQueuePool with connect() timed into these metrics."""
+        metrics = self
+
+        class InstrumentedPool(AsyncAdaptedQueuePool):
+            def connect(self):
+                started = time.perf_counter()
+                try:
+                    connection = super().connect()
+                except PoolTimeoutError:
+                    metrics.checkout_timeouts += 1
+                    raise
+                metrics._observe_checkout(self, time.perf_counter() - started)
+                return connection
+
+        return InstrumentedPool
+
+    def _observe_checkout(self, pool, seconds: float):
+        self.pool = pool
+        self.checkouts += 1
+        self._checkout_times.append(seconds)
+        elapsed_ms = seconds * 1000
+        self.max_checkout_ms = max(self.max_checkout_ms, round(elapsed_ms, 2))
+        self.checkout_buckets[bisect.bisect_left(CHECKOUT_BUCKETS_MS, elapsed_ms)] += 1
+        self.max_in_use = max(self.max_in_use, pool.checkedout())
+        self.max_overflow_in_use = max(self.max_overflow_in_use, pool.overflow())
+
+    def attach(self, engine: AsyncEngine):
+        """Register the event hooks; the engine must have been created with poolclass=pool_class()."""
+        sync_engine = engine.sync_engine
+        self.pool = sync_engine.pool
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "close", self._on_close)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+        event.listen(sync_engine, "soft_invalidate", self._on_invalidate)
+        event.listen(sync_engine, "handle_error", self._on_error)
+
+        # Pre-ping cost: the dialect is per engine, so timing its do_ping only sees this pool
+        dialect = sync_engine.dialect
+        do_ping = dialect.do_ping
+
+        def timed_ping(dbapi_connection):
+            started = time.perf_counter()
+            try:
+                return do_ping(dbapi_connection)
+            finally:
+                self.pre_pings += 1
+                self._ping_times.append(time.perf_counter() - started)
+
+        dialect.do_ping = timed_ping
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+        connection_record.info["pool_connected_at"] = time.monotonic()
+
+    def _on_close(self, dbapi_connection, connection_record):
+        self.closes += 1
+        connected_at = connection_record.info.pop("pool_connected_at", None)
+        if connected_at is not None:
+            self._lifetimes.append(time.monotonic() - connected_at)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def _on_error(self, context):
+        # A failed pre-ping invalidates the stale connection and checkout reconnects
+        if context.is_pre_ping:
+            self.pre_ping_failures += 1
+
+    def stats(self) -> dict:
+        pool = self.pool
+        histogram = {
+            f"le_{bound}ms": count for bound, count in zip(CHECKOUT_BUCKETS_MS, self.checkout_buckets)
+        }
+        histogram[f"gt_{CHECKOUT_BUCKETS_MS[-1]}ms"] = self.checkout_buckets[-1]
+        return {
+            "engine": self.name,
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+            "recycle_seconds": pool._recycle,
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # Negative while fewer than pool_size connections have been opened
+            "overflow": pool.overflow(),
+            "max_in_use": self.max_in_use,
+            "max_overflow_in_use": self.max_overflow_in_use,
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_p50_ms": percentile_ms(self._checkout_times, 0.5),
+            "checkout_p99_ms": percentile_ms(self._checkout_times, 0.99),
+            "checkout_max_ms": self.max_checkout_ms,
+            "checkout_histogram": histogram,
+            "pre_pings": self.pre_pings,
+            "pre_ping_failures": self.pre_ping_failures,
+            "pre_ping_p50_ms": percentile_ms(self._ping_times, 0.5),
+            "pre_ping_p99_ms": percentile_ms(self._ping_times, 0.99),
+            "connects": self.connects,
+            "closes": self.closes,
+            "invalidations": self.invalidations,
+            "connection_lifetime_p50_seconds": round(percentile(self._lifetimes, 0.5), 1) if self._lifetimes else None,
+            "connection_lifetime_max_seconds": round(max(self._lifetimes), 1) if self._lifetimes else None,
+        }
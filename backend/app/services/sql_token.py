@@ -0,0 +1,141 @@
+# backend/app/services/sql_token.py
+import asyncio
+import logging
+import os
+import struct
+import threading
+import time
+
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+
+# The background task refreshes this long before the token expires...
+SQL_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("SQL_TOKEN_REFRESH_MARGIN_SECONDS", "600"))
+# ...and a connection never uses a token closer than this to expiry (it fetches inline instead)
+SQL_TOKEN_MIN_VALIDITY_SECONDS = int(os.getenv("SQL_TOKEN_MIN_VALIDITY_SECONDS", "120"))
+SQL_TOKEN_RETRY_SECONDS = (5, 15, 30, 60)
+
+
+def pack_access_token(token: str) -> bytes:
+    """The ODBC driver's access token struct: UTF-16-LE bytes prefixed with their length."""
+    raw_token = token.encode("utf-16-le")
+    return struct.pack(f"<I{len(raw_token)}s", len(raw_token), raw_token)
+
+
+class AccessTokenProvider:
+    """
+    AAD access token for Azure SQL, cached until shortly before expires_on and refreshed by a
+    background task, so opening a pool connection (warm-up, pre-ping reconnects, overflow bursts)
+    reads a pre-packed attrs_before dict instead of making a blocking token request on the event
+    loop. If the cache is empty or about to expire, attrs_before() still fetches inline, once,
+    under a lock; those fetches are counted as blocking.
+    """
+
+    def __init__(
+        self,
+        credential_factory,
+        scope: str,
+        refresh_margin: int = SQL_TOKEN_REFRESH_MARGIN_SECONDS,
+        min_validity: int = SQL_TOKEN_MIN_VALIDITY_SECONDS,
+    ):
+        self.credential_factory = credential_factory
+        self._credential = None
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.min_validity = min_validity
+        self._attrs_before: dict | None = None
+        self._expires_on = 0.0
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self.refreshes = 0
+        self.failures = 0
+        self.blocking_fetches = 0
+        self.last_refresh_ms: float | None = None
+        self.max_refresh_ms = 0.0
+        self.last_error: str | None = None
+
+    @property
+    def credential(self):
+        # Created on first use, on the refresh thread when started from the lifespan
+        if self._credential is None:
+            self._credential = self.credential_factory()
+        return self._credential
+
+    def _fetch(self):
+        started = time.perf_counter()
+        try:
+            token = self.credential.get_token(self.scope)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.refreshes += 1
+        self.last_refresh_ms = round(elapsed_ms, 1)
+        self.max_refresh_ms = max(self.max_refresh_ms, self.last_refresh_ms)
+        self.last_error = None
+        # Expiry first: a reader that sees the new expiry with the old struct still has a valid token
+        self._expires_on = float(token.expires_on)
+        self._attrs_before = {SQL_COPT_SS_ACCESS_TOKEN: pack_access_token(token.token)}
+        if elapsed_ms > 1000:
+            logging.warning(f"sql_token.py:_fetch: token request took {elapsed_ms:.0f}ms")
+
+    def _valid_for(self) -> float:
+        return self._expires_on - time.time()
+
+    def attrs_before(self) -> dict:
+        """For the do_connect hook: the cached attrs_before, fetched inline only if it's unusable."""
+        attrs_before = self._attrs_before
+        if attrs_before is not None and self._valid_for() > self.min_validity:
+            return attrs_before
+        with self._lock:
+            if self._attrs_before is None or self._valid_for() <= self.min_validity:
+                self.blocking_fetches += 1
+                logging.warning("sql_token.py:attrs_before: no usable cached token, fetching inline")
+                self._fetch()
+            return self._attrs_before
+
+    async def _refresh_loop(self):
+        failures = 0
+        while True:
+            if self._attrs_before is not None and not failures:
+                await asyncio.sleep(max(self._valid_for() - self.refresh_margin, 30))
+            try:
+                await asyncio.to_thread(self._fetch)
+                failures = 0
+            except Exception as e:
+                delay = SQL_TOKEN_RETRY_SECONDS[min(failures, len(SQL_TOKEN_RETRY_SECONDS) - 1)]
+                failures += 1
+                logging.error(f"sql_token.py:_refresh_loop: token refresh failed, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def start(self):
+        """Fetch the first token off the event loop, then keep it fresh in the background."""
+        if self._task is not None:
+            return
+        try:
+            await asyncio.to_thread(self._fetch)
+        except Exception as e:
+            # Connections fall back to inline fetches until the background task succeeds
+            logging.error(f"sql_token.py:start: initial token fetch failed: {e}")
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "expires_in_seconds": round(self._valid_for()) if self._attrs_before else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "blocking_fetches": self.blocking_fetches,
+            "last_refresh_ms": self.last_refresh_ms,
+            "max_refresh_ms": self.max_refresh_ms,
+            "last_error": self.last_error,
+            "background_refresh": self._task is not None and not self._task.done(),
+        }
@@ -2,46 +2,92 @@
 import json
 import logging
 import os
+import time
 from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
 
 import redis
+import redis.asyncio as aioredis
+from azure.core import MatchConditions
 from azure.storage.blob import (
     BlobSasPermissions, 
     BlobServiceClient,
     generate_blob_sas
 )
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from fastapi import Request
+
+from .sas_cache import SasUrlCache, sas_expiry
 
 logging.basicConfig(level=logging.INFO)
-_redis = redis.Redis.from_url(os.getenv("REDIS_URL"))
+_sync_redis: redis.Redis | None = None
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+# In-process (L1) SAS URL cache sizing; URLs with less than the margin left are never served
+SAS_L1_MAXSIZE = int(os.getenv("SAS_L1_MAXSIZE", "10000"))
+SAS_SAFETY_MARGIN_SECONDS = int(os.getenv("SAS_SAFETY_MARGIN_SECONDS", "300"))
+SAS_EXPIRES_IN_HOURS = 1
+# SAS expiries are aligned to the end of fixed windows so every worker signs byte-identical
+# URLs for a blob within a window, which keeps catalog responses (and their ETags) stable.
+SAS_WINDOW_SECONDS = int(os.getenv("SAS_WINDOW_SECONDS", "1800"))
+# Largest single GET against blob storage; bounds memory per streamed download
+BLOB_STREAM_CHUNK_SIZE = int(os.getenv("BLOB_STREAM_CHUNK_SIZE", str(256 * 1024)))
+
+
+def sync_redis() -> redis.Redis:
+    """Synchronous Redis client for the ingestion scripts, created on first use rather than at import."""
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = redis.Redis.from_url(os.getenv("REDIS_URL"))
+    return _sync_redis
+
+
+def current_sas_window(now: float | None = None) -> tuple[int, float]:
+    """Return (window index, window end timestamp) for the SAS signing window containing `now`."""
+    now = time.time() if now is None else now
+    index = int(now // SAS_WINDOW_SECONDS)
+    return index, (index + 1) * SAS_WINDOW_SECONDS
+
 
+class _BlobStorageBase:
+    """Configuration and SAS signing shared by the sync and async services. Signing is local (no I/O)."""
 
-# Placeholder for Azure storage service (for future use)
-class AzureBlobStorageService:
     def __init__(self):
         self.account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
         self.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        self.blob_svc = BlobServiceClient.from_connection_string(self.connection_string)
         self.account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
 
-    def generate_sas_url(self, blob_name: str, expires_in_hours: int = 1, container_name: str | None = None):
-        target_container = container_name if container_name is not None else os.getenv("AZURE_STORAGE_CONTAINER_NAME")
+    def _target_container(self, container_name: str | None) -> str:
+        return container_name if container_name is not None else os.getenv("AZURE_STORAGE_CONTAINER_NAME")
+
+    def _sign_sas_url(self, blob_name: str, expires_in_hours: int, target_container: str) -> str:
         sas = generate_blob_sas(
             account_name=self.account_name,
             container_name=target_container,
             blob_name=blob_name,
             account_key=self.account_key,
             permission=BlobSasPermissions(read=True),
-            expiry=datetime.now(timezone.utc) + timedelta(hours=expires_in_hours),
+            expiry=datetime.fromtimestamp(current_sas_window()[1], timezone.utc) + timedelta(hours=expires_in_hours),
         )
-        logging.info(f"storage.py:generate_sas_url: SAS: {sas}")
-        full_url = f"https://{self.account_name}.blob.core.windows.net/{target_container}/{blob_name}?{sas}"
+        return f"https://{self.account_name}.blob.core.windows.net/{target_container}/{blob_name}?{sas}"
+
+    def generate_sas_url(self, blob_name: str, expires_in_hours: int = 1, container_name: str | None = None):
+        target_container = self._target_container(container_name)
+        full_url = self._sign_sas_url(blob_name, expires_in_hours, target_container)
         logging.info(f"storage.py:generate_sas_url: Full URL: {full_url}")
         return full_url
 
+
+# Synchronous service, used by the ingestion scripts
+class AzureBlobStorageService(_BlobStorageBase):
+    def __init__(self):
+        super().__init__()
+        self.blob_svc = BlobServiceClient.from_connection_string(self.connection_string)
+
     def get_sas_url_cached(self, blob_name: str, container_name: str | None = None) -> str:
         logging.info(f"get_sas_url_cached: {blob_name}")
         key = f"sas_url:{container_name}:{blob_name}"
-        cached = _redis.get(key)
+        cached = sync_redis().get(key)
         if cached:
             logging.info(
                 f"storage.py:get_sas_url_cached: URL Cached: {cached.decode()}"
@@ -51,20 +97,194 @@ class AzureBlobStorageService:
         sas_url = self.generate_sas_url(blob_name, expires_in_hours=1, container_name=container_name)
         logging.info(f"storage.py:get_sas_url_cached: URL Generated: {sas_url}")
 
-        _redis.set(key, sas_url, ex=3500)
+        sync_redis().set(key, sas_url, ex=3500)
         return sas_url
 
+    def get_sas_urls_cached(self, blob_names: list[str], container_name: str | None = None) -> dict[str, str]:
+        """
+        Resolve SAS URLs for many blobs with one MGET and one pipelined SET batch.
+        Only the cache misses are signed (locally, no network). Returns {blob_name: url}.
+        """
+        unique_names = list(dict.fromkeys(blob_names))
+        if not unique_names:
+            return {}
+
+        keys = [f"sas_url:{container_name}:{blob_name}" for blob_name in unique_names]
+        cached_values = sync_redis().mget(keys)
+
+        target_container = self._target_container(container_name)
+        urls: dict[str, str] = {}
+        misses: dict[str, str] = {}
+        for blob_name, key, cached in zip(unique_names, keys, cached_values):
+            if cached:
+                urls[blob_name] = cached.decode()
+            else:
+                sas_url = self._sign_sas_url(blob_name, 1, target_container)
+                urls[blob_name] = sas_url
+                misses[key] = sas_url
+
+        if misses:
+            pipe = sync_redis().pipeline(transaction=False)
+            for key, sas_url in misses.items():
+                pipe.set(key, sas_url, ex=3500)
+            pipe.execute()
+
+        logging.info(
+            f"storage.py:get_sas_urls_cached: {len(unique_names)} blobs, {len(unique_names) - len(misses)} cached, {len(misses)} generated"
+        )
+        return urls
+
     def list_blobs(self, container_name: str | None = None):
-        container_client = self.blob_svc.get_container_client(container_name if container_name is not None else os.getenv("AZURE_STORAGE_CONTAINER_NAME"))
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
         blob_list = container_client.list_blobs()
         return [blob.name for blob in blob_list]
 
-    def upload_blob(self, blob_name: str, data: bytes, metadata: dict = None, container_name: str | None = None):
-        container_client = self.blob_svc.get_container_client(container_name if container_name is not None else os.getenv("AZURE_STORAGE_CONTAINER_NAME"))
+    def upload_blob(self, blob_name: str, data: bytes, metadata: dict = None, container_name: str | None = None, overwrite: bool = False):
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
         blob_client = container_client.get_blob_client(blob_name)
-        blob_client.upload_blob(data, metadata=metadata if metadata else None)
+        blob_client.upload_blob(data, metadata=metadata if metadata else None, overwrite=overwrite)
 
     def download_blob(self, blob_name: str, container_name: str | None = None):
-        container_client = self.blob_svc.get_container_client(container_name if container_name is not None else os.getenv("AZURE_STORAGE_CONTAINER_NAME"))
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
         blob_client = container_client.get_blob_client(blob_name)
         return blob_client.download_blob().readall()
+
+
+class AsyncAzureBlobStorageService(_BlobStorageBase):
+    """
+    Non-blocking counterpart of AzureBlobStorageService for request handlers.
+    Create one instance per process (see main.py lifespan) so the Redis connection
+    pool and the blob client's HTTP session are shared by all requests.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis | None = None):
+        super().__init__()
+        self.blob_svc = AsyncBlobServiceClient.from_connection_string(
+            self.connection_string,
+            max_single_get_size=BLOB_STREAM_CHUNK_SIZE,
+            max_chunk_get_size=BLOB_STREAM_CHUNK_SIZE,
+        )
+        self.redis = redis_client if redis_client is not None else aioredis.Redis.from_url(
+            os.getenv("REDIS_URL"), max_connections=REDIS_MAX_CONNECTIONS
+        )
+        self.sas_cache = SasUrlCache(maxsize=SAS_L1_MAXSIZE, safety_margin_seconds=SAS_SAFETY_MARGIN_SECONDS)
+
+    async def close(self):
+        await self.blob_svc.close()
+        await self.redis.aclose()
+
+    async def get_sas_url_cached(self, blob_name: str, container_name: str | None = None) -> str:
+        """Resolve a SAS URL from the in-process LRU (L1), then Redis (L2), signing only on a miss in both."""
+        cached = self.sas_cache.get(container_name, blob_name)
+        if cached:
+            return cached
+
+        key = f"sas_url:{container_name}:{blob_name}"
+        cached = await self.redis.get(key)
+        if cached:
+            sas_url = cached.decode()
+            expires_at = sas_expiry(sas_url)
+            if self.sas_cache.is_fresh(expires_at):
+                self.sas_cache.put(container_name, blob_name, sas_url, expires_at)
+                return sas_url
+
+        sas_url = self._sign_sas_url(blob_name, SAS_EXPIRES_IN_HOURS, self._target_container(container_name))
+        self.sas_cache.put(container_name, blob_name, sas_url)
+        await self.redis.set(key, sas_url, ex=self._redis_ttl())
+        return sas_url
+
+    async def get_sas_urls_cached(self, blob_names: list[str], container_name: str | None = None) -> dict[str, str]:
+        """
+        Resolve SAS URLs for many blobs: L1 first, then one MGET for the rest, then one pipelined
+        SET batch for the URLs that had to be signed. Returns {blob_name: url}.
+        """
+        unique_names = list(dict.fromkeys(blob_names))
+        urls: dict[str, str] = {}
+        l1_misses = []
+        for blob_name in unique_names:
+            cached = self.sas_cache.get(container_name, blob_name)
+            if cached:
+                urls[blob_name] = cached
+            else:
+                l1_misses.append(blob_name)
+        if not l1_misses:
+            return urls
+
+        keys = [f"sas_url:{container_name}:{blob_name}" for blob_name in l1_misses]
+        cached_values = await self.redis.mget(keys)
+
+        target_container = self._target_container(container_name)
+        misses: dict[str, str] = {}
+        for blob_name, key, cached in zip(l1_misses, keys, cached_values):
+            if cached:
+                sas_url = cached.decode()
+                expires_at = sas_expiry(sas_url)
+                if self.sas_cache.is_fresh(expires_at):
+                    urls[blob_name] = sas_url
+                    self.sas_cache.put(container_name, blob_name, sas_url, expires_at)
+                    continue
+            sas_url = self._sign_sas_url(blob_name, SAS_EXPIRES_IN_HOURS, target_container)
+            urls[blob_name] = sas_url
+            misses[key] = sas_url
+            self.sas_cache.put(container_name, blob_name, sas_url)
+
+        if misses:
+            ttl = self._redis_ttl()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, sas_url in misses.items():
+                    pipe.set(key, sas_url, ex=ttl)
+                await pipe.execute()
+
+        logging.info(
+            f"storage.py:get_sas_urls_cached: {len(unique_names)} blobs, {len(unique_names) - len(l1_misses)} from L1, "
+            f"{len(l1_misses) - len(misses)} from Redis, {len(misses)} generated"
+        )
+        return urls
+
+    def _redis_ttl(self) -> int:
+        # Expire the Redis copy before it drops inside the safety margin
+        return SAS_EXPIRES_IN_HOURS * 3600 - self.sas_cache.safety_margin_seconds
+
+    async def list_blobs(self, container_name: str | None = None):
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
+        return [blob.name async for blob in container_client.list_blobs()]
+
+    async def upload_blob(self, blob_name: str, data: bytes, metadata: dict = None, container_name: str | None = None, overwrite: bool = False):
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
+        blob_client = container_client.get_blob_client(blob_name)
+        await blob_client.upload_blob(data, metadata=metadata if metadata else None, overwrite=overwrite)
+
+    async def download_blob(self, blob_name: str, container_name: str | None = None, offset: int | None = None, length: int | None = None):
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
+        blob_client = container_client.get_blob_client(blob_name)
+        downloader = await blob_client.download_blob(offset=offset, length=length)
+        return await downloader.readall()
+
+    async def get_blob_properties(self, blob_name: str, container_name: str | None = None):
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
+        return await container_client.get_blob_client(blob_name).get_blob_properties()
+
+    async def stream_blob(
+        self,
+        blob_name: str,
+        container_name: str | None = None,
+        offset: int | None = None,
+        length: int | None = None,
+        etag: str | None = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield a blob (or a byte range of it) in chunks of at most BLOB_STREAM_CHUNK_SIZE, straight
+        from the downloader. Pass the etag seen when planning the response so a blob replaced
+        mid-request fails instead of mixing two versions.
+        """
+        container_client = self.blob_svc.get_container_client(self._target_container(container_name))
+        blob_client = container_client.get_blob_client(blob_name)
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        downloader = await blob_client.download_blob(offset=offset, length=length, **conditions)
+        async for chunk in downloader.chunks():
+            yield chunk
+
+
+def get_storage(request: Request) -> AsyncAzureBlobStorageService:
+    """FastAPI dependency returning the process-wide async storage service created in the lifespan."""
+    return request.app.state.storage
@@ -0,0 +1,144 @@
+# backend/app/services/streaming.py
+import asyncio
+import json
+import os
+from typing import AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+# Deltas are held back at most this long before being written out...
+STREAM_FLUSH_MS = int(os.getenv("CHAT_STREAM_FLUSH_MS", "30"))
+# ...or until this many characters are pending, whichever comes first
+STREAM_FLUSH_CHARS = int(os.getenv("CHAT_STREAM_FLUSH_CHARS", "512"))
+
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Disable nginx buffering
+}
+
+
+class _Pending:
+    """Deltas received but not yet flushed, shared between the pump task and the writer."""
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.size = 0
+        self.ended = False
+        self.error: Exception | None = None
+        self.has_data = asyncio.Event()
+        self.flush_now = asyncio.Event()
+
+
+async def coalesce(
+    deltas: AsyncIterator[str], flush_ms: int = STREAM_FLUSH_MS, flush_chars: int = STREAM_FLUSH_CHARS
+) -> AsyncIterator[str]:
+    """
+    Batch small deltas into fewer, larger chunks. A pump task drains the source into a buffer;
+    each chunk is flushed flush_ms after its first delta arrived, or as soon as flush_chars are
+    pending, so no delta is held back longer than flush_ms. Only one timer runs per chunk.
+    """
+    pending = _Pending()
+
+    async def pump():
+        try:
+            async for delta in deltas:
+                pending.parts.append(delta)
+                pending.size += len(delta)
+                pending.has_data.set()
+                if pending.size >= flush_chars:
+                    pending.flush_now.set()
+        except Exception as e:
+            pending.error = e
+        finally:
+            pending.ended = True
+            pending.has_data.set()
+            pending.flush_now.set()
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        while True:
+            await pending.has_data.wait()
+            if not pending.flush_now.is_set():
+                try:
+                    async with asyncio.timeout(flush_ms / 1000):
+                        await pending.flush_now.wait()
+                except TimeoutError:
+                    pass
+            # No await between taking the buffer and resetting it, so the pump can't interleave
+            parts, ended = pending.parts, pending.ended
+            pending.parts, pending.size = [], 0
+            if not ended:
+                pending.has_data.clear()
+                pending.flush_now.clear()
+            if parts:
+                yield "".join(parts)
+            if ended:
+                if pending.error is not None:
+                    raise pending.error
+                return
+    finally:
+        pump_task.cancel()
+
+
+async def skip_chars(deltas: AsyncIterator[str], offset: int) -> AsyncIterator[str]:
+    """Drop the first `offset` characters of a stream, for resuming at a Last-Event-ID."""
+    async for delta in deltas:
+        if offset >= len(delta):
+            offset -= len(delta)
+            continue
+        yield delta[offset:]
+        offset = 0
+
+
+async def sse_events(chunks: AsyncIterator[str], offset: int = 0, response_id: str | None = None) -> AsyncIterator[str]:
+    """
+    Server-sent events: one `message` per chunk with the JSON-encoded text, whose id is the
+    character offset reached (prefixed with "<response_id>:" when there is one), then a final
+    `done` event. A client that reconnects with Last-Event-ID gets the rest of the same response
+    from that offset.
+    """
+    prefix = f"{response_id}:" if response_id else ""
+    async for chunk in chunks:
+        offset += len(chunk)
+        yield f"id: {prefix}{offset}\ndata: {json.dumps(chunk)}\n\n"
+    yield f"id: {prefix}{offset}\nevent: done\ndata: \n\n"
+
+
+def wants_sse(request: Request) -> bool:
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+def last_event_id(request: Request) -> tuple[str | None, int]:
+    """Response id and character offset from Last-Event-ID ("<response_id>:<offset>" or a bare offset)."""
+    response_id, _, offset = request.headers.get("last-event-id", "").rpartition(":")
+    try:
+        return response_id or None, max(0, int(offset))
+    except ValueError:
+        return None, 0
+
+
+def stream_response(
+    request: Request,
+    deltas: AsyncIterator[str],
+    background: BackgroundTask | None = None,
+    response_id: str | None = None,
+) -> StreamingResponse:
+    """
+    Frame a stream of text deltas for the client: coalesced plain text by default, or SSE with
+    resumable event ids when the client sends `Accept: text/event-stream`. `deltas` must be the
+    response named by `response_id` (the one the Last-Event-ID refers to) for a resume to line up.
+    """
+    if wants_sse(request):
+        _, offset = last_event_id(request)
+        if offset:
+            deltas = skip_chars(deltas, offset)
+        return StreamingResponse(
+            sse_events(coalesce(deltas), offset, response_id),
+            media_type="text/event-stream",
+            headers=STREAM_HEADERS,
+            background=background,
+        )
+    return StreamingResponse(coalesce(deltas), media_type="text/plain", headers=STREAM_HEADERS, background=background)
@@ -0,0 +1,144 @@
+# backend/app/services/user_cache.py
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from ..models import User
+
+# Shared across workers and invalidated explicitly on every change
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+# Kept shorter: an invalidation only reaches this process's memory, other workers' copies expire
+USER_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("USER_CACHE_LOCAL_TTL_SECONDS", "5"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "true").lower() != "false"
+
+# Everything a request needs to know about the caller; the password hash never leaves SQL
+CACHED_USER_FIELDS = [column.name for column in User.__table__.columns if column.name != "hashed_password"]
+
+
+def _to_fields(user: User) -> dict:
+    fields = {name: getattr(user, name) for name in CACHED_USER_FIELDS}
+    fields["id"] = str(fields["id"])
+    return fields
+
+
+def _to_user(fields: dict) -> User:
+    # Transient: read it freely, but load the row (db.get) before changing anything
+    return User(**{**fields, "id": uuid.UUID(fields["id"])})
+
+
+class UserCache:
+    """
+    Authenticated users by id, so resolving the session cookie doesn't cost an Azure SQL round trip
+    on every request: an in-process LRU in front of an optional Redis tier. Anything that changes
+    a user (subscription state, Stripe ids, profile) must call invalidate() after committing.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        ttl_seconds: int = USER_CACHE_TTL_SECONDS,
+        local_ttl_seconds: float = USER_CACHE_LOCAL_TTL_SECONDS,
+        max_entries: int = USER_CACHE_MAX_ENTRIES,
+        enabled: bool = USER_CACHE_ENABLED,
+    ):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.local_ttl_seconds = local_ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._local: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.redis_errors = 0
+
+    def attach_redis(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def _key(user_id) -> str:
+        return f"user:{user_id}"
+
+    def _remember(self, key: str, fields: dict):
+        self._local[key] = (time.monotonic() + self.local_ttl_seconds, fields)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def get(self, user_id) -> User | None:
+        if not self.enabled:
+            return None
+        key = self._key(user_id)
+        entry = self._local.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return _to_user(entry[1])
+            del self._local[key]
+
+        if self.redis is not None:
+            try:
+                cached = await self.redis.get(key)
+            except RedisError as e:
+                self.redis_errors += 1
+                logging.warning(f"user_cache.py:get: Redis unavailable, treating as a miss: {e}")
+                cached = None
+            if cached:
+                self.redis_hits += 1
+                fields = json.loads(cached)
+                self._remember(key, fields)
+                return _to_user(fields)
+
+        self.misses += 1
+        return None
+
+    async def put(self, user: User):
+        if not self.enabled:
+            return
+        key = self._key(user.id)
+        fields = _to_fields(user)
+        self._remember(key, fields)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, json.dumps(fields), ex=self.ttl_seconds)
+            except RedisError as e:
+                self.redis_errors += 1
+                logging.warning(f"user_cache.py:put: {e}")
+
+    async def invalidate(self, user_id):
+        key = self._key(user_id)
+        self._local.pop(key, None)
+        self.invalidations += 1
+        if self.redis is not None:
+            try:
+                await self.redis.delete(key)
+            except RedisError as e:
+                # Other workers keep the old entry until its TTL; so does the next read here
+                self.redis_errors += 1
+                logging.warning(f"user_cache.py:invalidate: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "redis": self.redis is not None,
+            "size": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "redis_errors": self.redis_errors,
+        }
+
+
+# Process-wide like the password hasher; main.py attaches the shared Redis client at startup
+user_cache = UserCache()
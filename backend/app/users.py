@@ -1,16 +1,21 @@
 import uuid
-from typing import Optional
+from typing import Any, Optional
 
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, exceptions, schemas
 from fastapi_users.authentication import (
     AuthenticationBackend,
     CookieTransport,
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyUserDatabase
+from . import database
 from .models import User
 from .database import get_user_db
+from .services.passwords import PasswordHasher, password_hasher
+from .services.read_fence import read_fence
+from .services.user_cache import user_cache
 import os
 
 SECRET = os.getenv("SECRET_KEY")
@@ -19,11 +24,83 @@ if not SECRET:
 
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
+    """
+    fastapi-users' manager with password hashing moved off the event loop: create, authenticate
+    and password updates await the shared worker pool in services/passwords.py instead of
+    hashing inline. Otherwise the same as BaseUserManager's implementations.
+    get() (which resolves every session cookie) goes through the user cache first, then the read
+    replica unless the user changed within the read-your-writes window (see user_changed).
+    """
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    def __init__(self, user_db: SQLAlchemyUserDatabase, hasher: PasswordHasher = password_hasher):
+        super().__init__(user_db, password_helper=hasher.password_helper)
+        self.hasher = hasher
+
+    async def get(self, id: uuid.UUID) -> User:
+        user = await user_cache.get(id)
+        if user is None:
+            if database.HAS_READ_REPLICA and not await read_fence.active(f"user:{id}"):
+                async with database.read_session() as session:
+                    user = await session.get(User, id)
+                if user is None:
+                    raise exceptions.UserNotExists()
+            else:
+                user = await super().get(id)
+            await user_cache.put(user)
+        return user
+
+    async def create(
+        self, user_create: schemas.UC, safe: bool = False, request: Optional[Request] = None
+    ) -> User:
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = user_create.create_update_dict() if safe else user_create.create_update_dict_superuser()
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await self.hasher.hash(password)
+
+        created_user = await self.user_db.create(user_dict)
+        await self.on_after_register(created_user, request)
+        return created_user
+
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Still hash, so unknown emails take as long as wrong passwords
+            await self.hasher.hash(credentials.password)
+            return None
+
+        verified, updated_password_hash = await self.hasher.verify_and_update(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        # Rehash on login when the stored hash uses older parameters (or bcrypt)
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+        return user
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        if update_dict.get("password") is not None:
+            update_dict = dict(update_dict)
+            password = update_dict.pop("password")
+            await self.validate_password(password, user)
+            update_dict["hashed_password"] = await self.hasher.hash(password)
+        return await super()._update(user, update_dict)
+
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
+        # The replica may not have the row yet when the new user's first request arrives
+        await read_fence.mark(f"user:{user.id}")
+
+    async def on_after_update(self, user: User, update_dict: dict[str, Any], request: Optional[Request] = None):
+        await user_changed(user.id)
 
     async def on_after_forgot_password(
         self, user: User, token: str, request: Optional[Request] = None
@@ -36,6 +113,12 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
         print(f"Verification requested for user {user.id}. Verification token: {token}")
 
 
+async def user_changed(user_id: uuid.UUID):
+    """Call after committing a change to a user row outside UserManager (Stripe webhooks, checkout)."""
+    await user_cache.invalidate(user_id)
+    await read_fence.mark(f"user:{user_id}")
+
+
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
     yield UserManager(user_db)
 
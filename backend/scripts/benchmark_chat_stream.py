@@ -0,0 +1,117 @@
+## benchmark_chat_stream.py
+## Measure what chat stream framing costs: ASGI sends per second and CPU time per stream, for
+## raw per-delta chunks against the coalescing writer (and its SSE mode), with many concurrent
+## streams of small deltas like the ones Azure OpenAI emits.
+##
+## Runs entirely in-process: each stream is a StreamingResponse whose send() frames the body as
+## an HTTP/1.1 chunk and writes it to a local socket pair (drained by a reader thread), so the
+## per-chunk syscall cost a real server pays is included. No Redis or OpenAI is involved.
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+from dotenv import find_dotenv, load_dotenv
+
+# Add the project's base directory (e.g., 'backend') to sys.path
+script_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(script_file_path)
+backend_dir = os.path.dirname(scripts_dir)
+sys.path.insert(0, backend_dir)
+
+load_dotenv(find_dotenv(".env.dev"))
+
+from fastapi.responses import StreamingResponse
+
+from app.services.streaming import STREAM_HEADERS, coalesce, sse_events
+
+DELTA = "word "
+
+
+async def fake_completion(tokens: int, tokens_per_second: float):
+    interval = 1 / tokens_per_second
+    for _ in range(tokens):
+        await asyncio.sleep(interval)
+        yield DELTA
+
+
+def build_response(mode: str, tokens: int, tokens_per_second: float, flush_ms: int) -> StreamingResponse:
+    deltas = fake_completion(tokens, tokens_per_second)
+    if mode == "raw":
+        return StreamingResponse(deltas, media_type="text/plain", headers=STREAM_HEADERS)
+    chunks = coalesce(deltas, flush_ms=flush_ms)
+    if mode == "sse":
+        return StreamingResponse(sse_events(chunks), media_type="text/event-stream", headers=STREAM_HEADERS)
+    return StreamingResponse(chunks, media_type="text/plain", headers=STREAM_HEADERS)
+
+
+async def run_mode(mode: str, streams: int, tokens: int, tokens_per_second: float, flush_ms: int) -> dict:
+    sends = 0
+    body_bytes = 0
+    writer, reader = socket.socketpair()
+
+    def drain():
+        while reader.recv(1 << 16):
+            pass
+
+    drainer = threading.Thread(target=drain, daemon=True)
+    drainer.start()
+
+    async def send(message):
+        nonlocal sends, body_bytes
+        body = message.get("body", b"")
+        if message["type"] == "http.response.body" and body:
+            sends += 1
+            body_bytes += len(body)
+            writer.sendall(b"%x\r\n%s\r\n" % (len(body), body))
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    # ASGI 2.4 lets StreamingResponse skip its disconnect listener, so only the body is measured
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "path": "/", "headers": []}
+    responses = [build_response(mode, tokens, tokens_per_second, flush_ms) for _ in range(streams)]
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    await asyncio.gather(*[response(scope, receive, send) for response in responses])
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    writer.close()
+    drainer.join()
+    reader.close()
+    return {
+        "mode": mode,
+        "sends": sends,
+        "sends_per_second": sends / wall,
+        "cpu_ms_per_stream": cpu * 1000 / streams,
+        "wall_seconds": wall,
+        "bytes": body_bytes,
+    }
+
+
+async def main(args):
+    print(
+        f"{args.streams} streams x {args.tokens} deltas at {args.tokens_per_second:g} deltas/s, "
+        f"flush {args.flush_ms}ms"
+    )
+    print(f"{'mode':>10} {'sends':>9} {'sends/s':>10} {'cpu ms/stream':>14} {'wall s':>8}")
+    for mode in args.modes:
+        result = await run_mode(mode, args.streams, args.tokens, args.tokens_per_second, args.flush_ms)
+        print(
+            f"{result['mode']:>10} {result['sends']:>9} {result['sends_per_second']:>10.0f} "
+            f"{result['cpu_ms_per_stream']:>14.2f} {result['wall_seconds']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=500, help="Concurrent streams")
+    parser.add_argument("--tokens", type=int, default=300, help="Deltas per stream")
+    parser.add_argument("--tokens-per-second", type=float, default=100, help="Delta rate per stream")
+    parser.add_argument("--flush-ms", type=int, default=30, help="Coalescing window")
+    parser.add_argument("--modes", nargs="+", choices=["raw", "coalesced", "sse"], default=["raw", "coalesced", "sse"])
+    args = parser.parse_args()
+    asyncio.run(main(args))
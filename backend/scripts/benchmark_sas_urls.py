@@ -0,0 +1,89 @@
+## benchmark_sas_urls.py
+## Compare per-book SAS URL resolution (one Redis round-trip per cover) against the
+## batched MGET + pipelined SET path used by list_books, for several catalog sizes.
+##
+## Needs a reachable REDIS_URL (e.g. the redis service from docker-compose.dev.yml).
+## SAS signing is local, so a dummy storage account is used when none is configured.
+
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from dotenv import find_dotenv, load_dotenv
+
+# Add the project's base directory (e.g., 'backend') to sys.path
+script_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(script_file_path)
+backend_dir = os.path.dirname(scripts_dir)
+sys.path.insert(0, backend_dir)
+
+load_dotenv(find_dotenv(".env.dev"))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("AZURE_STORAGE_ACCOUNT_NAME", "benchaccount")
+os.environ.setdefault("AZURE_STORAGE_ACCOUNT_KEY", base64.b64encode(b"benchmark-key").decode())
+os.environ.setdefault(
+    "AZURE_STORAGE_CONNECTION_STRING",
+    "DefaultEndpointsProtocol=https;AccountName=benchaccount;"
+    f"AccountKey={os.environ['AZURE_STORAGE_ACCOUNT_KEY']};EndpointSuffix=core.windows.net",
+)
+
+import logging
+
+from app.services import storage
+from app.services.storage import AzureBlobStorageService
+
+CONTAINER = "benchmarkcovers"
+
+
+def clear_keys(blob_names: list[str]):
+    keys = [f"sas_url:{CONTAINER}:{blob_name}" for blob_name in blob_names]
+    for start in range(0, len(keys), 1000):
+        storage.sync_redis().delete(*keys[start:start + 1000])
+
+
+def time_call(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run(sizes: list[int], repeats: int):
+    service = AzureBlobStorageService()
+    print(f"{'books':>8} {'per-item cold':>14} {'per-item warm':>14} {'batched cold':>13} {'batched warm':>13}  (ms, median of {repeats})")
+    for size in sizes:
+        blob_names = [f"{uuid.uuid4()}.png" for _ in range(size)]
+
+        def per_item():
+            for blob_name in blob_names:
+                service.get_sas_url_cached(blob_name, container_name=CONTAINER)
+
+        def batched():
+            service.get_sas_urls_cached(blob_names, container_name=CONTAINER)
+
+        def cold(fn):
+            clear_keys(blob_names)
+            fn()
+
+        per_item_cold = time_call(lambda: cold(per_item), repeats)
+        per_item_warm = time_call(per_item, repeats)
+        batched_cold = time_call(lambda: cold(batched), repeats)
+        batched_warm = time_call(batched, repeats)
+        clear_keys(blob_names)
+        print(f"{size:>8} {per_item_cold:>14.1f} {per_item_warm:>14.1f} {batched_cold:>13.1f} {batched_warm:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    # Per-URL INFO logging would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    run(args.sizes, args.repeats)
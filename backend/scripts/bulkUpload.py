@@ -1,20 +1,35 @@
+## bulkUpload.py
+## Ingest every EPUB in a directory: upload the book, its cover, its reader index and its chat
+## retrieval index to blob storage and insert the Book rows.
+##
+## Pipeline: a process pool parses EPUBs and renders cover thumbnails, a bounded number of async
+## blob uploads run concurrently, and rows are inserted in multi-row batches. Every committed
+## file is appended to a checkpoint manifest, so an interrupted run resumes where it stopped.
+##
+## Books and covers are content-addressed: blobs are named by the SHA-256 of their bytes and
+## the book hash is stored on Book.content_hash, so a book already in the library (under any
+## file name) is skipped before it is parsed or uploaded. Each file is read from disk once and
+## hashed in the same pass; only new books' bytes are sent on to the parse pool.
+
+import argparse
+import asyncio
 import io
+import json
 import logging
 import os
 import sys
-import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from PIL import Image
 
-from azure.storage.blob import (
-    BlobSasPermissions, 
-    BlobServiceClient,
-    generate_blob_sas
-)
+from azure.core.exceptions import ResourceExistsError
+from PIL import Image
 from dotenv import load_dotenv, find_dotenv
-from ebooklib import epub
-import uuid
-import argparse
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
 logging.basicConfig(level=logging.INFO)
 
 # Add the project's base directory (e.g., 'backend') to sys.path
@@ -24,119 +39,306 @@ backend_dir = os.path.dirname(scripts_dir)
 sys.path.insert(0, backend_dir)  # Prepend to ensure it's prioritized
 
 load_dotenv(find_dotenv('.env.dev'))
-logging.info(f"AZURE_STORAGE_CONNECTION_STRING: {os.getenv('AZURE_STORAGE_CONNECTION_STRING')}")
 
 from app import database, models
-from app.services.storage import AzureBlobStorageService
-
-#Instantiate the database
-database.instantiate_db()
-
-blob_svc = BlobServiceClient.from_connection_string(
-    os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-)
-
-
-def write_to_sql(
-    book_id: int,
-    title: str,
-    author: str,
-    blob_name: str,
-    cover_blob_name: str,
-    content_type: str,
-):
-    sessionLocal = next(database.get_db())
-    book = models.Book(
-        bookId=book_id,
-        title=title,
-        author=author,
-        blob_name=blob_name,
-        cover_blob_name=cover_blob_name,
-        content_type=content_type,
-    )
-    sessionLocal.add(book)
-    sessionLocal.commit()
-    sessionLocal.close()
-    logging.info(
-        f"Wrote to db: {book_id}, {title}, {author}, {blob_name}, {cover_blob_name}, {content_type}"
-    )
-    return book
+from app.services import storage
+from app.services.book_index import BOOK_CONTAINER, BOOK_INDEX_CONTAINER, book_index_blob_name
+from app.services.catalog import bump_catalog_version
+from app.services.content_address import content_blob_name, content_hash, read_and_hash
+from app.services.covers import COVER_CONTAINER, render_cover_variants
+from app.services.epub import build_index, package_metadata, read_cover, read_package
+from app.services.retrieval import build_retrieval_index, retrieval_blob_name
+from app.services.storage import AsyncAzureBlobStorageService
 
+NO_COVER = "FAILURE_DURING_UPLOAD"
+DEFAULT_MANIFEST = ".bulkUpload.manifest.jsonl"
 
-def upload_cover_image(cover_blob_name: str, data: bytes):
-    try:
-        blob_service = AzureBlobStorageService()
-        blob_service.upload_blob(cover_blob_name, data, container_name="coverimages")
-    except Exception as e:
-        logging.error(f"Error uploading cover image: {e}")
 
+def extract_metadata(data: bytes, file_name: str) -> dict:
+    """
+    Parse one EPUB's bytes. Runs in a worker process: everything CPU-bound (zip parsing, Pillow
+    re-encoding and thumbnailing, index building) happens here and only plain bytes/strings come back.
+    """
+    # Only the OPF and the cover image are decompressed; ebooklib would materialize every item
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        package = read_package(zf)
+        cover = read_cover(zf, package)
+    metadata = {
+        **package_metadata(package),
+        "cover_blob_name": NO_COVER,
+        "cover_png": None,
+        "cover_variants": None,
+        "cover_variant_blobs": {},
+        "index_json": json.dumps(build_index(data)).encode(),
+        "retrieval_json": json.dumps(build_retrieval_index(data)).encode(),
+    }
 
-def extract_metadata(file_path: str):
-    try:
-        book = epub.read_epub(file_path)
-        blob_name = file_path.split("/")[-1]
-        cover_blob_name = f"{book.get_metadata('DC', 'title')[0][0]}.png"
-        metadata = {
-            "book_id": uuid.uuid4(),
-            "title": book.get_metadata("DC", "title")[0][0],
-            "author": book.get_metadata("DC", "creator")[0][0],
+    if cover is None:
+        logging.info(f"⚠️ No cover declared in {file_name}")
+    else:
+        try:
+            img = Image.open(io.BytesIO(cover))
+            # Re‐save as PNG into a bytes buffer:
+            buf = io.BytesIO()
+            img.save(buf, format="PNG")
+            metadata["cover_png"] = buf.getvalue()
+            metadata["cover_blob_name"] = content_blob_name(content_hash(metadata["cover_png"]), ".png")
+            # Reopen: render_cover_variants lets JPEG decode at reduced scale, which needs an unloaded image
+            metadata["cover_variants"], metadata["cover_variant_blobs"] = render_cover_variants(
+                Image.open(io.BytesIO(cover))
+            )
+        except Exception:
+            logging.info(f"⚠️ Cover of {file_name} is not a valid image (or Pillow couldn't open it)")
+    return metadata
+
+
+class Checkpoint:
+    """
+    Append-only JSON-lines manifest of files whose Book row has been committed (or skipped).
+    Files recorded as failed are kept for the report but not counted as done, so a resumed run
+    tries them again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: set[str] = set()
+        if path.exists():
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry["status"] == "failed":
+                            self.done.discard(entry["file"])
+                        else:
+                            self.done.add(entry["file"])
+        self._file = open(path, "a")
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self.done
+
+    def record(self, file_names: list[str], status: str):
+        for file_name in file_names:
+            self._file.write(json.dumps({"file": file_name, "status": status}) + "\n")
+            if status == "failed":
+                self.done.discard(file_name)
+            else:
+                self.done.add(file_name)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+async def load_ingested_keys() -> tuple[set[str], set[str]]:
+    """All ingested blob names and content hashes in one streamed query, instead of one lookup per file."""
+    blob_names, hashes = set(), set()
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(models.Book.blob_name, models.Book.content_hash).execution_options(yield_per=10000)
+        )
+        async for blob_name, digest in result:
+            blob_names.add(blob_name)
+            if digest is not None:
+                hashes.add(digest)
+    return blob_names, hashes
+
+
+class Ingester:
+    def __init__(self, blob_service: AsyncAzureBlobStorageService, checkpoint: Checkpoint, pool: ProcessPoolExecutor,
+                 upload_concurrency: int, batch_size: int, known_hashes: set[str]):
+        self.blob_service = blob_service
+        self.checkpoint = checkpoint
+        self.pool = pool
+        # Hashes already in the database or claimed by a file in flight during this run
+        self.known_hashes = known_hashes
+        self.upload_slots = asyncio.Semaphore(upload_concurrency)
+        self.batch_size = batch_size
+        self.batch: list[tuple[str, dict]] = []
+        self.batch_lock = asyncio.Lock()
+        self.ingested = 0
+        self.skipped = 0
+        self.failed = 0
+
+    async def upload(self, blob_name: str, data: bytes, container_name: str, overwrite: bool = False):
+        async with self.upload_slots:
+            try:
+                await self.blob_service.upload_blob(blob_name, data, container_name=container_name, overwrite=overwrite)
+            except ResourceExistsError:
+                # Content-addressed: an existing blob already holds these exact bytes (shared cover,
+                # or a resumed run whose row never got committed)
+                logging.info(f"{container_name}/{blob_name} already uploaded")
+
+    async def process(self, file_path: Path):
+        # Read and hash first (hashlib releases the GIL), so duplicates skip the parse pool entirely
+        data, digest = await asyncio.to_thread(read_and_hash, str(file_path))
+        if digest in self.known_hashes:
+            logging.info(f"Book {file_path.name} is already in the library as {content_blob_name(digest, '.epub')}. Skipping.")
+            self.checkpoint.record([file_path.name], "skipped")
+            self.skipped += 1
+            return
+        self.known_hashes.add(digest)
+
+        try:
+            loop = asyncio.get_running_loop()
+            metadata = await loop.run_in_executor(self.pool, extract_metadata, data, file_path.name)
+            blob_name = content_blob_name(digest, ".epub")
+            uploads = [
+                self.upload(blob_name, data, BOOK_CONTAINER),
+                # Index layouts can change between versions, so always replace them
+                self.upload(book_index_blob_name(blob_name), metadata["index_json"], BOOK_INDEX_CONTAINER, overwrite=True),
+                self.upload(retrieval_blob_name(blob_name), metadata["retrieval_json"], BOOK_INDEX_CONTAINER, overwrite=True),
+            ]
+            if metadata["cover_png"] is not None:
+                uploads.append(self.upload(metadata["cover_blob_name"], metadata["cover_png"], COVER_CONTAINER))
+            for variant_blob_name, variant in metadata["cover_variant_blobs"].items():
+                uploads.append(self.upload(variant_blob_name, variant, COVER_CONTAINER))
+            await asyncio.gather(*uploads)
+        except Exception:
+            # Let a later copy of the same book retry
+            self.known_hashes.discard(digest)
+            raise
+
+        row = {
+            "bookId": uuid.uuid4(),
+            "title": metadata["title"],
+            "author": metadata["author"],
             "blob_name": blob_name,
-            "cover_blob_name": cover_blob_name,
-            "content_type": "application/epub+zip"
+            "cover_blob_name": metadata["cover_blob_name"],
+            "cover_variants": metadata["cover_variants"],
+            "content_type": "application/epub+zip",
+            "content_hash": digest,
         }
-        
-        item = book.get_items()[0]
+        async with self.batch_lock:
+            self.batch.append((file_path.name, row))
+            if len(self.batch) >= self.batch_size:
+                await self.flush()
+
+    async def _insert(self, rows: list[dict]):
+        async with database.AsyncSessionLocal() as db:
+            await db.execute(insert(models.Book), rows)
+            await db.commit()
+
+    async def _insert_batch(self, batch: list[tuple[str, dict]]):
+        """Insert and checkpoint the batch. Rows are removed from it as they are recorded."""
+        try:
+            await self._insert([row for _, row in batch])
+            self.checkpoint.record([file_name for file_name, _ in batch], "ingested")
+            self.ingested += len(batch)
+            batch.clear()
+        except IntegrityError:
+            # Another ingester inserted some of these meanwhile; the unique indexes on blob_name and
+            # content_hash rejected the whole batch, so retry row by row and skip the duplicates
+            logging.warning("Batch insert hit an already ingested book, retrying row by row")
+            while batch:
+                file_name, row = batch[0]
+                try:
+                    await self._insert([row])
+                    self.checkpoint.record([file_name], "ingested")
+                    self.ingested += 1
+                except IntegrityError:
+                    self.checkpoint.record([file_name], "skipped")
+                    self.skipped += 1
+                batch.pop(0)
+
+    async def flush(self):
+        """Insert the pending rows in one multi-row statement. Caller holds batch_lock."""
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        count = len(batch)
+        try:
+            await self._insert_batch(batch)
+        except Exception as e:
+            # Connection drop, timeout: retry whatever was not recorded once
+            logging.warning(f"Batch insert failed, retrying {len(batch)} books: {e}")
+            try:
+                await self._insert_batch(batch)
+            except Exception as e:
+                # Recorded as failed, so the report counts every lost row and a resumed run retries them
+                logging.error(f"Batch insert failed again, {len(batch)} books not written: {e}")
+                self.checkpoint.record([file_name for file_name, _ in batch], "failed")
+                self.failed += len(batch)
+                # A later copy of the same book may still ingest it
+                self.known_hashes.difference_update(row["content_hash"] for _, row in batch)
+        if count > len(batch):
+            bump_catalog_version(storage.sync_redis())
+        logging.info(f"Wrote {count - len(batch)} of {count} books to db")
 
-        if item.get_type() == 10 or item.get_content().startswith(b"\x89PNG"):
-            raw = item.get_content()
+    async def worker(self, queue: asyncio.Queue):
+        while True:
+            file_path = await queue.get()
             try:
-                img = Image.open(io.BytesIO(raw))
-                # Re‐save as PNG into a bytes buffer:
-                buf = io.BytesIO()
-                img.save(buf, format="PNG")
-                png_bytes = buf.getvalue()
-                upload_cover_image(cover_blob_name, png_bytes)
-                logging.info(f"✔️ Converted and uploaded '{cover_blob_name}'")
-            except Exception:
-                logging.info(f"⚠️ Item is not a valid image (or Pillow couldn't open it)")
-                metadata["cover_blob_name"] = "FAILURE_DURING_UPLOAD"
-        logging.info(f"Writing to sql for {blob_name}: {metadata}")
-        book = write_to_sql(**metadata)
-
-    except Exception as e:
-        logging.error(f"Error extracting metadata: {e}")
-
-
-def directoryUpload(directory: str):
+                await self.process(file_path)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Error ingesting {file_path}: {e}")
+            finally:
+                queue.task_done()
+
+
+async def directoryUpload(directory: str, workers: int, upload_concurrency: int, batch_size: int, manifest: str | None):
     directory_path = Path(directory)
     if not directory_path.exists():
         print(f"Directory {directory} does not exist")
         return
 
-    for file_path in directory_path.glob("*.epub"):
-        blob_name = file_path.name
-        
-        db_session_for_check = next(database.get_db())
-        try:
-            existing_book = db_session_for_check.query(models.Book).filter(models.Book.blob_name == blob_name).first()
-        finally:
-            db_session_for_check.close()
+    checkpoint = Checkpoint(Path(manifest) if manifest else directory_path / DEFAULT_MANIFEST)
+    await database.instantiate_db()
+    existing_blob_names, existing_hashes = await load_ingested_keys()
 
-        if existing_book:
-            logging.info(f"Book {blob_name} already exists in the database. Skipping.")
+    file_paths = []
+    already_ingested = []
+    for path in sorted(directory_path.glob("*.epub")):
+        if path.name in checkpoint:
             continue
+        # Books ingested before content addressing are still named after their file
+        if path.name in existing_blob_names:
+            already_ingested.append(path.name)
+        else:
+            file_paths.append(path)
+    if already_ingested:
+        checkpoint.record(already_ingested, "skipped")
+    logging.info(
+        f"{len(file_paths)} files to ingest, {len(already_ingested)} already in the database, "
+        f"{len(checkpoint.done) - len(already_ingested)} already done per {checkpoint.path}"
+    )
 
-        print(f"Uploading {file_path}...")
-        extract_metadata(str(file_path))  # Pass string representation of Path
-        # upload_to_blob_storage(file_path) # This function is not defined in the provided code.
-                                            # Assuming it's defined elsewhere or should be part of extract_metadata.
-                                            # If upload_to_blob_storage is separate and needed, ensure it's correctly called.
+    blob_service = AsyncAzureBlobStorageService()
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            ingester = Ingester(blob_service, checkpoint, pool, upload_concurrency, batch_size, existing_hashes)
+            ingester.skipped = len(already_ingested)
+            # Enough in-flight files to keep both the parse pool and the upload slots busy
+            queue: asyncio.Queue = asyncio.Queue(maxsize=(workers + upload_concurrency) * 2)
+            tasks = [asyncio.create_task(ingester.worker(queue)) for _ in range(workers + upload_concurrency)]
+            for file_path in file_paths:
+                await queue.put(file_path)
+            await queue.join()
+            for task in tasks:
+                task.cancel()
+            async with ingester.batch_lock:
+                await ingester.flush()
+    finally:
+        checkpoint.close()
+        await blob_service.close()
+        await database.cleanup_db()
+
+    elapsed = time.perf_counter() - started
+    processed = ingester.ingested + ingester.skipped + ingester.failed
+    print(
+        f"Ingested {ingester.ingested}, skipped {ingester.skipped}, failed {ingester.failed} "
+        f"in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} files/s)"
+    )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--directory", type=str, default="localStorage")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="EPUB parsing processes")
+    parser.add_argument("--upload-concurrency", type=int, default=16, help="Concurrent blob uploads")
+    parser.add_argument("--batch-size", type=int, default=200, help="Rows per INSERT")
+    parser.add_argument("--manifest", type=str, default=None, help=f"Checkpoint file (default: <directory>/{DEFAULT_MANIFEST})")
     args = parser.parse_args()
-    directoryUpload(args.directory)
-
-# Get ebooks from Azure Blob Storage
+    asyncio.run(directoryUpload(args.directory, args.workers, args.upload_concurrency, args.batch_size, args.manifest))
@@ -0,0 +1,201 @@
+## loadtest_chat.py
+## Drive N concurrent chat streams through the real /api/chat/chat endpoint (middleware,
+## dependencies, response cache, rate limiter, stream coalescing) with the fake completion
+## provider standing in for Azure OpenAI, and report time to first byte, the gap between
+## streamed chunks and event-loop lag, as p50/p99/max.
+##
+## Runs in-process over ASGI, so the numbers are the app's own overhead on top of the simulated
+## model. Needs REDIS_URL (cache and limiter state); the database isn't touched: each stream
+## gets its own synthetic subscribed user and conversation history is not loaded or recorded.
+##
+## Example: python scripts/loadtest_chat.py --streams 500 --ttft-ms 400 --tokens-per-second 60
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+from dotenv import find_dotenv, load_dotenv
+
+# Add the project's base directory (e.g., 'backend') to sys.path
+script_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(script_file_path)
+backend_dir = os.path.dirname(scripts_dir)
+sys.path.insert(0, backend_dir)
+
+load_dotenv(find_dotenv(".env.dev"))
+
+# Before the app is imported: its limits are read at import time. The per-user limits still
+# apply (every stream is a different user) but the deployment quota would only measure itself.
+os.environ["CHAT_PROVIDER"] = "fake"
+os.environ.setdefault("CHAT_DEPLOYMENT_TOKENS_PER_MINUTE", "1000000000")
+
+import redis.asyncio as aioredis
+from fastapi import Request
+
+from app import models
+from app.metrics import percentile_ms
+from app.main import app
+from app.routes import chat
+from app.services.completion import FakeProvider
+from app.services.conversations import ConversationHistory, ConversationStore
+from app.services.ratelimit import ChatLimiter
+from app.services.response_cache import ChatResponseCache
+from app.services.retrieval import get_retrievers
+from app.services.storage import get_storage
+
+LAG_INTERVAL = 0.01
+
+
+class UnrecordedConversations(ConversationStore):
+    """Every stream starts a fresh conversation and nothing is written back."""
+
+    async def load(self, db, user_id, book_id):
+        return ConversationHistory()
+
+    async def append(self, db, user_id, book_id, history, question, answer):
+        return history
+
+
+def loadtest_user(request: Request) -> models.User:
+    return models.User(
+        id=uuid.UUID(request.headers["x-loadtest-user"]),
+        email="loadtest@example.invalid",
+        is_subscribed=True,
+        is_active=True,
+    )
+
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+    return (
+        f"p50 {percentile_ms(values, 0.5):8.1f}ms  p99 {percentile_ms(values, 0.99):8.1f}ms"
+        f"  max {max(values) * 1000:8.1f}ms"
+    )
+
+
+async def run_stream(index: int, sse: bool, results: dict):
+    body = json.dumps({"message": f"Load test question {index} {uuid.uuid4().hex}"}).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"x-loadtest-user", str(uuid.uuid4()).encode()),
+        (b"accept", b"text/event-stream" if sse else b"text/plain"),
+    ]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "https", "path": "/api/chat/chat", "raw_path": b"/api/chat/chat", "query_string": b"",
+        "root_path": "", "headers": headers, "client": ("127.0.0.1", 0), "server": ("testserver", 443),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    status = None
+    chunk_times = []
+    last_chunk = b""
+
+    async def send(message):
+        nonlocal status, last_chunk
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            chunk_times.append(time.perf_counter())
+            last_chunk = message["body"]
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    disconnected.set()
+
+    if status != 200:
+        results["rejected"][status] = results["rejected"].get(status, 0) + 1
+        return
+    if b"Error: " in last_chunk:
+        results["errors"] += 1
+    if chunk_times:
+        results["ttfb"].append(chunk_times[0] - start)
+        results["gaps"].extend(later - earlier for earlier, later in zip(chunk_times, chunk_times[1:]))
+        results["chunks"] += len(chunk_times)
+    results["durations"].append(time.perf_counter() - start)
+
+
+async def monitor_loop_lag(lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        expected = time.perf_counter() + LAG_INTERVAL
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def main(args):
+    provider = FakeProvider(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        tokens=args.tokens,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+    )
+    redis_client = aioredis.Redis.from_url(os.getenv("REDIS_URL"))
+    app.state.completion_provider = provider
+    app.state.chat_cache = ChatResponseCache(redis_client, enabled=not args.no_cache)
+    app.state.chat_limiter = ChatLimiter(redis_client, max_upstream_streams=max(args.streams, 1))
+    app.state.conversations = UnrecordedConversations(redis_client)
+    app.dependency_overrides[chat.verify_subscription] = loadtest_user
+    # Only book chats use storage and retrieval
+    app.dependency_overrides[get_storage] = lambda: None
+    app.dependency_overrides[get_retrievers] = lambda: None
+
+    results = {"ttfb": [], "gaps": [], "durations": [], "chunks": 0, "errors": 0, "rejected": {}}
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lags, stop))
+
+    semaphore = asyncio.Semaphore(args.streams)
+
+    async def limited(index):
+        async with semaphore:
+            await run_stream(index, args.sse, results)
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    await asyncio.gather(*[limited(i) for i in range(args.total or args.streams)])
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    stop.set()
+    await monitor
+    await redis_client.aclose()
+
+    completed = len(results["durations"])
+    print(
+        f"{completed} streams completed in {wall:.2f}s ({args.streams} concurrent, "
+        f"{'SSE' if args.sse else 'text'}); fake model: TTFT {args.ttft_ms:g}ms, "
+        f"{args.tokens} tokens at {args.tokens_per_second:g}/s, jitter {args.jitter:g}"
+    )
+    print(f"  errors {results['errors']}, rejected {results['rejected'] or 0}, chunks {results['chunks']}")
+    print(f"  cpu {cpu:.2f}s ({cpu / wall * 100:.0f}% of one core)")
+    print(f"  time to first byte   {percentiles(results['ttfb'])}")
+    print(f"  inter-chunk latency  {percentiles(results['gaps'])}")
+    print(f"  stream duration      {percentiles(results['durations'])}")
+    print(f"  event-loop lag       {percentiles(lags)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=200, help="Concurrent streams")
+    parser.add_argument("--total", type=int, default=0, help="Streams in total (default: --streams)")
+    parser.add_argument("--ttft-ms", type=float, default=400, help="Simulated time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60, help="Simulated token rate")
+    parser.add_argument("--tokens", type=int, default=150, help="Tokens per response")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Relative jitter on every delay")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of upstream calls that fail")
+    parser.add_argument("--sse", action="store_true", help="Request server-sent events instead of plain text")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    args = parser.parse_args()
+    asyncio.run(main(args))
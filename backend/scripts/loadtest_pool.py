@@ -0,0 +1,152 @@
+## loadtest_pool.py
+## Find the connection pool's saturation point. Runs simulated requests against the database at
+## increasing concurrency levels. Each request checks out a connection, runs a query, and holds
+## the connection for --hold-ms, like an endpoint doing its work inside a session. For each level
+## it reports throughput, checkout wait (p50/p99/max) and pool timeouts. It then names the first
+## level where waits pass --saturation-ms or throughput stops growing. Past that point, more
+## concurrency only queues on the pool: raise DB_POOL_SIZE / DB_MAX_OVERFLOW, or stop there.
+##
+## Uses the same engine, pool settings and token hook as the app (one worker's pool), against
+## AZURE_SQL_CONNECTION_STRING, or the read replica with --read. Pool settings can be overridden
+## per run.
+##
+## Example: python scripts/loadtest_pool.py --levels 5,10,20,40,80 --hold-ms 20 --pool-size 10 --max-overflow 20
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from dotenv import find_dotenv, load_dotenv
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# Add the project's base directory (e.g., 'backend') to sys.path
+script_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(script_file_path)
+backend_dir = os.path.dirname(scripts_dir)
+sys.path.insert(0, backend_dir)
+
+load_dotenv(find_dotenv(".env.dev"))
+
+from app.metrics import percentile_ms
+
+
+def percentiles(values: list[float]) -> dict:
+    return {
+        "p50": percentile_ms(values, 0.5, digits=1),
+        "p99": percentile_ms(values, 0.99, digits=1),
+        "max": percentile_ms(values, 1.0, digits=1),
+    }
+
+
+async def run_level(session_factory, concurrency: int, seconds: float, hold: float, query) -> dict:
+    checkout_times = []
+    completed = 0
+    timeouts = 0
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        nonlocal completed, timeouts, errors
+        while time.perf_counter() < deadline:
+            try:
+                async with session_factory() as session:
+                    started = time.perf_counter()
+                    # The session checks out its connection here
+                    await session.connection()
+                    checkout_times.append(time.perf_counter() - started)
+                    await session.execute(query)
+                    await asyncio.sleep(hold)
+                completed += 1
+            except PoolTimeoutError:
+                timeouts += 1
+            except Exception as e:
+                errors += 1
+                print(f"loadtest_pool.py: request failed: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests_per_second": round(completed / elapsed, 1),
+        "checkout_ms": percentiles(checkout_times),
+        "timeouts": timeouts,
+        "errors": errors,
+    }
+
+
+def saturation_level(results: list[dict], saturation_ms: float) -> int | None:
+    """First level where checkout p99 passes saturation_ms, pool timeouts start, or throughput grows < 10%."""
+    previous = None
+    for result in results:
+        if result["timeouts"] or (result["checkout_ms"]["p99"] or 0) > saturation_ms:
+            return result["concurrency"]
+        if previous and result["requests_per_second"] < previous["requests_per_second"] * 1.1:
+            return result["concurrency"]
+        previous = result
+    return None
+
+
+async def main(args):
+    from sqlalchemy import text
+
+    from app import database
+
+    pool_metrics = database.pool_metrics
+    session_factory = database.AsyncSessionLocal
+    if args.read:
+        if not database.HAS_READ_REPLICA:
+            raise SystemExit("--read needs AZURE_SQL_READ_CONNECTION_STRING or AZURE_SQL_READ_REPLICA=true")
+        pool_metrics = database.read_pool_metrics
+        session_factory = database.ReadSessionLocal
+
+    await database.token_provider.start()
+    try:
+        pool = pool_metrics.stats()
+        print(
+            f"pool_size={pool['pool_size']} max_overflow={pool['max_overflow']} "
+            f"timeout={pool['timeout_seconds']}s pre_ping={database.DB_POOL_PRE_PING} hold={args.hold_ms}ms"
+        )
+        print(f"{'concurrency':>11} {'req/s':>8} {'checkout p50':>13} {'p99':>8} {'max':>8} {'timeouts':>9} {'errors':>7}")
+        results = []
+        for concurrency in args.levels:
+            result = await run_level(session_factory, concurrency, args.seconds, args.hold_ms / 1000, text("SELECT 1"))
+            results.append(result)
+            checkout = result["checkout_ms"]
+            print(
+                f"{concurrency:>11} {result['requests_per_second']:>8} {checkout['p50']:>13} "
+                f"{checkout['p99']:>8} {checkout['max']:>8} {result['timeouts']:>9} {result['errors']:>7}"
+            )
+
+        level = saturation_level(results, args.saturation_ms)
+        if level is None:
+            print("No saturation up to the highest level; try higher --levels")
+        else:
+            print(f"Saturated at concurrency {level}")
+        print(json.dumps(pool_metrics.stats(), indent=2))
+    finally:
+        await database.cleanup_db()
+        await database.token_provider.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step up concurrency against the SQL connection pool to find where it saturates.")
+    parser.add_argument("--levels", type=lambda v: [int(n) for n in v.split(",")], default=[5, 10, 20, 40, 80], help="Comma-separated concurrency levels")
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each level")
+    parser.add_argument("--hold-ms", type=float, default=20, help="How long each request keeps its connection after the query")
+    parser.add_argument("--saturation-ms", type=float, default=50, help="Checkout p99 that counts as saturated")
+    parser.add_argument("--pool-size", type=int, help="Override DB_POOL_SIZE")
+    parser.add_argument("--max-overflow", type=int, help="Override DB_MAX_OVERFLOW")
+    parser.add_argument("--pool-timeout", type=float, help="Override DB_POOL_TIMEOUT")
+    parser.add_argument("--read", action="store_true", help="Load the read replica's pool instead of the primary's")
+    args = parser.parse_args()
+
+    # Before app.database is imported: the pool is built from these at import time
+    for option, env in (("pool_size", "DB_POOL_SIZE"), ("max_overflow", "DB_MAX_OVERFLOW"), ("pool_timeout", "DB_POOL_TIMEOUT")):
+        if getattr(args, option) is not None:
+            os.environ[env] = str(getattr(args, option))
+
+    asyncio.run(main(args))
@@ -0,0 +1,99 @@
+# backend/tests/conftest.py
+import os
+import tempfile
+
+# Before any app import: modules read their configuration at import time
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="ereader-tests-"), "test.db")
+os.environ.update(
+    AZURE_SQL_CONNECTION_STRING="Driver={ODBC Driver 18 for SQL Server};Server=tests",
+    SECRET_KEY="test-secret-key-that-is-long-enough",
+    REDIS_URL="redis://localhost:6379/0",
+    AZURE_STORAGE_ACCOUNT_NAME="tests",
+    AZURE_STORAGE_ACCOUNT_KEY="dGVzdHM=",
+    AZURE_STORAGE_CONNECTION_STRING=(
+        "DefaultEndpointsProtocol=https;AccountName=tests;AccountKey=dGVzdHM=;EndpointSuffix=core.windows.net"
+    ),
+    CHAT_PROVIDER="fake",
+)
+
+import fakeredis
+import pytest
+import sqlalchemy.ext.asyncio
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from sqlalchemy.dialects.mssql import UNIQUEIDENTIFIER
+from sqlalchemy.ext.compiler import compiles
+
+# The suite runs offline: the app's engines point at a SQLite file instead of Azure SQL
+_create_async_engine = sqlalchemy.ext.asyncio.create_async_engine
+
+
+def _sqlite_engine(url, **kwargs):
+    kwargs.pop("connect_args", None)
+    return _create_async_engine(f"sqlite+aiosqlite:///{TEST_DB_PATH}", **kwargs)
+
+
+sqlalchemy.ext.asyncio.create_async_engine = _sqlite_engine
+
+
+@compiles(UNIQUEIDENTIFIER, "sqlite")
+def _uniqueidentifier_on_sqlite(type_, compiler, **kw):
+    return "CHAR(36)"
+
+
+class FakeStorage:
+    """The parts of AsyncAzureBlobStorageService the routes and services use, over a dict of blobs."""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.blobs: dict[tuple[str, str], bytes] = {}
+        # (container, blob, offset, length) of every download
+        self.downloads: list[tuple[str, str, int | None, int | None]] = []
+
+    async def download_blob(self, blob_name, container_name=None, offset=None, length=None):
+        self.downloads.append((container_name, blob_name, offset, length))
+        try:
+            data = self.blobs[(container_name, blob_name)]
+        except KeyError:
+            raise ResourceNotFoundError(f"{blob_name} not found")
+        if offset is not None:
+            data = data[offset:offset + length]
+        return data
+
+    async def upload_blob(self, blob_name, data, metadata=None, container_name=None, overwrite=False):
+        if (container_name, blob_name) in self.blobs and not overwrite:
+            raise ResourceExistsError(f"{blob_name} exists")
+        self.blobs[(container_name, blob_name)] = bytes(data)
+
+    async def get_sas_urls_cached(self, blob_names, container_name=None):
+        return {name: f"https://blobs.test/{container_name}/{name}?sig" for name in blob_names}
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeAsyncRedis()
+
+
+@pytest.fixture
+def storage(redis_client):
+    return FakeStorage(redis_client)
+
+
+@pytest.fixture
+async def db_engine():
+    from app import database, models
+
+    # No AAD token for SQLite
+    for engine in {database.engine, database.read_engine}:
+        if sqlalchemy.event.contains(engine.sync_engine, "do_connect", database.provide_token):
+            sqlalchemy.event.remove(engine.sync_engine, "do_connect", database.provide_token)
+    async with database.engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    yield database.engine
+    async with database.engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.drop_all)
+    await database.engine.dispose()
@@ -0,0 +1,62 @@
+# backend/tests/test_book_index.py
+import json
+
+import pytest
+
+from app.services.book_index import (
+    BOOK_CONTAINER,
+    BOOK_INDEX_CONTAINER,
+    book_index_blob_name,
+    load_book_index,
+    read_book_member,
+)
+from app.services.epub import BOOK_INDEX_VERSION
+
+from .test_epub import NAV_ONLY_EPUB, make_epub
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def book(storage):
+    storage.blobs[(BOOK_CONTAINER, "nav-only.epub")] = make_epub(NAV_ONLY_EPUB)
+
+
+async def test_index_is_built_once_then_served_from_the_sidecar_and_redis(storage, redis_client):
+    index = await load_book_index(storage, "nav-only.epub")
+
+    assert index["version"] == BOOK_INDEX_VERSION
+    assert [entry["label"] for entry in index["toc"]] == ["Chapter One", "Chapter Two"]
+    sidecar = storage.blobs[(BOOK_INDEX_CONTAINER, book_index_blob_name("nav-only.epub"))]
+    assert json.loads(sidecar) == index
+
+    # Cached in Redis: no more blob reads
+    storage.downloads.clear()
+    assert await load_book_index(storage, "nav-only.epub") == index
+    assert storage.downloads == []
+
+    # Redis flushed: the sidecar is read, not the book
+    await redis_client.flushall()
+    assert await load_book_index(storage, "nav-only.epub") == index
+    assert [blob for _, blob, _, _ in storage.downloads] == [book_index_blob_name("nav-only.epub")]
+
+
+async def test_stale_sidecar_is_rebuilt(storage):
+    storage.blobs[(BOOK_INDEX_CONTAINER, book_index_blob_name("nav-only.epub"))] = json.dumps({"version": 0}).encode()
+
+    index = await load_book_index(storage, "nav-only.epub")
+
+    assert index["version"] == BOOK_INDEX_VERSION
+    assert json.loads(storage.blobs[(BOOK_INDEX_CONTAINER, book_index_blob_name("nav-only.epub"))]) == index
+
+
+async def test_members_are_read_with_one_ranged_download_each(storage):
+    index = await load_book_index(storage, "nav-only.epub")
+    storage.downloads.clear()
+
+    for href in ("OEBPS/text/one.xhtml", "OEBPS/content.opf"):
+        entry = index["items"][href]
+        assert (await read_book_member(storage, "nav-only.epub", entry)).decode() == NAV_ONLY_EPUB[href]
+
+    assert all(offset is not None and length for _, _, offset, length in storage.downloads)
+    assert len(storage.downloads) == 2
@@ -0,0 +1,238 @@
+# backend/tests/test_chat.py
+import json
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app import database, models
+from app.routes import chat
+from app.services.book_index import BOOK_CONTAINER
+from app.services.completion import FakeProvider, get_completion_provider
+from app.services.conversations import ConversationHistory, ConversationStore, get_conversations
+from app.services.ratelimit import ChatLimiter, get_chat_limiter
+from app.services.response_cache import ChatResponseCache, get_chat_cache, response_cache_key, response_id
+from app.services.retrieval import RetrieverCache, get_retrievers
+from app.services.storage import get_storage
+
+from .test_retrieval import WHALE_EPUB
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingProvider(FakeProvider):
+    """The fake provider without delays, keeping the messages of every upstream call."""
+
+    def __init__(self):
+        super().__init__(ttft_ms=0, tokens_per_second=10_000, tokens=12, jitter=0, error_rate=0)
+        self.calls: list[list[dict]] = []
+
+    async def _stream(self, messages, max_tokens):
+        self.calls.append(messages)
+        async for delta in super()._stream(messages, max_tokens):
+            yield delta
+
+
+@pytest.fixture
+def provider():
+    return RecordingProvider()
+
+
+@pytest.fixture
+def reader():
+    return models.User(id=uuid.uuid4(), email="reader@test", is_active=True, is_subscribed=True)
+
+
+@pytest.fixture
+def chat_cache(redis_client):
+    return ChatResponseCache(redis_client)
+
+
+@pytest.fixture
+def limiter(redis_client):
+    return ChatLimiter(redis_client)
+
+
+@pytest.fixture
+def conversations(redis_client):
+    return ConversationStore(redis_client)
+
+
+@pytest.fixture
+async def book(db_engine, storage):
+    book_id = uuid.uuid4()
+    async with database.AsyncSessionLocal() as db:
+        db.add(models.Book(
+            bookId=book_id, title="Moby Dick", author="Herman Melville", blob_name="whale.epub",
+            cover_blob_name="whale.png", content_type="application/epub+zip",
+        ))
+        await db.commit()
+    storage.blobs[(BOOK_CONTAINER, "whale.epub")] = WHALE_EPUB
+    return book_id
+
+
+def provide(service):
+    return lambda: service
+
+
+@pytest.fixture
+async def client(db_engine, redis_client, storage, provider, reader, chat_cache, limiter, conversations):
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+    services = {
+        get_storage: storage,
+        get_retrievers: RetrieverCache(),
+        get_completion_provider: provider,
+        get_chat_cache: chat_cache,
+        get_chat_limiter: limiter,
+        get_conversations: conversations,
+    }
+    for dependency, service in services.items():
+        app.dependency_overrides[dependency] = provide(service)
+    app.dependency_overrides[chat.verify_subscription] = lambda: reader
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def system_text(messages: list[dict]) -> str:
+    return messages[0]["content"][0]["text"]
+
+
+async def test_top_passages_are_added_to_the_prompt(client, provider, book):
+    response = await client.post("/api/chat/chat", json={"message": "What did the whale do?", "book_id": str(book)})
+
+    assert response.status_code == 200
+    assert response.text
+    [messages] = provider.calls
+    prompt = system_text(messages)
+    assert '"Moby Dick" by Herman Melville' in prompt
+    assert "[Chapter 1] The white whale breached." in prompt
+    assert messages[-1] == {"role": "user", "content": [{"type": "text", "text": "What did the whale do?"}]}
+
+
+async def test_passages_stop_at_the_readers_chapter(client, provider, book):
+    response = await client.post(
+        "/api/chat/chat", json={"message": "What did the whale do?", "book_id": str(book), "chapter": 0}
+    )
+
+    assert response.status_code == 200
+    prompt = system_text(provider.calls[0])
+    assert "[Chapter 0]" in prompt
+    assert "[Chapter 1]" not in prompt
+
+
+async def test_general_chat_has_no_excerpts(client, provider, db_engine):
+    response = await client.post("/api/chat/chat", json={"message": "Recommend a sea story"})
+
+    assert response.status_code == 200
+    assert system_text(provider.calls[0]) == chat.SYSTEM_PROMPT
+
+
+async def test_unknown_book_is_404(client, provider, db_engine):
+    response = await client.post("/api/chat/chat", json={"message": "Hi", "book_id": str(uuid.uuid4())})
+
+    assert response.status_code == 404
+    assert provider.calls == []
+
+
+QUESTION = "Recommend a sea story"
+ANSWER = ["Moby ", "Dick, ", "or ", "The ", "Whale."]
+
+
+def sse(last_event_id: str | None = None) -> dict:
+    headers = {"Accept": "text/event-stream"}
+    if last_event_id is not None:
+        headers["Last-Event-ID"] = last_event_id
+    return headers
+
+
+def parse_events(body: str) -> tuple[list[str], str]:
+    """(event ids, text) of an SSE body."""
+    ids, text = [], ""
+    for event in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in event.split("\n") if ": " in line)
+        ids.append(fields["id"])
+        if "event: done" not in event:
+            text += json.loads(fields["data"])
+    return ids, text
+
+
+async def cached_unrecorded_answer(redis_client, storage) -> str:
+    """
+    The state a client leaves behind when it disconnects mid-answer: the response completed into
+    the cache, but the exchange was never recorded. Returns the response id.
+    """
+    messages = await chat.build_messages(chat.ChatRequest(message=QUESTION), None, storage, RetrieverCache(), ConversationHistory())
+    key = response_cache_key(RecordingProvider().model, None, QUESTION, messages[:-1])
+    await redis_client.set(key, json.dumps(ANSWER))
+    return response_id(key)
+
+
+async def recorded_turns(conversations, reader) -> list[str]:
+    async with database.AsyncSessionLocal() as db:
+        history = await conversations.load(db, reader.id, None)
+    return [turn["content"] for turn in history.turns]
+
+
+async def test_resume_by_response_id_records_the_exchange_once(client, provider, conversations, reader, redis_client, storage):
+    rid = await cached_unrecorded_answer(redis_client, storage)
+
+    for _ in range(2):
+        response = await client.post("/api/chat/chat", json={"message": QUESTION}, headers=sse(f"{rid}:5"))
+        assert response.status_code == 200
+        ids, text = parse_events(response.text)
+        assert text == "".join(ANSWER)[5:]
+        assert all(event_id.startswith(f"{rid}:") for event_id in ids)
+
+    # Replayed from the cache; recorded by the first resume only
+    assert provider.calls == []
+    assert await recorded_turns(conversations, reader) == [QUESTION, "".join(ANSWER)]
+
+
+async def test_bare_offset_resumes_while_the_history_is_unchanged(client, provider, conversations, reader, redis_client, storage):
+    rid = await cached_unrecorded_answer(redis_client, storage)
+
+    response = await client.post("/api/chat/chat", json={"message": QUESTION}, headers=sse("5"))
+
+    ids, text = parse_events(response.text)
+    assert text == "".join(ANSWER)[5:]
+    assert ids[-1] == f"{rid}:{len(''.join(ANSWER))}"
+    assert provider.calls == []
+    assert await recorded_turns(conversations, reader) == [QUESTION, "".join(ANSWER)]
+
+
+async def test_resuming_a_completed_answer_does_not_record_it_again(client, conversations, reader):
+    first = await client.post("/api/chat/chat", json={"message": QUESTION}, headers=sse())
+    ids, answer = parse_events(first.text)
+    rid = ids[0].split(":")[0]
+
+    resumed = await client.post("/api/chat/chat", json={"message": QUESTION}, headers=sse(f"{rid}:3"))
+
+    assert parse_events(resumed.text)[1] == answer[3:]
+    assert await recorded_turns(conversations, reader) == [QUESTION, answer]
+
+
+@pytest.mark.parametrize("last_event_id", ["0" * 64 + ":5", "not-a-response-id:5"])
+async def test_resume_of_an_unknown_response_is_409(client, provider, conversations, reader, last_event_id):
+    response = await client.post("/api/chat/chat", json={"message": QUESTION}, headers=sse(last_event_id))
+
+    assert response.status_code == 409
+    assert provider.calls == []
+    assert await recorded_turns(conversations, reader) == []
+
+
+async def test_cache_entry_expiring_after_admission_still_charges_upstream(client, provider, chat_cache, limiter, monkeypatch):
+    # Checked as cached (so admitted as a replay), gone by the time it is read
+    async def available(key):
+        return True
+
+    monkeypatch.setattr(chat_cache, "available", available)
+
+    response = await client.post("/api/chat/chat", json={"message": QUESTION})
+
+    assert response.status_code == 200
+    assert len(provider.calls) == 1
+    assert limiter.late_upstream == 1
+    assert limiter.upstream_open == 0
+    assert await limiter.redis.exists("ratelimit:tokens:deployment:" + provider.model)
@@ -0,0 +1,107 @@
+# backend/tests/test_conversations.py
+import uuid
+
+import pytest
+
+from app import database
+from app.services import conversations
+from app.services.conversations import ConversationHistory, ConversationStore, fold_summary, split_window
+
+
+def turn(i: int, role: str = "user", words: int = 5) -> dict:
+    return {"id": i, "role": role, "content": " ".join([f"turn{i}"] * words) + "."}
+
+
+def test_split_window_keeps_the_latest_turns(monkeypatch):
+    monkeypatch.setattr(conversations, "CHAT_HISTORY_TURNS", 4)
+    monkeypatch.setattr(conversations, "CHAT_HISTORY_TOKENS", 10_000)
+    turns = [turn(i) for i in range(1, 8)]
+
+    evicted, window = split_window(turns)
+
+    assert [t["id"] for t in evicted] == [1, 2, 3]
+    assert [t["id"] for t in window] == [4, 5, 6, 7]
+
+
+def test_split_window_drops_turns_over_the_token_budget(monkeypatch):
+    monkeypatch.setattr(conversations, "CHAT_HISTORY_TURNS", 4)
+    monkeypatch.setattr(conversations, "CHAT_HISTORY_TOKENS", 60)
+    turns = [turn(1), turn(2, words=80), turn(3), turn(4)]
+
+    evicted, window = split_window(turns)
+
+    # The long turn and everything before it leave the window
+    assert [t["id"] for t in evicted] == [1, 2]
+    assert [t["id"] for t in window] == [3, 4]
+
+
+def test_fold_summary_keeps_first_sentences_within_the_cap():
+    evicted = [
+        {"role": "user", "content": "Who is Ahab? I keep forgetting."},
+        {"role": "assistant", "content": "The captain of the Pequod.  He lost a leg to the whale."},
+    ]
+
+    summary = fold_summary("", evicted)
+    assert summary.splitlines() == ["User asked: Who is Ahab?", "Assistant answered: The captain of the Pequod."]
+
+    # Over the cap, the oldest lines go first
+    capped = fold_summary(summary, [{"role": "user", "content": "x" * 100}], max_tokens=45)
+    assert capped.splitlines() == ["Assistant answered: The captain of the Pequod.", f"User asked: {'x' * 100}"]
+    # The newest line stays even when it alone is over the cap
+    assert fold_summary(summary, [{"role": "user", "content": "x" * 100}], max_tokens=1).splitlines() == [
+        f"User asked: {'x' * 100}"
+    ]
+
+
+@pytest.mark.anyio
+async def test_append_folds_evicted_turns_and_rebuilds_from_sql(db_engine, redis_client, monkeypatch):
+    monkeypatch.setattr(conversations, "CHAT_HISTORY_TURNS", 4)
+    store = ConversationStore(redis_client)
+    user_id, book_id = uuid.uuid4(), None
+
+    async with database.AsyncSessionLocal() as db:
+        history = await store.load(db, user_id, book_id)
+        assert history.turns == [] and history.conversation_id is None
+        for i in range(3):
+            history = await store.append(db, user_id, book_id, history, f"Question {i}?", f"Answer {i}.")
+
+    # Six turns, a window of four: the first exchange is in the summary
+    assert [t["content"] for t in history.turns] == ["Question 1?", "Answer 1.", "Question 2?", "Answer 2."]
+    assert history.summary.splitlines() == ["User asked: Question 0?", "Assistant answered: Answer 0."]
+    assert store.turns_summarized == 2
+
+    # From Redis
+    async with database.AsyncSessionLocal() as db:
+        cached = await store.load(db, user_id, book_id)
+    assert store.redis_hits == 1
+    assert (cached.summary, cached.turns) == (history.summary, history.turns)
+
+    # Redis lost it: rebuilt from the conversation row and the turns after its summary
+    await redis_client.flushall()
+    async with database.AsyncSessionLocal() as db:
+        rebuilt = await store.load(db, user_id, book_id)
+        conversation = await store.get_conversation(db, user_id, book_id)
+    assert store.sql_loads == 2
+    assert (rebuilt.conversation_id, rebuilt.summary, rebuilt.turns) == (
+        history.conversation_id, history.summary, history.turns
+    )
+    assert conversation.turn_count == 6
+
+
+@pytest.mark.anyio
+async def test_messages_put_the_summary_before_the_turns():
+    history = ConversationHistory("id", "User asked: Who?", [turn(1), turn(2, role="assistant")])
+
+    messages = history.messages()
+
+    assert [message["role"] for message in messages] == ["system", "user", "assistant"]
+    assert "User asked: Who?" in messages[0]["content"][0]["text"]
+
+
+@pytest.mark.anyio
+async def test_an_exchange_is_claimed_once(redis_client):
+    store = ConversationStore(redis_client)
+
+    assert await store.claim_exchange("user", "a" * 64)
+    assert not await store.claim_exchange("user", "a" * 64)
+    assert await store.claim_exchange("other-user", "a" * 64)
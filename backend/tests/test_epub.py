@@ -0,0 +1,89 @@
+# backend/tests/test_epub.py
+import io
+import zipfile
+
+from app.services.epub import build_index, decode_member
+
+CONTAINER = """<?xml version="1.0"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+OPF = """<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>Nav Only</dc:title><dc:creator>Ann</dc:creator></metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="c1" href="text/one.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="text/two.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine><itemref idref="c1"/><itemref idref="c2"/></spine>
+</package>"""
+
+NAV = """<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+  <body>
+    <nav epub:type="landmarks"><ol><li><a href="text/one.xhtml">Start</a></li></ol></nav>
+    <nav epub:type="toc">
+      <ol>
+        <li><a href="text/one.xhtml">Chapter One</a>
+          <ol><li><a href="text/one.xhtml#part">Part</a></li></ol>
+        </li>
+        <li><a href="text/two.xhtml">Chapter Two</a></li>
+      </ol>
+    </nav>
+  </body>
+</html>"""
+
+
+def chapter(text: str) -> str:
+    return f'<html xmlns="http://www.w3.org/1999/xhtml"><head><title>x</title></head><body><p>{text}</p></body></html>'
+
+
+def make_epub(files: dict[str, str]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        for name, content in files.items():
+            zf.writestr(name, content, compress_type=zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+
+
+NAV_ONLY_EPUB = {
+    "META-INF/container.xml": CONTAINER,
+    "OEBPS/content.opf": OPF,
+    "OEBPS/nav.xhtml": NAV,
+    "OEBPS/text/one.xhtml": chapter("one two three"),
+    "OEBPS/text/two.xhtml": chapter("four five"),
+}
+
+
+def test_nav_toc_without_ncx():
+    index = build_index(make_epub(NAV_ONLY_EPUB))
+
+    toc = index["toc"]
+    assert [entry["label"] for entry in toc] == ["Chapter One", "Chapter Two"]
+    assert toc[0]["href"] == "OEBPS/text/one.xhtml"
+    assert toc[0]["spine_index"] == 0
+    assert toc[1]["spine_index"] == 1
+    assert toc[0]["children"][0]["label"] == "Part"
+    assert toc[0]["children"][0]["fragment"] == "part"
+
+
+def test_spine_text_stats():
+    index = build_index(make_epub(NAV_ONLY_EPUB))
+
+    assert [entry["href"] for entry in index["spine"]] == ["OEBPS/text/one.xhtml", "OEBPS/text/two.xhtml"]
+    assert [entry["word_count"] for entry in index["spine"]] == [3, 2]
+    assert index["word_count"] == 5
+
+
+def test_member_offsets_read_back():
+    data = make_epub(NAV_ONLY_EPUB)
+    index = build_index(data)
+
+    # Every indexed member, container.xml and the OPF included, decodes from its byte range alone
+    for href in ("META-INF/container.xml", "OEBPS/content.opf", "OEBPS/text/two.xhtml"):
+        entry = index["items"][href]
+        raw = data[entry["offset"]:entry["offset"] + entry["compressed_size"]]
+        assert decode_member(raw, entry).decode() == NAV_ONLY_EPUB[href]
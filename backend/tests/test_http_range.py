@@ -0,0 +1,42 @@
+# backend/tests/test_http_range.py
+import pytest
+
+from app.services.http_range import RangeNotSatisfiable, if_range_matches, parse_range_header
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        # Ignored, so the whole body is sent
+        ("items=0-10", None),
+        ("bytes=0-10,20-30", None),
+        ("bytes=abc-def", None),
+        ("bytes=50-10", None),
+    ],
+)
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, 1000)
+
+
+def test_any_range_of_an_empty_resource_is_unsatisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=0-", 0)
+
+
+def test_if_range():
+    assert if_range_matches(None, '"v1"', None)
+    assert if_range_matches('"v1"', '"v1"', None)
+    assert not if_range_matches('"v0"', '"v1"', None)
+    assert not if_range_matches('W/"v1"', '"v1"', None)
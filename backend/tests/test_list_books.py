@@ -0,0 +1,118 @@
+# backend/tests/test_list_books.py
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app import database, models
+from app.routes import books
+from app.services.catalog import CATALOG_VERSION_KEY
+from app.services.storage import get_storage
+from app.users import current_active_user
+
+pytestmark = pytest.mark.anyio
+
+FIELDS = "bookId,title,author"
+
+
+@pytest.fixture
+async def client(db_engine, storage):
+    app = FastAPI()
+    app.include_router(books.router, prefix="/api")
+    app.dependency_overrides[current_active_user] = lambda: models.User(id=uuid.uuid4(), email="reader@test")
+    app.dependency_overrides[get_storage] = lambda: storage
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def seed_books(titles: list[str]) -> None:
+    async with database.AsyncSessionLocal() as db:
+        for i, title in enumerate(titles):
+            db.add(models.Book(
+                bookId=uuid.uuid4(), title=title, author="Author", blob_name=f"book{i}.epub",
+                cover_blob_name=f"cover{i}.png", content_type="application/epub+zip",
+            ))
+        await db.commit()
+
+
+async def test_keyset_pages_cover_the_catalog_once_in_order(client):
+    # Repeated titles, so the bookId tiebreak in the cursor matters
+    titles = ["Moby Dick", "Emma", "Dracula", "Emma", "Beowulf", "Emma", "Walden"]
+    await seed_books(titles)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2, "fields": FIELDS}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await client.get("/api/books/", params=params)).json()
+        pages += 1
+        assert len(page["book_list"]) <= 2
+        seen += page["book_list"]
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+
+    assert pages == 4
+    assert [book["title"] for book in seen] == sorted(titles)
+    assert len({book["bookId"] for book in seen}) == len(titles)
+    assert set(seen[0]) == {"bookId", "title", "author"}
+
+
+async def test_cover_urls_are_projected_on_request(client):
+    await seed_books(["Emma"])
+
+    page = (await client.get("/api/books/", params={"fields": "title,cover_blob_url"})).json()
+
+    [book] = page["book_list"]
+    assert book["cover_blob_url"].startswith("https://blobs.test/")
+    assert "author" not in book
+
+
+async def test_unchanged_catalog_revalidates_with_304(client, redis_client):
+    await seed_books(["Emma"])
+
+    first = await client.get("/api/books/", params={"fields": FIELDS})
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert etag.startswith('W/"')
+    assert "must-revalidate" in first.headers["cache-control"]
+
+    again = await client.get("/api/books/", params={"fields": FIELDS}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+
+    # Another page shape is another representation
+    other = await client.get("/api/books/", params={"fields": "bookId,title"}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+    # A catalog write changes the ETag
+    await redis_client.incr(CATALOG_VERSION_KEY)
+    changed = await client.get("/api/books/", params={"fields": FIELDS}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = 'W/"abc"'
+
+    assert books.etag_matches('W/"abc"', etag)
+    assert books.etag_matches('"abc"', etag)
+    assert books.etag_matches('"other", W/"abc"', etag)
+    assert books.etag_matches("*", etag)
+    assert not books.etag_matches('"other"', etag)
+    assert not books.etag_matches(None, etag)
+
+
+async def test_malformed_cursor_is_a_client_error(client):
+    response = await client.get("/api/books/", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+async def test_unknown_field_is_a_client_error(client):
+    response = await client.get("/api/books/", params={"fields": "title,password"})
+
+    assert response.status_code == 400
@@ -0,0 +1,91 @@
+# backend/tests/test_migrations.py
+import pytest
+from sqlalchemy import inspect, select, text
+# Not the conftest-patched create_async_engine: these tests need databases of their own
+from sqlalchemy.ext.asyncio.engine import create_async_engine
+
+from app import migrations, models
+
+pytestmark = pytest.mark.anyio
+
+# books as first deployed, before cover variants, content addressing and the pagination indexes
+LEGACY_BOOKS_DDL = """
+CREATE TABLE books (
+    "bookId" CHAR(36) NOT NULL PRIMARY KEY,
+    title VARCHAR(200) NOT NULL,
+    author VARCHAR(200) NOT NULL,
+    blob_name VARCHAR(200) NOT NULL,
+    cover_blob_name VARCHAR(200) NOT NULL,
+    content_type VARCHAR(20) NOT NULL
+)
+"""
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    await engine.dispose()
+
+
+async def schema_versions(engine) -> list[int]:
+    async with engine.connect() as conn:
+        return list((await conn.execute(select(models.SchemaVersion.version))).scalars())
+
+
+async def books_schema(engine) -> tuple[set[str], set[str]]:
+    def describe(sync_conn):
+        inspector = inspect(sync_conn)
+        return (
+            {column["name"] for column in inspector.get_columns("books")},
+            {index["name"] for index in inspector.get_indexes("books")},
+        )
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(describe)
+
+
+async def test_new_database_is_created_and_versioned_once(engine):
+    assert await migrations.current_version(engine) == 0
+
+    first = await migrations.migrate(engine)
+    second = await migrations.migrate(engine)
+
+    assert first["applied"] == [1, 2]
+    assert second["applied"] == []
+    assert await schema_versions(engine) == [migrations.SCHEMA_VERSION]
+
+
+async def test_legacy_books_table_gets_its_columns_and_indexes(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(LEGACY_BOOKS_DDL))
+        await conn.execute(text(
+            "INSERT INTO books VALUES ('00000000-0000-0000-0000-000000000001', 'Moby Dick', 'Melville',"
+            " 'moby.epub', 'moby.jpg', 'epub')"
+        ))
+
+    result = await migrations.migrate(engine)
+
+    columns, indexes = await books_schema(engine)
+    assert {"cover_variants", "content_hash"} <= columns
+    assert {"ix_books_title_bookId", "ux_books_content_hash", "ix_books_blob_name"} <= indexes
+    assert result["applied"] == [1, 2]
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("SELECT title, content_hash FROM books"))).all() == [("Moby Dick", None)]
+
+
+async def test_migration_2_is_idempotent_and_bumps_the_version(engine):
+    # A database versioned before migration 2 existed
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.execute(models.SchemaVersion.__table__.insert().values(version=1))
+    before = await books_schema(engine)
+
+    result = await migrations.migrate(engine)
+    # Rerun by hand, as a worker that lost the race on a database without sp_getapplock would
+    async with engine.begin() as conn:
+        await conn.run_sync(migrations.MIGRATIONS[2])
+
+    assert result["applied"] == [2]
+    assert await books_schema(engine) == before
+    assert await schema_versions(engine) == [2]
@@ -0,0 +1,134 @@
+# backend/tests/test_passwords.py
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.services import passwords
+from app.services.passwords import PasswordHasher, PasswordHasherBusy
+
+pytestmark = pytest.mark.anyio
+
+
+class BlockingHelper:
+    """A password helper whose hash() holds its worker thread until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def hash(self, password: str) -> str:
+        self.started.set()
+        self.release.wait(5)
+        return f"hashed:{password}"
+
+
+@pytest.fixture
+def blocked_hasher():
+    hasher = PasswordHasher(workers=1, max_queue=1, queue_timeout=5)
+    hasher.password_helper = BlockingHelper()
+    yield hasher
+    hasher.password_helper.release.set()
+    hasher.close()
+
+
+async def wait_for(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+
+async def test_full_queue_is_refused_immediately(blocked_hasher):
+    running = asyncio.create_task(blocked_hasher.hash("one"))
+    await asyncio.to_thread(blocked_hasher.password_helper.started.wait, 5)
+    waiting = asyncio.create_task(blocked_hasher.hash("two"))
+    await wait_for(lambda: blocked_hasher.waiting == 1)
+
+    with pytest.raises(PasswordHasherBusy):
+        await blocked_hasher.hash("three")
+    assert blocked_hasher.stats()["rejected"] == 1
+    assert blocked_hasher.stats()["queue_depth"] == 1
+
+    # The worker frees up and both admitted requests complete
+    blocked_hasher.password_helper.release.set()
+    assert await asyncio.gather(running, waiting) == ["hashed:one", "hashed:two"]
+    assert blocked_hasher.completed["hash"] == 2
+    assert blocked_hasher.running == 0 and blocked_hasher.waiting == 0
+
+
+async def test_waiting_past_queue_timeout_is_refused(blocked_hasher):
+    blocked_hasher.queue_timeout = 0.05
+    running = asyncio.create_task(blocked_hasher.hash("one"))
+    await asyncio.to_thread(blocked_hasher.password_helper.started.wait, 5)
+
+    with pytest.raises(PasswordHasherBusy):
+        await blocked_hasher.hash("two")
+    assert blocked_hasher.rejected == 1
+    assert blocked_hasher.waiting == 0
+
+    blocked_hasher.password_helper.release.set()
+    assert await running == "hashed:one"
+    # The timed-out request did not leak the worker slot
+    assert await blocked_hasher.hash("three") == "hashed:three"
+
+
+async def test_hash_and_verify_round_trip():
+    hasher = PasswordHasher(workers=1)
+    try:
+        hashed = await hasher.hash("correct horse")
+
+        assert hashed.startswith("$argon2id$")
+        assert await hasher.verify_and_update("correct horse", hashed) == (True, None)
+        assert await hasher.verify_and_update("wrong horse", hashed) == (False, None)
+        assert hasher.completed == {"hash": 1, "verify": 2}
+    finally:
+        hasher.close()
+
+
+async def test_changed_parameters_rehash_on_next_verify(monkeypatch):
+    monkeypatch.setattr(passwords, "ARGON2_TIME_COST", 1)
+    old = PasswordHasher(workers=1)
+    monkeypatch.setattr(passwords, "ARGON2_TIME_COST", 2)
+    new = PasswordHasher(workers=1)
+    try:
+        old_hash = await old.hash("correct horse")
+
+        verified, updated = await new.verify_and_update("correct horse", old_hash)
+
+        assert verified
+        assert "t=1" in old_hash and "t=2" in updated
+        assert await new.verify_and_update("correct horse", updated) == (True, None)
+    finally:
+        old.close()
+        new.close()
+
+
+async def test_bcrypt_hashes_still_verify_and_upgrade_to_argon2():
+    import bcrypt
+
+    hasher = PasswordHasher(workers=1)
+    try:
+        legacy = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(rounds=4)).decode()
+
+        verified, updated = await hasher.verify_and_update("correct horse", legacy)
+
+        assert verified
+        assert updated.startswith("$argon2id$")
+    finally:
+        hasher.close()
+
+
+async def test_busy_hasher_answers_503_with_retry_after(db_engine, monkeypatch):
+    from app.main import app
+
+    async def busy(*args):
+        raise PasswordHasherBusy()
+
+    monkeypatch.setattr(passwords.password_hasher, "_run", busy)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/api/auth/jwt/login", data={"username": "reader@test.com", "password": "correct horse"}
+        )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(PasswordHasherBusy.retry_after)
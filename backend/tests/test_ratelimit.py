@@ -0,0 +1,110 @@
+# backend/tests/test_ratelimit.py
+import pytest
+
+from app.services import ratelimit
+from app.services.ratelimit import ChatLimiter, RateLimited
+
+pytestmark = pytest.mark.anyio
+
+
+async def deltas_from(parts: list[str]):
+    for part in parts:
+        yield part
+
+
+async def test_concurrent_streams_per_user_are_capped(redis_client):
+    limiter = ChatLimiter(redis_client)
+    admissions = [
+        await limiter.admit("reader", "fake", cost=10, upstream=False)
+        for _ in range(ratelimit.CHAT_MAX_STREAMS_PER_USER)
+    ]
+
+    with pytest.raises(RateLimited) as refused:
+        await limiter.admit("reader", "fake", cost=10, upstream=False)
+    assert refused.value.retry_after_header == "1"
+    assert limiter.limited["user_streams"] == 1
+
+    # Another user has their own leases, and a released lease frees a place
+    await (await limiter.admit("someone-else", "fake", cost=10, upstream=False)).release()
+    await admissions[0].release()
+    await limiter.admit("reader", "fake", cost=10, upstream=False)
+
+
+async def test_token_bucket_refusal_says_when_to_retry(redis_client):
+    limiter = ChatLimiter(redis_client)
+    cost = ratelimit.CHAT_USER_BURST_TOKENS // 2 + 1
+    await (await limiter.admit("reader", "fake", cost=cost, upstream=True)).release()
+
+    with pytest.raises(RateLimited) as refused:
+        await limiter.admit("reader", "fake", cost=cost, upstream=True)
+
+    # The bucket refills at CHAT_USER_TOKENS_PER_MINUTE / 60 tokens a second
+    missing = cost - (ratelimit.CHAT_USER_BURST_TOKENS - cost)
+    expected = missing / (ratelimit.CHAT_USER_TOKENS_PER_MINUTE / 60)
+    assert refused.value.retry_after == pytest.approx(expected, abs=0.5)
+    assert int(refused.value.retry_after_header) >= 1
+    assert limiter.limited["user_tokens"] == 1
+    # The refused request gave back its upstream slot and stream lease
+    assert limiter.upstream_open == 0
+    assert await redis_client.zcard("ratelimit:streams:reader") == 0
+
+
+async def test_upstream_slot_is_held_until_the_upstream_stream_ends(redis_client):
+    limiter = ChatLimiter(redis_client, max_upstream_streams=1)
+    admission = await limiter.admit("reader", "fake", cost=10, upstream=True)
+    upstream = admission.upstream(deltas_from(["a", "b"]))
+
+    # The client's response ending doesn't free the slot while the upstream call still runs
+    await admission.release()
+    assert limiter.upstream_open == 1
+    with pytest.raises(RateLimited):
+        await limiter.admit("other", "fake", cost=10, upstream=True)
+    assert limiter.limited["upstream_streams"] == 1
+
+    assert [delta async for delta in upstream] == ["a", "b"]
+    assert limiter.upstream_open == 0
+    await limiter.admit("other", "fake", cost=10, upstream=True)
+
+
+async def test_unused_upstream_slot_is_freed_on_release(redis_client):
+    limiter = ChatLimiter(redis_client, max_upstream_streams=1)
+    admission = await limiter.admit("reader", "fake", cost=10, upstream=True)
+
+    await admission.release()
+    await admission.release()
+
+    assert limiter.upstream_open == 0
+    assert not limiter.upstream_streams.locked()
+
+
+async def test_replay_that_goes_upstream_takes_a_slot_and_pays(redis_client):
+    limiter = ChatLimiter(redis_client, max_upstream_streams=1)
+    admission = await limiter.admit("reader", "fake", cost=ratelimit.CHAT_USER_BURST_TOKENS, upstream=False)
+    assert limiter.upstream_open == 0
+
+    # The cached entry expired before the replay read it
+    upstream = admission.upstream(deltas_from(["a", "b"]))
+    assert await anext(upstream) == "a"
+    assert limiter.upstream_open == 1
+    assert limiter.late_upstream == 1
+    assert [delta async for delta in upstream] == ["b"]
+    assert limiter.upstream_open == 0
+
+    # The whole burst was charged
+    with pytest.raises(RateLimited):
+        await limiter.admit("reader", "fake", cost=10, upstream=True)
+
+
+async def test_replay_that_goes_upstream_is_refused_when_busy(redis_client):
+    limiter = ChatLimiter(redis_client, max_upstream_streams=1)
+    busy = await limiter.admit("other", "fake", cost=10, upstream=True)
+    admission = await limiter.admit("reader", "fake", cost=10, upstream=False)
+
+    with pytest.raises(RateLimited):
+        await anext(admission.upstream(deltas_from(["a"])))
+    assert limiter.limited["upstream_streams"] == 1
+
+    await busy.release()
+    await admission.release()
+    assert limiter.upstream_open == 0
+    assert await redis_client.hget("ratelimit:tokens:user:reader", "tokens") is None
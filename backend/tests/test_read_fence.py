@@ -0,0 +1,70 @@
+# backend/tests/test_read_fence.py
+import asyncio
+
+import pytest
+from redis.exceptions import RedisError
+
+from app import database
+from app.routes import books
+from app.services.read_fence import ReadFence, fence_key
+
+from .test_list_books import FIELDS, client, seed_books  # noqa: F401 (client is a fixture)
+
+pytestmark = pytest.mark.anyio
+
+
+class BrokenRedis:
+    async def exists(self, key):
+        raise RedisError("down")
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """A read replica configured (the sessions still share the test database)."""
+    monkeypatch.setattr(database, "HAS_READ_REPLICA", True)
+    monkeypatch.setattr(database, "read_routing", {"replica": 0, "primary": 0})
+    return database.read_routing
+
+
+async def test_without_a_replica_nothing_is_fenced(redis_client):
+    fence = ReadFence(redis_client)
+
+    await fence.mark("catalog")
+
+    assert not await fence.active("catalog")
+    assert not await redis_client.exists(fence_key("catalog"))
+
+
+async def test_marks_fence_every_worker_until_they_expire(replica, redis_client):
+    writer, reader = ReadFence(redis_client, seconds=1), ReadFence(redis_client, seconds=1)
+
+    await writer.mark("user:1")
+
+    assert await writer.active("user:1")
+    assert await reader.active("user:1")
+    assert not await reader.active("user:2")
+    await asyncio.sleep(1.1)
+    assert not await writer.active("user:1")
+    assert not await reader.active("user:1")
+
+
+async def test_redis_outage_reads_from_the_primary(replica):
+    fence = ReadFence(BrokenRedis())
+
+    assert await fence.active("catalog")
+    assert fence.redis_errors == 1
+
+
+async def test_catalog_reads_go_to_the_primary_until_the_fence_expires(replica, client, redis_client, monkeypatch):
+    fence = ReadFence(redis_client, seconds=1)
+    monkeypatch.setattr(books, "read_fence", fence)
+    await seed_books(["Moby Dick"])
+    await fence.mark("catalog")
+
+    fenced = await client.get("/api/books/", params={"fields": FIELDS})
+    assert replica == {"replica": 0, "primary": 1}
+
+    await asyncio.sleep(1.1)
+    unfenced = await client.get("/api/books/", params={"fields": FIELDS})
+    assert replica == {"replica": 1, "primary": 1}
+    assert fenced.json()["book_list"] == unfenced.json()["book_list"]
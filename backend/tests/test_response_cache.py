@@ -0,0 +1,86 @@
+# backend/tests/test_response_cache.py
+import asyncio
+import json
+
+import pytest
+
+from app.services.completion import FakeProvider
+from app.services.response_cache import (
+    ChatResponseCache,
+    cache_key_for_response_id,
+    response_cache_key,
+    response_id,
+)
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = [{"role": "user", "content": "Who is the captain?"}]
+
+
+def fake_provider() -> FakeProvider:
+    return FakeProvider(ttft_ms=20, tokens_per_second=500, tokens=20, jitter=0, error_rate=0)
+
+
+async def collect(deltas) -> str:
+    return "".join([delta async for delta in deltas])
+
+
+async def test_identical_requests_share_one_upstream_call(redis_client):
+    cache = ChatResponseCache(redis_client)
+    provider = fake_provider()
+    key = response_cache_key("fake", None, "Who is the captain?", [])
+
+    answers = await asyncio.gather(*(collect(cache.stream(key, lambda: provider.stream(MESSAGES, 100))) for _ in range(5)))
+
+    assert provider.requests == 1
+    assert len(set(answers)) == 1 and answers[0]
+    assert cache.misses == 1 and cache.coalesced == 4
+    # Stored once the flight finished, then replayed without another call
+    assert await collect(cache.stream(key, lambda: provider.stream(MESSAGES, 100))) == answers[0]
+    assert provider.requests == 1
+    assert cache.hits == 1
+
+
+async def test_leader_disconnect_does_not_cut_off_followers(redis_client):
+    cache = ChatResponseCache(redis_client)
+    provider = fake_provider()
+    key = response_cache_key("fake", None, "Who is the captain?", [])
+    expected = await collect(fake_provider().stream(MESSAGES, 100))
+
+    leader = cache.stream(key, lambda: provider.stream(MESSAGES, 100))
+    first = await anext(leader)
+    follower = asyncio.create_task(collect(cache.stream(key, lambda: provider.stream(MESSAGES, 100))))
+    await asyncio.sleep(0)
+    # The client that started the upstream call goes away mid-stream
+    await leader.aclose()
+
+    assert await follower == expected
+    assert expected.startswith(first)
+    assert provider.requests == 1
+    assert json.loads(await redis_client.get(key)) and cache.stores == 1
+    assert cache.stats()["inflight"] == 0
+
+
+async def test_upstream_error_reaches_every_waiter_and_is_not_stored(redis_client):
+    cache = ChatResponseCache(redis_client)
+
+    async def failing():
+        yield "partial"
+        raise RuntimeError("upstream failed")
+
+    key = response_cache_key("fake", None, "q", [])
+    results = await asyncio.gather(*(collect(cache.stream(key, failing)) for _ in range(2)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await redis_client.get(key) is None
+    assert cache.upstream_errors == 1
+
+
+def test_cache_key_ignores_case_spacing_and_trailing_punctuation():
+    context = [{"role": "system", "content": "passages"}]
+    key = response_cache_key("gpt", "book", "Who is  the Captain?", context)
+
+    assert key == response_cache_key("gpt", "book", "who is the captain", context)
+    assert key != response_cache_key("gpt", "book", "who is the captain", [{"role": "system", "content": "other"}])
+    assert cache_key_for_response_id(response_id(key)) == key
+    assert cache_key_for_response_id("not-a-response-id") is None
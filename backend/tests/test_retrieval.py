@@ -0,0 +1,155 @@
+# backend/tests/test_retrieval.py
+import asyncio
+import json
+
+import pytest
+
+from app.services.book_index import BOOK_CONTAINER, BOOK_INDEX_CONTAINER
+from app.services.retrieval import (
+    RETRIEVAL_INDEX_VERSION,
+    BookRetriever,
+    RetrieverCache,
+    build_retrieval_index,
+    chunk_text,
+    load_retrieval_index,
+    retrieval_blob_name,
+)
+
+from .test_epub import NAV_ONLY_EPUB, chapter, make_epub
+
+# Chapter 0 is about the harbor, chapter 1 about the whale
+WHALE_EPUB = make_epub({
+    **NAV_ONLY_EPUB,
+    "OEBPS/text/one.xhtml": chapter(
+        "The ship waited in the harbor while the crew loaded barrels. A whale was mentioned once."
+    ),
+    "OEBPS/text/two.xhtml": chapter(
+        "The white whale breached. The whale struck the boat and the whale dove, and the harpoon line ran out."
+    ),
+})
+
+
+def test_chunks_overlap_and_cover_every_word():
+    words = [f"w{i}" for i in range(10)]
+    chunks = chunk_text(" ".join(words), chunk_words=4, overlap_words=1)
+
+    assert chunks == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    # Each chunk starts with the last word of the one before
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.split()[-1] == current.split()[0]
+
+
+def test_short_and_empty_texts():
+    assert chunk_text("just a few words", chunk_words=180, overlap_words=30) == ["just a few words"]
+    assert chunk_text("   ") == []
+
+
+def test_bm25_ranks_the_chapter_about_the_query_first():
+    retriever = BookRetriever(build_retrieval_index(WHALE_EPUB))
+
+    best = retriever.search("What did the whale do to the boat?", k=1)
+    assert [passage["chapter"] for passage in best] == [1]
+
+    both = retriever.search("whale", k=2)
+    assert [passage["chapter"] for passage in both] == [0, 1]  # Reading order, not score order
+    assert both[1]["score"] > both[0]["score"]
+
+
+def test_max_chapter_hides_later_chapters():
+    retriever = BookRetriever(build_retrieval_index(WHALE_EPUB))
+
+    passages = retriever.search("whale harpoon", k=4, max_chapter=0)
+
+    assert [passage["chapter"] for passage in passages] == [0]
+    assert retriever.search("harpoon", max_chapter=0) == []
+
+
+def test_unknown_terms_and_stopwords_match_nothing():
+    retriever = BookRetriever(build_retrieval_index(WHALE_EPUB))
+
+    assert retriever.search("the and of") == []
+    assert retriever.search("spaceship") == []
+
+
+class CountingLoads:
+    """Stands in for load_retrieval_index, counting loads per book."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.loads: list[str] = []
+
+    async def __call__(self, storage, blob_name):
+        self.loads.append(blob_name)
+        await asyncio.sleep(self.delay)
+        if blob_name == "broken.epub":
+            raise ValueError("not an EPUB")
+        return build_retrieval_index(WHALE_EPUB)
+
+
+@pytest.mark.anyio
+async def test_retriever_cache_evicts_least_recently_used(monkeypatch):
+    loads = CountingLoads()
+    monkeypatch.setattr("app.services.retrieval.load_retrieval_index", loads)
+    cache = RetrieverCache(maxsize=2)
+
+    for blob_name in ("a.epub", "b.epub", "a.epub", "c.epub"):
+        await cache.get(None, blob_name)
+    # b was the least recently used when c came in
+    await cache.get(None, "a.epub")
+    await cache.get(None, "b.epub")
+
+    assert loads.loads == ["a.epub", "b.epub", "c.epub", "b.epub"]
+    assert cache.stats()["evictions"] == 2
+    assert cache.hits == 2 and cache.misses == 4
+
+
+@pytest.mark.anyio
+async def test_concurrent_gets_share_one_load(monkeypatch):
+    loads = CountingLoads(delay=0.05)
+    monkeypatch.setattr("app.services.retrieval.load_retrieval_index", loads)
+    cache = RetrieverCache()
+
+    retrievers = await asyncio.gather(*(cache.get(None, "cold.epub") for _ in range(5)))
+
+    assert loads.loads == ["cold.epub"]
+    assert all(retriever is retrievers[0] for retriever in retrievers)
+
+
+@pytest.mark.anyio
+async def test_failed_load_reaches_every_waiter_and_is_retried(monkeypatch):
+    loads = CountingLoads(delay=0.05)
+    monkeypatch.setattr("app.services.retrieval.load_retrieval_index", loads)
+    cache = RetrieverCache()
+
+    results = await asyncio.gather(*(cache.get(None, "broken.epub") for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    with pytest.raises(ValueError):
+        await cache.get(None, "broken.epub")
+    assert loads.loads == ["broken.epub", "broken.epub"]
+
+
+@pytest.mark.anyio
+async def test_missing_sidecar_is_built_once_and_backfilled(storage):
+    storage.blobs[(BOOK_CONTAINER, "whale.epub")] = WHALE_EPUB
+
+    index = await load_retrieval_index(storage, "whale.epub")
+    sidecar = storage.blobs[(BOOK_INDEX_CONTAINER, retrieval_blob_name("whale.epub"))]
+    assert json.loads(sidecar) == index
+    assert index["version"] == RETRIEVAL_INDEX_VERSION
+
+    # From then on only the sidecar is read
+    storage.downloads.clear()
+    assert await load_retrieval_index(storage, "whale.epub") == index
+    assert [blob for _, blob, _, _ in storage.downloads] == [retrieval_blob_name("whale.epub")]
+
+
+@pytest.mark.anyio
+async def test_stale_sidecar_is_rebuilt(storage):
+    storage.blobs[(BOOK_CONTAINER, "whale.epub")] = WHALE_EPUB
+    storage.blobs[(BOOK_INDEX_CONTAINER, retrieval_blob_name("whale.epub"))] = json.dumps({"version": 0}).encode()
+
+    index = await load_retrieval_index(storage, "whale.epub")
+
+    assert index["version"] == RETRIEVAL_INDEX_VERSION
+    assert json.loads(storage.blobs[(BOOK_INDEX_CONTAINER, retrieval_blob_name("whale.epub"))]) == index
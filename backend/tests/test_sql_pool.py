@@ -0,0 +1,80 @@
+# backend/tests/test_sql_pool.py
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+# Not the conftest-patched create_async_engine: these tests need a pool of their own
+from sqlalchemy.ext.asyncio.engine import create_async_engine
+
+from app.database import pool_limits
+from app.services.sql_pool import PoolMetrics
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def metrics():
+    return PoolMetrics("primary")
+
+
+@pytest.fixture
+async def engine(tmp_path, metrics):
+    """A single-connection pool that gives up waiting after 0.2s."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=metrics.pool_class(),
+        pool_pre_ping=True,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.2,
+    )
+    metrics.attach(engine)
+    yield engine
+    await engine.dispose()
+
+
+def test_pool_limits_split_max_connections_over_workers():
+    assert pool_limits(10, 20, max_connections=0, workers=4) == (10, 20)
+    assert pool_limits(10, 20, max_connections=60, workers=4) == (10, 5)
+    assert pool_limits(10, 20, max_connections=8, workers=4) == (2, 0)
+    assert pool_limits(10, 20, max_connections=2, workers=4) == (1, 0)
+
+
+async def test_checkout_waiting_for_a_busy_pool_is_measured(engine, metrics):
+    async def hold(seconds: float):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await asyncio.sleep(seconds)
+
+    holder = asyncio.create_task(hold(0.06))
+    await asyncio.sleep(0.01)
+    assert metrics.stats()["in_use"] == 1
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    await holder
+
+    stats = metrics.stats()
+    assert stats["checkouts"] == 2
+    assert sum(stats["checkout_histogram"].values()) == 2
+    # The second checkout queued for the ~50ms the first one still held the only connection
+    assert stats["checkout_max_ms"] >= 40
+    assert sum(count for bucket, count in stats["checkout_histogram"].items() if bucket in ("le_50ms", "le_100ms")) == 1
+    # One connection, reused after a pre-ping
+    assert (stats["connects"], stats["pre_pings"], stats["max_in_use"]) == (1, 1, 1)
+    assert (stats["in_use"], stats["idle"]) == (0, 1)
+
+
+async def test_checkout_timeouts_are_counted(engine, metrics):
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        with pytest.raises(PoolTimeoutError):
+            async with engine.connect():
+                pass
+
+    stats = metrics.stats()
+    assert stats["checkout_timeouts"] == 1
+    # Only successful checkouts go into the histogram
+    assert stats["checkouts"] == 1
+    assert sum(stats["checkout_histogram"].values()) == 1
+    assert stats["timeout_seconds"] == 0.2
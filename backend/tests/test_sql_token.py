@@ -0,0 +1,105 @@
+# backend/tests/test_sql_token.py
+import asyncio
+import struct
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import sql_token
+from app.services.sql_token import SQL_COPT_SS_ACCESS_TOKEN, AccessTokenProvider, pack_access_token
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeCredential:
+    """get_token() answers tokens valid for `lifetime` seconds, after failing `failures` times."""
+
+    def __init__(self, lifetime: float = 3600, failures: int = 0):
+        self.lifetime = lifetime
+        self.failures = failures
+        self.calls = 0
+
+    def get_token(self, scope):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("AAD unavailable")
+        return SimpleNamespace(token=f"token-{self.calls}", expires_on=time.time() + self.lifetime)
+
+
+class Sleeps:
+    """Stands in for asyncio.sleep in the refresh loop: records the delays, returns at once
+    `wakeups` times, then parks the loop."""
+
+    def __init__(self, wakeups: int):
+        self.wakeups = wakeups
+        self.delays: list[float] = []
+        self.parked = asyncio.Event()
+
+    async def __call__(self, delay):
+        self.delays.append(delay)
+        if len(self.delays) > self.wakeups:
+            self.parked.set()
+            await asyncio.Event().wait()
+
+
+def unpack(attrs_before: dict) -> str:
+    packed = attrs_before[SQL_COPT_SS_ACCESS_TOKEN]
+    (length,) = struct.unpack_from("<I", packed)
+    return packed[4:4 + length].decode("utf-16-le")
+
+
+def test_access_token_struct_is_length_prefixed_utf16():
+    packed = pack_access_token("abc")
+    assert packed == struct.pack("<I", 6) + "abc".encode("utf-16-le")
+
+
+def test_cached_token_is_reused_until_close_to_expiry():
+    credential = FakeCredential(lifetime=3600)
+    provider = AccessTokenProvider(lambda: credential, "scope", refresh_margin=600, min_validity=120)
+
+    assert unpack(provider.attrs_before()) == "token-1"
+    assert unpack(provider.attrs_before()) == "token-1"
+    assert (credential.calls, provider.blocking_fetches) == (1, 1)
+
+    # Inside min_validity the cached token is no longer handed out
+    credential.lifetime = 60
+    provider._fetch()
+    assert unpack(provider.attrs_before()) == "token-3"
+    assert provider.blocking_fetches == 2
+
+
+async def test_background_refresh_runs_refresh_margin_before_expiry(monkeypatch):
+    credential = FakeCredential(lifetime=3600)
+    provider = AccessTokenProvider(lambda: credential, "scope", refresh_margin=600, min_validity=120)
+    sleeps = Sleeps(wakeups=1)
+    monkeypatch.setattr(sql_token.asyncio, "sleep", sleeps)
+
+    await provider.start()
+    await asyncio.wait_for(sleeps.parked.wait(), timeout=5)
+    await provider.stop()
+
+    # Fetched at start, then again once the sleep (valid_for - margin) was over
+    assert credential.calls == 2
+    assert sleeps.delays[0] == pytest.approx(3000, abs=5)
+    assert unpack(provider.attrs_before()) == "token-2"
+    assert provider.blocking_fetches == 0
+
+
+async def test_failed_refreshes_back_off_until_one_succeeds(monkeypatch):
+    credential = FakeCredential(lifetime=3600, failures=3)
+    provider = AccessTokenProvider(lambda: credential, "scope", refresh_margin=600, min_validity=120)
+    sleeps = Sleeps(wakeups=2)
+    monkeypatch.setattr(sql_token.asyncio, "sleep", sleeps)
+
+    await provider.start()
+    await asyncio.wait_for(sleeps.parked.wait(), timeout=5)
+    await provider.stop()
+
+    # start() and the first two retries failed, the third got a token and waits for the next refresh
+    assert sleeps.delays[:2] == list(sql_token.SQL_TOKEN_RETRY_SECONDS[:2])
+    assert sleeps.delays[2] == pytest.approx(3000, abs=5)
+    assert provider.failures == 3
+    assert provider.stats()["last_error"] is None
+    assert unpack(provider.attrs_before()) == "token-4"
+    assert provider.blocking_fetches == 0
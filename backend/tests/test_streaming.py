@@ -0,0 +1,89 @@
+# backend/tests/test_streaming.py
+import asyncio
+import json
+
+import pytest
+from starlette.requests import Request
+
+from app.services.streaming import coalesce, last_event_id, skip_chars, sse_events
+
+
+async def deltas_from(parts: list[str], delay: float = 0.0):
+    for part in parts:
+        if delay:
+            await asyncio.sleep(delay)
+        yield part
+
+
+async def collect(chunks) -> list[str]:
+    return [chunk async for chunk in chunks]
+
+
+def request_with(headers: dict[str, str]) -> Request:
+    return Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+
+
+@pytest.mark.anyio
+async def test_coalesce_batches_fast_deltas():
+    parts = [f"w{i} " for i in range(50)]
+    chunks = await collect(coalesce(deltas_from(parts), flush_ms=50, flush_chars=10_000))
+
+    assert "".join(chunks) == "".join(parts)
+    assert len(chunks) < len(parts)
+
+
+@pytest.mark.anyio
+async def test_coalesce_flushes_at_flush_chars():
+    parts = ["x" * 10] * 10
+    chunks = await collect(coalesce(deltas_from(parts, delay=0.005), flush_ms=10_000, flush_chars=30))
+
+    assert "".join(chunks) == "".join(parts)
+    assert all(len(chunk) >= 30 for chunk in chunks[:-1])
+    assert len(chunks) > 1
+
+
+@pytest.mark.anyio
+async def test_coalesce_does_not_hold_deltas_past_flush_ms():
+    chunks = await collect(coalesce(deltas_from(["a", "b", "c"], delay=0.05), flush_ms=5, flush_chars=10_000))
+
+    assert chunks == ["a", "b", "c"]
+
+
+@pytest.mark.anyio
+async def test_coalesce_raises_source_errors_after_flushing():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("upstream failed")
+
+    received = []
+    with pytest.raises(RuntimeError):
+        async for chunk in coalesce(failing(), flush_ms=5):
+            received.append(chunk)
+    assert received == ["partial"]
+
+
+@pytest.mark.anyio
+async def test_sse_resume_continues_from_the_offset():
+    parts = ["Call ", "me ", "Ishmael. ", "Some ", "years ", "ago"]
+    full = "".join(parts)
+    events = await collect(sse_events(deltas_from(parts)))
+
+    assert [event.split("\n")[0] for event in events[:3]] == ["id: 5", "id: 8", "id: 17"]
+    assert events[-1] == "id: 31\nevent: done\ndata: \n\n"
+
+    # Reconnect after the third event: skip what was delivered, keep counting from there
+    resumed = await collect(sse_events(skip_chars(deltas_from(parts), 17), 17))
+    text = "".join(json.loads(event.split("data: ")[1]) for event in resumed[:-1])
+    assert text == full[17:]
+    assert resumed[0].startswith("id: 22\n")
+
+
+@pytest.mark.anyio
+async def test_skip_chars_splits_a_delta():
+    assert await collect(skip_chars(deltas_from(["abc", "def"]), 4)) == ["ef"]
+
+
+def test_last_event_id():
+    assert last_event_id(request_with({"Last-Event-ID": "17"})) == (None, 17)
+    assert last_event_id(request_with({"Last-Event-ID": "nope"})) == (None, 0)
+    assert last_event_id(request_with({})) == (None, 0)
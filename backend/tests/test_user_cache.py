@@ -0,0 +1,127 @@
+# backend/tests/test_user_cache.py
+import uuid
+
+import pytest
+from fastapi_users.db import SQLAlchemyUserDatabase
+from redis.exceptions import RedisError
+
+from app import database, users
+from app.models import User
+from app.services.user_cache import UserCache
+
+pytestmark = pytest.mark.anyio
+
+
+def make_user(**fields) -> User:
+    defaults = dict(
+        id=uuid.uuid4(),
+        email=f"{uuid.uuid4().hex[:8]}@example.com",
+        hashed_password="$argon2id$secret",
+        is_active=True,
+        is_superuser=False,
+        is_verified=False,
+        is_subscribed=False,
+    )
+    return User(**{**defaults, **fields})
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise RedisError("down")
+
+    async def set(self, key, value, ex=None):
+        raise RedisError("down")
+
+    async def delete(self, key):
+        raise RedisError("down")
+
+
+async def test_users_come_back_from_memory_without_the_password_hash():
+    cache = UserCache()
+    user = make_user(is_subscribed=True, stripe_customer_id="cus_1")
+
+    assert await cache.get(user.id) is None
+    await cache.put(user)
+    cached = await cache.get(user.id)
+
+    assert (cached.id, cached.email, cached.is_subscribed, cached.stripe_customer_id) == (
+        user.id, user.email, True, "cus_1"
+    )
+    assert cached.hashed_password is None
+    assert (cache.misses, cache.local_hits) == (1, 1)
+
+
+async def test_workers_share_entries_and_invalidations_through_redis(redis_client):
+    worker_a, worker_b = UserCache(redis_client), UserCache(redis_client)
+    user = make_user()
+
+    await worker_a.put(user)
+    assert (await worker_b.get(user.id)).email == user.email
+    assert worker_b.redis_hits == 1
+
+    await worker_a.invalidate(user.id)
+    assert await worker_a.get(user.id) is None
+    # B still has its in-process copy until the local TTL runs out
+    assert await worker_b.get(user.id) is not None
+
+
+async def test_expired_local_entries_fall_back_to_redis(redis_client):
+    cache = UserCache(redis_client, local_ttl_seconds=0)
+    user = make_user()
+    await cache.put(user)
+
+    assert await cache.get(user.id) is not None
+    assert (cache.local_hits, cache.redis_hits) == (0, 1)
+
+
+async def test_least_recently_used_users_are_evicted():
+    cache = UserCache(max_entries=2)
+    first, second, third = make_user(), make_user(), make_user()
+    await cache.put(first)
+    await cache.put(second)
+    await cache.get(first.id)
+    await cache.put(third)
+
+    assert await cache.get(second.id) is None
+    assert await cache.get(first.id) is not None
+    assert await cache.get(third.id) is not None
+
+
+async def test_redis_outage_is_a_miss_not_an_error():
+    cache = UserCache(BrokenRedis(), local_ttl_seconds=0)
+    user = make_user()
+
+    await cache.put(user)
+    assert await cache.get(user.id) is None
+    await cache.invalidate(user.id)
+    assert cache.redis_errors == 3
+
+
+async def test_user_manager_reads_sql_once_until_the_user_changes(db_engine, redis_client, monkeypatch):
+    cache = UserCache(redis_client)
+    monkeypatch.setattr(users, "user_cache", cache)
+    user = make_user()
+    user_id = user.id
+    async with database.AsyncSessionLocal() as db:
+        db.add(user)
+        await db.commit()
+
+    async with database.AsyncSessionLocal() as session:
+        manager = users.UserManager(SQLAlchemyUserDatabase(session, User))
+        assert (await manager.get(user_id)).is_subscribed is False
+        assert (await manager.get(user_id)).is_subscribed is False
+    assert (cache.misses, cache.local_hits) == (1, 1)
+
+    # A change written outside UserManager (a Stripe webhook) is only seen after user_changed
+    async with database.AsyncSessionLocal() as db:
+        (await db.get(User, user_id)).is_subscribed = True
+        await db.commit()
+    async with database.AsyncSessionLocal() as session:
+        manager = users.UserManager(SQLAlchemyUserDatabase(session, User))
+        assert (await manager.get(user_id)).is_subscribed is False
+    await users.user_changed(user_id)
+
+    async with database.AsyncSessionLocal() as session:
+        manager = users.UserManager(SQLAlchemyUserDatabase(session, User))
+        assert (await manager.get(user_id)).is_subscribed is True
+    assert cache.misses == 2
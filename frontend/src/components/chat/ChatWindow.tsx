@@ -10,7 +10,14 @@ export type Message = {
   text: string;
 };
 
-const ChatWindow: React.FC = () => {
+interface ChatWindowProps {
+  // Book being read; the backend retrieves passages from it for each question
+  bookId?: string | null;
+  // Spine index of the reading position, so answers don't draw on later chapters
+  chapter?: number;
+}
+
+const ChatWindow: React.FC<ChatWindowProps> = ({ bookId, chapter }) => {
   const { data: currentUser, isLoading } = useCurrentUser();
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputText, setInputText] = useState('');
@@ -24,6 +31,24 @@ const ChatWindow: React.FC = () => {
     bottomRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
+  // the conversation continues server-side; show where it left off
+  useEffect(() => {
+    if (!currentUser?.is_subscribed) return;
+    const params = bookId ? `?book_id=${bookId}` : '';
+    fetch(`${import.meta.env.VITE_API_BASE_URL}/chat/conversation${params}`, { credentials: 'include' })
+      .then((res) => (res.ok ? res.json() : null))
+      .then((conversation) => {
+        if (!conversation) return;
+        setMessages(
+          conversation.turns.map((turn: { role: string; content: string }) => ({
+            sender: turn.role === 'user' ? 'user' : 'bot',
+            text: turn.content,
+          }))
+        );
+      })
+      .catch((err) => console.error('Failed to load conversation:', err));
+  }, [bookId, currentUser?.is_subscribed]);
+
   if (isLoading) return <div>Loading...</div>;
   if (!currentUser?.is_subscribed) {
     return (
@@ -63,7 +88,7 @@ const ChatWindow: React.FC = () => {
         method: 'POST',
         credentials: 'include',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: inputText }),
+        body: JSON.stringify({ message: inputText, book_id: bookId ?? undefined, chapter }),
       });
       if (!res.ok) throw new Error(res.statusText);
 
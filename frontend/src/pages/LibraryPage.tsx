@@ -13,20 +13,33 @@ interface BookBlob {
   cover_blob_name: string;
   content_type: string;
   cover_blob_url: string;
+  // format -> { width: url }, e.g. { webp: { "160": "...", "320": "..." } }
+  cover_srcset?: Record<string, Record<string, string>> | null;
 }
 
+// Build an <img srcSet> value ("url 160w, url 320w") from one format's width -> url map
+const toSrcSet = (urls: Record<string, string> | undefined) =>
+  urls ? Object.entries(urls).map(([width, url]) => `${url} ${width}w`).join(', ') : undefined;
+
 const LibraryPage: React.FC = () => {
   const { isAuthenticated } = useAuth();
   const navigate = useNavigate();
   const [bookList, setBookList] = useState<BookBlob[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState<boolean>(true);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
 
-  // Fetch books from API
-  const fetchBooks = async () => {
-    setLoading(true);
+  // Fetch one page of books from the API; pass the previous page's next_cursor to append
+  const fetchBooks = async (cursor: string | null = null) => {
+    if (cursor) {
+      setLoadingMore(true);
+    } else {
+      setLoading(true);
+    }
     try {
-      const res = await fetch(`${import.meta.env.VITE_API_BASE_URL}/books/`, {
+      const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const res = await fetch(`${import.meta.env.VITE_API_BASE_URL}/books/${params}`, {
         credentials: 'include',
       });
 
@@ -40,11 +53,13 @@ const LibraryPage: React.FC = () => {
       console.log("LibraryPage.tsx, fetchBooks res: ", res)
       const data = await res.json();
       console.log("LibraryPage.tsx, fetchBooks data: ", data)
-      setBookList(data.book_list);  // assuming data is an array of books
+      setBookList(prev => (cursor ? [...prev, ...data.book_list] : data.book_list));
+      setNextCursor(data.next_cursor ?? null);
     } catch (err) {
       setError('Could not load books.');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
   
@@ -78,12 +93,20 @@ const LibraryPage: React.FC = () => {
       ) : (
         <div className="grid grid-cols-2 sm:grid-cols-4 md:grid-cols-6 lg:grid-cols-8 xl:grid-cols-10 gap-4">
           {bookList.map(book => (
-            <Link key={book.bookId} to={`/reader?blobName=${book.blob_name}&title=${book.title}`} className="block border rounded-lg overflow-hidden shadow-lg hover:shadow-xl transition-shadow duration-300">
-              <img 
-                src={book.cover_blob_url} 
-                alt={`${book.title} cover`} 
-                className="w-full h-48 object-cover" // Adjusted for better image display
-              />
+            <Link key={book.bookId} to={`/reader?blobName=${book.blob_name}&title=${book.title}&bookId=${book.bookId}`} className="block border rounded-lg overflow-hidden shadow-lg hover:shadow-xl transition-shadow duration-300">
+              <picture>
+                {book.cover_srcset?.webp && (
+                  <source type="image/webp" srcSet={toSrcSet(book.cover_srcset.webp)} sizes="160px" />
+                )}
+                <img 
+                  src={book.cover_srcset?.jpeg?.['160'] ?? book.cover_blob_url} 
+                  srcSet={toSrcSet(book.cover_srcset?.jpeg)}
+                  sizes="160px"
+                  loading="lazy"
+                  alt={`${book.title} cover`} 
+                  className="w-full h-48 object-cover" // Adjusted for better image display
+                />
+              </picture>
               <div className="p-4">
                 <h3 className="text-sm font-semibold truncate" title={book.title}>{book.title}</h3>
                 <p className="text-sm text-gray-600 truncate" title={book.author}>{book.author}</p>
@@ -92,6 +115,17 @@ const LibraryPage: React.FC = () => {
           ))}
         </div>
       )}
+      {nextCursor && (
+        <div className="flex justify-center mt-4">
+          <button
+            onClick={() => fetchBooks(nextCursor)}
+            disabled={loadingMore}
+            className="px-4 py-2 border rounded-lg shadow hover:shadow-md disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     <div className="mt-auto pt-4 flex justify-end"> 
       {/* Removed the "Back to Login" link as logout is available */}
     </div>
@@ -3,15 +3,29 @@ import { ReactReader } from 'react-reader';
 import ChatWindow from '../components/chat/ChatWindow';
 import { useSearchParams } from 'react-router-dom';
 import { FaComments, FaTimes } from 'react-icons/fa'; // Import icons
-import { useEpub } from '../hooks/useEpub';
+
+// Spine index from an EPUB CFI: the step after /6 (the spine) is 2 * (index + 1)
+const spineIndexFromCfi = (location: string | number): number | undefined => {
+  const match = /^epubcfi\(\/6\/(\d+)/.exec(location.toString());
+  return match ? parseInt(match[1], 10) / 2 - 1 : undefined;
+};
+
+// The backend serves the book's files one at a time from its zip index, so epub.js opens it as an
+// unpacked directory: container.xml, the OPF, then only the chapters and images being displayed,
+// instead of downloading the whole EPUB before the first page.
+const epubInitOptions = {
+  openAs: 'directory',
+  requestCredentials: true,
+  // Fetch images and stylesheets with the session cookie too
+  replacements: 'blobUrl',
+};
 
 const ReaderPage: React.FC = () => {
   const [searchParams] = useSearchParams();
   const blobName = searchParams.get('blobName');
   const title = searchParams.get('title');
+  const bookId = searchParams.get('bookId');
 
-  const { data: epubData, isLoading, error } = useEpub(blobName);
-  
   const [location, setLocation] = useState<string | number>(() => {
     const saved = localStorage.getItem(`location-${blobName}`);
     return saved ? saved : 'epubcfi(/6/2[cover]!/6)';
@@ -23,8 +37,7 @@ const ReaderPage: React.FC = () => {
     localStorage.setItem(`location-${blobName}`, location.toString());
   }, [blobName, location]);
 
-  if (!blobName || isLoading) return <div>Loading book…</div>;
-  if (error)    return <div>Error loading book</div>;
+  if (!blobName || !bookId) return <div>Loading book…</div>;
 
   return (
     <div className="flex h-screen relative">
@@ -35,7 +48,8 @@ const ReaderPage: React.FC = () => {
         } overflow-hidden`}
       >
         <ReactReader
-          url={epubData!}
+          url={`${import.meta.env.VITE_API_BASE_URL}/books/${bookId}/resources/`}
+          epubInitOptions={epubInitOptions}
           title={title || ''}
           location={location}
           locationChanged={setLocation}
@@ -58,7 +72,7 @@ const ReaderPage: React.FC = () => {
           md:shadow-none md:bg-transparent
         `}
       >
-        <ChatWindow />
+        <ChatWindow bookId={bookId} chapter={spineIndexFromCfi(location)} />
       </div>
 
       <button